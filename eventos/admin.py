@@ -1,20 +1,28 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import EventoCultural
+from locales.busqueda import reindexar_queryset
+from locales.fragmentos import invalidar as invalidar_fragmentos
 
 @admin.register(EventoCultural)
 class EventoCulturalAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'fecha_inicio', 'fecha_fin', 'ubicacion_texto', 'publicado', 'publicado_por')
+    list_select_related = ('publicado_por',)
     list_filter = ('publicado', 'fecha_inicio')
     search_fields = ('nombre', 'descripcion', 'ubicacion_texto')
     actions = ['aprobar_eventos', 'ocultar_eventos']
 
     def aprobar_eventos(self, request, queryset):
-        queryset.update(publicado=True)
+        queryset.update(publicado=True, updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
         self.message_user(request, "Eventos seleccionados publicados.")
     aprobar_eventos.short_description = "✅ Publicar eventos seleccionados"
 
     def ocultar_eventos(self, request, queryset):
-        queryset.update(publicado=False)
+        queryset.update(publicado=False, updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
         self.message_user(request, "Eventos seleccionados ocultados.")
     ocultar_eventos.short_description = "🚫 Ocultar eventos seleccionados"
 
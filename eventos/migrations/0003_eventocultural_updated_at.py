@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0002_eventocultural_publicado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventocultural',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
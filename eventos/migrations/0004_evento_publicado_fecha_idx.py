@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventos', '0003_eventocultural_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventocultural',
+            index=models.Index(condition=models.Q(('publicado', True)), fields=['fecha_inicio'], name='evento_publicado_fecha_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 
 class EventoCultural(models.Model):
@@ -9,6 +10,14 @@ class EventoCultural(models.Model):
     ubicacion_texto = models.CharField(max_length=255)
     publicado = models.BooleanField(default=False)  # ← Nuevo campo para control de visibilidad
     publicado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='eventos_creados')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+    class Meta:
+        indexes = [
+            # Solo los publicados se listan: el índice parcial no guarda borradores y ya
+            # viene ordenado por fecha de inicio.
+            models.Index(fields=['fecha_inicio'], condition=Q(publicado=True), name='evento_publicado_fecha_idx'),
+        ]
@@ -1,3 +1,53 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from locales.tests import PlanesDeConsultaMixin, PresupuestosMixin, Ruta, rutas_con_nombre
+from .models import EventoCultural
+
+
+class PlanesDeConsultaTests(PlanesDeConsultaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        inicio = timezone.now()
+        for i in range(8):
+            EventoCultural.objects.create(nombre=f'Evento {i}', descripcion='d', ubicacion_texto='Granada',
+                                          fecha_inicio=inicio + timedelta(days=i),
+                                          fecha_fin=inicio + timedelta(days=i, hours=3), publicado=i % 2 == 0)
+
+    def test_lista_de_eventos_publicados(self):
+        url = reverse('evento_cultural_list')
+        self.assertSinRecorridos(url, ['eventos_eventocultural'])
+        self.assertSinRecorridos(url + '?page=2', ['eventos_eventocultural'])
+
+
+class CalendarioCondicionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        inicio = timezone.now()
+        cls.evento = EventoCultural.objects.create(nombre='Güegüense', descripcion='Diriamba', ubicacion_texto='Carazo',
+                                                   fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=3),
+                                                   publicado=True)
+
+    def test_304_hasta_que_cambia_un_evento_publicado(self):
+        url = reverse('evento_cultural_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        EventoCultural.objects.create(nombre='Borrador', descripcion='-', ubicacion_texto='León',
+                                      fecha_inicio=timezone.now(), fecha_fin=timezone.now(), publicado=False)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.evento.publicado = False  # ocultarlo también cambia la página
+        self.evento.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PresupuestosEventosTests(PresupuestosMixin, TestCase):
+    PRESUPUESTOS = {
+        'evento_cultural_list': Ruta(3),
+    }
 
-# Create your tests here.
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        from . import urls
+        self.assertEqual(rutas_con_nombre(urls.urlpatterns), set(self.PRESUPUESTOS))
@@ -1,7 +1,18 @@
 from django.core.paginator import Paginator
+from django.db.models import Count, Max
 from django.shortcuts import render
+from locales.condicional import pagina_condicional
 from .models import EventoCultural
 
+
+def _marca_eventos(request):
+    # Solo cuentan los publicados (se leen del índice parcial): editar uno sube el máximo,
+    # y ocultarlo cambia el número de publicados.
+    marca = EventoCultural.objects.filter(publicado=True).aggregate(ultimo=Max('updated_at'), publicados=Count('pk'))
+    return marca['ultimo'], marca['publicados']
+
+
+@pagina_condicional(_marca_eventos)
 def evento_cultural_view(request):
     eventos = EventoCultural.objects.filter(publicado=True).order_by('fecha_inicio')
     paginator = Paginator(eventos, 5)
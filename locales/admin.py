@@ -1,28 +1,44 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.db import DatabaseError
+from django.utils import timezone
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from .mapa import invalidar_mapa
+from .busqueda import reindexar_queryset
+from .fragmentos import invalidar as invalidar_fragmentos
+from .imagenes import url_derivado
+from . import duplicados, sugerencias
 from .models import (
     Relato, Negocio, SugerenciaNegocio, Receta,
     PerfilUsuario, Comentario, Calificacion,
     ReclamoNegocio, ReporteComentario, Categoria, MensajePropietario,
-    Rango  # <-- NUEVO: Importación del modelo Rango
+    Rango,  # <-- NUEVO: Importación del modelo Rango
+    UbicacionGeocodificada, Departamento, ArchivoContenido
 )
 
 
 @admin.register(Relato)
 class RelatoAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'status')
+    list_select_related = ('author',)
     list_filter = ('status',)
     search_fields = ('title', 'content')
     actions = ['approve_relatos', 'reject_relatos']
 
     def approve_relatos(self, request, queryset):
-        queryset.update(status='approved')
+        queryset.update(status='approved', updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
+        invalidar_mapa()
         self.message_user(request, "Los relatos seleccionados han sido aprobados.")
 
     approve_relatos.short_description = "Aprobar relatos seleccionados"
 
     def reject_relatos(self, request, queryset):
-        queryset.update(status='rejected')
+        queryset.update(status='rejected', updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
+        invalidar_mapa()
         self.message_user(request, "Los relatos seleccionados han sido rechazados.")
 
     reject_relatos.short_description = "Rechazar relatos seleccionados"
@@ -34,17 +50,21 @@ class NegocioAdmin(admin.ModelAdmin):
         'name',
         'categoria_relacionada',
         'is_turismo',  # <--- NUEVO: Muestra si es de turismo
+        'departamento',
         'created_by',
         'vista_foto'
     )
-    list_filter = ('categoria_relacionada',)
+    list_select_related = ('categoria_relacionada', 'departamento', 'created_by')
+    list_filter = ('categoria_relacionada', 'departamento')
     search_fields = ('name',)
-    readonly_fields = ('vista_foto_detalle',)
+    readonly_fields = ('vista_foto_detalle', 'calificacion_promedio')
     fields = (
         'name',
         'description',
         'categoria_relacionada',
         'address_text',
+        'latitud',
+        'longitud',
         'hours',
         'created_by',
         'propietario',
@@ -56,14 +76,16 @@ class NegocioAdmin(admin.ModelAdmin):
 
     def vista_foto(self, obj):
         if obj.foto_principal:
-            return format_html('<img src="{}" width="100" style="border-radius:6px;" />', obj.foto_principal.url)
+            return format_html('<img src="{}" width="100" style="border-radius:6px;" />',
+                               url_derivado(obj.foto_principal, 200))
         return "Sin imagen"
 
     vista_foto.short_description = "Foto principal"
 
     def vista_foto_detalle(self, obj):
         if obj.foto_principal:
-            return format_html('<img src="{}" width="300" style="border-radius:10px;" />', obj.foto_principal.url)
+            return format_html('<img src="{}" width="300" style="border-radius:10px;" />',
+                               url_derivado(obj.foto_principal, 640))
         return "Sin imagen"
 
     vista_foto_detalle.short_description = "Vista ampliada"
@@ -73,14 +95,17 @@ class NegocioAdmin(admin.ModelAdmin):
 class SugerenciaNegocioAdmin(admin.ModelAdmin):
     list_display = (
         'nombre_negocio', 'sugerido_por', 'estado',
-        'categoria_relacionada', 'foto_aprobada', 'vista_previa'
+        'categoria_relacionada', 'posible_duplicado', 'foto_aprobada', 'vista_previa'
     )
-    list_filter = ('estado', 'categoria_relacionada', 'foto_aprobada')
+    list_select_related = ('sugerido_por', 'categoria_relacionada', 'duplicado_de')
+    list_filter = ('estado', ('duplicado_de', admin.EmptyFieldListFilter), 'categoria_relacionada', 'departamento',
+                   'foto_aprobada')
     search_fields = ('nombre_negocio', 'sugerido_por__username')
-    readonly_fields = ('mostrar_foto', 'fecha_sugerencia')
+    readonly_fields = ('mostrar_foto', 'fecha_sugerencia', 'negocios_parecidos')
+    autocomplete_fields = ('duplicado_de',)
     fields = (
         'nombre_negocio', 'ubicacion_texto', 'comentarios', 'sugerido_por',
-        'estado', 'categoria_relacionada',
+        'estado', 'categoria_relacionada', 'duplicado_de', 'negocios_parecidos',
         'foto_referencia', 'mostrar_foto', 'foto_aprobada'
     )
     actions = ['aprobar_sugerencia_y_crear_negocio', 'aprobar_foto_referencia']
@@ -99,50 +124,69 @@ class SugerenciaNegocioAdmin(admin.ModelAdmin):
 
     vista_previa.short_description = "Miniatura"
 
+    def posible_duplicado(self, obj):
+        if obj.duplicado_de is None:
+            return "-"
+        return format_html('<a href="{}">{}</a> ({}%)',
+                           reverse('admin:locales_negocio_change', args=[obj.duplicado_de_id]),
+                           obj.duplicado_de.name, round((obj.similitud_duplicado or 0) * 100))
+
+    posible_duplicado.short_description = "Posible duplicado"
+    posible_duplicado.admin_order_field = 'similitud_duplicado'
+
+    def negocios_parecidos(self, obj):
+        # Calculado ahora con el índice de trigramas (puede haber cambiado desde que llegó)
+        if not obj.nombre_negocio:
+            return "-"
+        parecidos = duplicados.candidatos(obj.nombre_negocio, obj.ubicacion_texto)
+        if not parecidos:
+            return "Ninguno"
+        return format_html_join(
+            format_html('<br>'), '<a href="{}">{}</a> — {} ({}%)',
+            ((reverse('admin:locales_negocio_change', args=[c.negocio_id]), c.nombre, c.direccion,
+              round(c.similitud * 100)) for c in parecidos))
+
+    negocios_parecidos.short_description = "Negocios parecidos"
+
+    def _informar(self, request, resultados, textos):
+        cuenta = sugerencias.resumen(resultados)
+        partes = [f"{cuenta[estado]} {texto}" for estado, texto in textos.items() if cuenta.get(estado)]
+        self.message_user(request, ", ".join(partes) + "." if partes else "No había nada que aprobar.")
+        # Las omitidas y las fallidas, agrupadas por motivo (un lote grande daría cientos de mensajes)
+        motivos = {}
+        for resultado in resultados:
+            if resultado.estado in (sugerencias.OMITIDA, sugerencias.ERROR):
+                clave = (resultado.estado, resultado.detalle)
+                motivos.setdefault(clave, []).append(resultado.sugerencia.nombre_negocio or f'#{resultado.sugerencia.pk}')
+        for (estado, detalle), nombres in motivos.items():
+            resto = f" y {len(nombres) - 10} más" if len(nombres) > 10 else ""
+            self.message_user(request, f"{detalle.capitalize()}: {', '.join(nombres[:10])}{resto}.",
+                              level='error' if estado == sugerencias.ERROR else 'warning')
+
     def aprobar_sugerencia_y_crear_negocio(self, request, queryset):
-        creados = 0
-        actualizados = 0
-        for sugerencia in queryset:
-            try:
-                negocio_existente = Negocio.objects.filter(name=sugerencia.nombre_negocio).first()
-                if negocio_existente:
-                    negocio_existente.description = sugerencia.comentarios
-                    negocio_existente.address_text = sugerencia.ubicacion_texto
-                    # Asegurarse de que el campo de categoría se actualiza correctamente
-                    if sugerencia.categoria_relacionada:
-                        negocio_existente.categoria_relacionada = sugerencia.categoria_relacionada
-                    if sugerencia.foto_aprobada:
-                        negocio_existente.foto_principal = sugerencia.foto_referencia
-                    negocio_existente.save()
-                    actualizados += 1
-                else:
-                    Negocio.objects.create(
-                        name=sugerencia.nombre_negocio,
-                        description=sugerencia.comentarios,
-                        address_text=sugerencia.ubicacion_texto,
-                        created_by=sugerencia.sugerido_por,
-                        categoria_relacionada=sugerencia.categoria_relacionada,
-                        foto_principal=sugerencia.foto_referencia if sugerencia.foto_aprobada else None
-                    )
-                    creados += 1
-                sugerencia.estado = 'approved'
-                sugerencia.save()
-            except Exception as e:
-                self.message_user(request, f"Error al procesar sugerencia: {e}", level='error')
-        self.message_user(request, f"{creados} negocio(s) creados, {actualizados} actualizado(s).")
+        try:
+            resultados = sugerencias.aprobar_sugerencias(queryset)
+        except DatabaseError as e:
+            self.message_user(request, f"No se aprobó ninguna sugerencia: {e}", level='error')
+            return
+        self._informar(request, resultados, {
+            sugerencias.CREADO: "negocio(s) creados",
+            sugerencias.ACTUALIZADO: "actualizado(s)",
+            sugerencias.OMITIDA: "omitida(s)",
+            sugerencias.ERROR: "con error",
+        })
 
     def aprobar_foto_referencia(self, request, queryset):
-        actualizadas = 0
-        for sugerencia in queryset:
-            if sugerencia.foto_referencia and not sugerencia.foto_aprobada:
-                sugerencia.foto_aprobada = True
-                sugerencia.save()
-                actualizadas += 1
-                negocio_existente = Negocio.objects.filter(name=sugerencia.nombre_negocio).first()
-                if negocio_existente:
-                    negocio_existente.foto_principal = sugerencia.foto_referencia
-                    negocio_existente.save()
-        self.message_user(request, f"{actualizadas} foto(s) aprobadas y vinculadas a negocios existentes.")
+        try:
+            resultados = sugerencias.aprobar_fotos(queryset)
+        except DatabaseError as e:
+            self.message_user(request, f"No se aprobó ninguna foto: {e}", level='error')
+            return
+        self._informar(request, resultados, {
+            sugerencias.VINCULADA: "foto(s) aprobadas y vinculadas a negocios existentes",
+            sugerencias.APROBADA: "aprobada(s) sin negocio todavía",
+            sugerencias.OMITIDA: "omitida(s)",
+        })
 
     aprobar_foto_referencia.short_description = "Aprobar foto(s) de referencia"
 
@@ -150,18 +194,23 @@ class SugerenciaNegocioAdmin(admin.ModelAdmin):
 @admin.register(Receta)
 class RecetaAdmin(admin.ModelAdmin):
     list_display = ('titulo', 'autor', 'estado', 'fecha_creacion')
+    list_select_related = ('autor',)
     list_filter = ('estado', 'fecha_creacion')
     search_fields = ('titulo', 'ingredientes', 'autor__username')
     actions = ['aprobar_recetas', 'rechazar_recetas']
 
     def aprobar_recetas(self, request, queryset):
-        queryset.update(estado='approved')
+        queryset.update(estado='approved', updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
         self.message_user(request, "Las recetas seleccionadas han sido aprobadas.")
 
     aprobar_recetas.short_description = "Aprobar recetas seleccionadas"
 
     def rechazar_recetas(self, request, queryset):
-        queryset.update(estado='rejected')
+        queryset.update(estado='rejected', updated_at=timezone.now())
+        reindexar_queryset(queryset)
+        invalidar_fragmentos(queryset.model)
         self.message_user(request, "Las recetas seleccionadas han sido rechazadas.")
 
     rechazar_recetas.short_description = "Rechazar recetas seleccionadas"
@@ -170,6 +219,7 @@ class RecetaAdmin(admin.ModelAdmin):
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'rango', 'ubicacion', 'telefono')
+    list_select_related = ('usuario', 'rango')
     list_filter = ('rango',)
     search_fields = ('usuario__username', 'ubicacion', 'telefono')
     readonly_fields = ('usuario',)
@@ -179,6 +229,7 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
 @admin.register(ReclamoNegocio)
 class ReclamoAdmin(admin.ModelAdmin):
     list_display = ('negocio', 'usuario', 'aprobado', 'fecha_envio')
+    list_select_related = ('negocio', 'usuario')
     list_filter = ('aprobado',)
     actions = ['aprobar_reclamos']
 
@@ -192,6 +243,7 @@ class ReclamoAdmin(admin.ModelAdmin):
 @admin.register(Comentario)
 class ComentarioAdmin(admin.ModelAdmin):
     list_display = ('negocio', 'usuario', 'texto', 'fecha')
+    list_select_related = ('negocio', 'usuario')
     readonly_fields = ('negocio', 'usuario', 'texto', 'fecha')
 
     def has_add_permission(self, request):
@@ -201,6 +253,7 @@ class ComentarioAdmin(admin.ModelAdmin):
 @admin.register(Calificacion)
 class CalificacionAdmin(admin.ModelAdmin):
     list_display = ('negocio', 'usuario', 'puntuacion')
+    list_select_related = ('negocio', 'usuario')
     readonly_fields = ('negocio', 'usuario', 'puntuacion')
 
     def has_add_permission(self, request):
@@ -210,6 +263,8 @@ class CalificacionAdmin(admin.ModelAdmin):
 @admin.register(ReporteComentario)
 class ReporteComentarioAdmin(admin.ModelAdmin):
     list_display = ('comentario', 'usuario', 'motivo', 'fecha')
+    # El __str__ del comentario muestra su autor y su negocio
+    list_select_related = ('comentario__usuario', 'comentario__negocio', 'usuario')
     search_fields = ('comentario__texto', 'usuario__username', 'motivo')
     list_filter = ('fecha',)
 
@@ -220,6 +275,12 @@ class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'slug')
 
 
+@admin.register(Departamento)
+class DepartamentoAdmin(admin.ModelAdmin):
+    prepopulated_fields = {'slug': ('nombre',)}
+    list_display = ('nombre', 'slug')
+
+
 # Registramos el modelo Rango para que aparezca en el panel de administración
 @admin.register(Rango)
 class RangoAdmin(admin.ModelAdmin):
@@ -228,4 +289,23 @@ class RangoAdmin(admin.ModelAdmin):
 
 
 # Registramos el modelo MensajePropietario para que aparezca en el panel de administración
-admin.site.register(MensajePropietario)
\ No newline at end of file
+@admin.register(MensajePropietario)
+class MensajePropietarioAdmin(admin.ModelAdmin):
+    list_select_related = ('propietario',)  # el __str__ muestra el nombre del propietario
+
+
+@admin.register(UbicacionGeocodificada)
+class UbicacionGeocodificadaAdmin(admin.ModelAdmin):
+    list_display = ('direccion_normalizada', 'latitud', 'longitud', 'proveedor', 'fecha', 'reintentar_despues')
+    list_filter = ('proveedor',)
+    search_fields = ('direccion_normalizada',)
+
+
+@admin.register(ArchivoContenido)
+class ArchivoContenidoAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'tamano', 'referencias', 'fecha')
+    search_fields = ('huella', 'nombre')
+    readonly_fields = ('huella', 'nombre', 'tamano', 'referencias', 'fecha')
+
+    def has_add_permission(self, request):
+        return False
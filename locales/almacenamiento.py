@@ -0,0 +1,147 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+# Almacenamiento por contenido para los FileField/ImageField.
+#
+# Cada archivo se guarda una sola vez bajo un nombre que sale de su sha256
+# (contenido/ab/abcdef….jpg). La huella se calcula mientras el archivo se copia
+# por trozos a un temporal, sin cargarlo entero en memoria; si ese contenido ya
+# existía, el temporal se descarta y se devuelve el nombre del existente.
+# ArchivoContenido lleva la cuenta de referencias de cada nombre: borrar un campo
+# solo quita el archivo del disco cuando nadie más lo usa. La extensión forma parte
+# del nombre, así que los mismos bytes como .jpg y como .jpeg cuentan por separado.
+#
+# Contar, poner el archivo en su sitio y quitarlo ocurren con la fila de
+# ArchivoContenido bloqueada (select_for_update dentro de atomic(); en SQLite,
+# atomic() ya toma el bloqueo de escritura): un guardado del mismo contenido no
+# puede volver a usar el archivo entre que el borrado ve cero referencias y lo
+# quita del disco. Para que dos campos apunten al mismo archivo hay que pasar
+# por compartir(), que suma la referencia (asignar `.name` a mano no la cuenta).
+# Las señales de locales/signals.py sueltan la referencia (soltar()) cuando se borra
+# una fila o se le cambia el archivo a un campo.
+#
+# Los nombres antiguos (avatars/hq720_jJmcIRQ.jpg…) se siguen resolviendo como
+# en FileSystemStorage; `manage.py deduplicar_media` los pasa al nuevo esquema.
+CARPETA = 'contenido'
+
+
+def es_nombre_de_contenido(nombre):
+    return nombre.replace('\\', '/').startswith(f'{CARPETA}/')
+
+
+def nombre_de_contenido(huella, nombre_original):
+    extension = os.path.splitext(nombre_original)[1].lower()
+    return f'{CARPETA}/{huella[:2]}/{huella}{extension}'
+
+
+def huella_de(archivo, tamano_trozo=64 * 1024):
+    # sha256 de un archivo abierto, leído por trozos.
+    sha = hashlib.sha256()
+    for trozo in iter(lambda: archivo.read(tamano_trozo), b''):
+        sha.update(trozo)
+    return sha.hexdigest()
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide el contenido, no hace falta buscar uno libre.
+        return name
+
+    def _save(self, name, content):
+        from .models import ArchivoContenido
+
+        carpeta_temporal = os.path.join(self.location, CARPETA, 'tmp')
+        os.makedirs(carpeta_temporal, exist_ok=True)
+        sha = hashlib.sha256()
+        tamano = 0
+        descriptor, temporal = tempfile.mkstemp(dir=carpeta_temporal)
+        try:
+            with os.fdopen(descriptor, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for trozo in content.chunks():
+                    sha.update(trozo)
+                    tamano += len(trozo)
+                    destino.write(trozo)
+            huella = sha.hexdigest()
+            nombre = nombre_de_contenido(huella, name)
+            ruta = self.path(nombre)
+            with transaction.atomic():
+                archivo, _ = ArchivoContenido.objects.select_for_update().get_or_create(
+                    nombre=nombre, defaults={'huella': huella, 'tamano': tamano})
+                if os.path.exists(ruta):
+                    os.remove(temporal)
+                else:
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                    if self.directory_permissions_mode is not None:
+                        os.chmod(os.path.dirname(ruta), self.directory_permissions_mode)
+                    os.replace(temporal, ruta)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(ruta, self.file_permissions_mode)
+                ArchivoContenido.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return nombre
+
+    def compartir(self, name):
+        """Suma una referencia al archivo `name` para guardarlo en otro campo; devuelve el nombre a usar."""
+        from .models import ArchivoContenido
+
+        if not self.exists(name):
+            return name
+        if not es_nombre_de_contenido(name):
+            # Nombre antiguo: el otro campo recibe su propia copia por contenido.
+            with self.open(name) as archivo:
+                return self.save(name, archivo)
+        with transaction.atomic():
+            archivo = ArchivoContenido.objects.select_for_update().filter(nombre=name).first()
+            if archivo is None:
+                # Sin cuenta: la del campo que ya lo tenía más esta.
+                huella = os.path.splitext(os.path.basename(name))[0]
+                ArchivoContenido.objects.create(huella=huella, nombre=name, tamano=self.size(name), referencias=2)
+            else:
+                ArchivoContenido.objects.filter(pk=archivo.pk).update(referencias=F('referencias') + 1)
+        return name
+
+    def delete(self, name):
+        from .models import ArchivoContenido
+
+        if not name or not es_nombre_de_contenido(name):
+            return super().delete(name)
+        with transaction.atomic():
+            archivo = ArchivoContenido.objects.select_for_update().filter(nombre=name).first()
+            if archivo is None:
+                return  # nadie lleva su cuenta: mejor dejarlo que borrar algo en uso
+            if archivo.referencias > 1:
+                ArchivoContenido.objects.filter(pk=archivo.pk).update(referencias=F('referencias') - 1)
+                return
+            borradas, _ = ArchivoContenido.objects.filter(pk=archivo.pk, referencias__lte=1).delete()
+            if borradas:
+                super().delete(name)
+
+
+def soltar(storage, nombre):
+    """Quita, cuando termine la transacción, la referencia de una fila al archivo `nombre`.
+
+    Solo para nombres por contenido: los antiguos no llevan cuenta y pueden estar
+    en uso por otras filas (el avatar por defecto), así que se quedan en disco.
+    """
+    if nombre and isinstance(storage, AlmacenamientoDeduplicado) and es_nombre_de_contenido(nombre):
+        transaction.on_commit(lambda: storage.delete(nombre))
+
+
+def compartir(archivo):
+    """Nombre para guardar en otro campo el mismo archivo que `archivo` (un FieldFile)."""
+    if not archivo:
+        return None
+    if isinstance(archivo.storage, AlmacenamientoDeduplicado):
+        return archivo.storage.compartir(archivo.name)
+    return archivo.name
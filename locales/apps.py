@@ -6,3 +6,9 @@ class LocalesConfig(AppConfig):
 
     def ready(self):
         import locales.signals  # ✅ Importa aquí, no arriba del archivo
+        from locales.busqueda import registrar_tipos
+        registrar_tipos()
+        from locales.basedatos import activar
+        activar()
+        from locales import metricas
+        metricas.activar()
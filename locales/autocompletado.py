@@ -0,0 +1,195 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from . import versiones
+from .texto import normalizar_texto
+
+# Índice de prefijos en memoria para el autocompletado.
+#
+# Es una lista ordenada de claves (texto sin acentos ni mayúsculas) con bisect:
+# buscar un prefijo son dos búsquedas binarias y un recorrido corto, sin tocar la
+# base de datos. Cada texto se indexa también desde el comienzo de cada palabra,
+# así "pinto" sugiere "Gallo Pinto La Chinita".
+#
+# Cada proceso tiene su copia. Las señales la actualizan en el proceso que hizo
+# el cambio y suben su versión en locales/versiones.py, compartida por todos los
+# procesos; los demás, al ver otra versión, la reconstruyen desde la base de datos.
+VERSION = 'autocompletado'
+MAX_SUGERENCIAS = getattr(settings, 'AUTOCOMPLETADO_MAX_SUGERENCIAS', 8)
+# Cuántas entradas del rango de un prefijo se miran como máximo antes de ordenar.
+MAX_CANDIDATOS = 200
+TIPOS = ('negocio', 'categoria', 'departamento', 'usuario')
+
+
+def version_actual():
+    return versiones.actual(VERSION)
+
+
+def _subir_version():
+    return versiones.subir(VERSION)
+
+
+def _claves(texto):
+    # (clave, es_inicio): el texto completo y lo que sigue a cada palabra.
+    palabras = normalizar_texto(texto).split()
+    return {(' '.join(palabras[i:]), i == 0) for i in range(len(palabras))}
+
+
+def _elemento(instancia):
+    """(tipo, id, texto, url, peso) de un objeto, o None si no debe sugerirse."""
+    from django.contrib.auth.models import User
+    from .models import Categoria, Departamento, Negocio
+
+    if isinstance(instancia, Negocio):
+        return ('negocio', instancia.pk, instancia.name, reverse('detalle_negocio', args=[instancia.pk]),
+                instancia.puntuacion_ranking)
+    if isinstance(instancia, Categoria):
+        return ('categoria', instancia.pk, instancia.nombre,
+                reverse('lista_negocios_por_categoria', args=[instancia.slug]), 0)
+    if isinstance(instancia, Departamento):
+        return ('departamento', instancia.pk, instancia.nombre,
+                f"{reverse('lista_negocios')}?{urlencode({'departamento': instancia.slug})}", 0)
+    if isinstance(instancia, User):
+        if not instancia.is_active:
+            return None
+        return ('usuario', instancia.pk, instancia.username,
+                reverse('perfil_publico', args=[instancia.username]), 0)
+    return None
+
+
+def _cargar_elementos():
+    from django.contrib.auth.models import User
+    from .models import Categoria, Departamento, Negocio
+
+    yield from (_elemento(n) for n in Negocio.objects.only('id', 'name', 'puntuacion_ranking'))
+    yield from (_elemento(c) for c in Categoria.objects.only('id', 'nombre', 'slug'))
+    yield from (_elemento(d) for d in Departamento.objects.only('id', 'nombre', 'slug'))
+    yield from (_elemento(u) for u in User.objects.filter(is_active=True).only('id', 'username', 'is_active'))
+
+
+class IndicePrefijos:
+    def __init__(self, elementos, version):
+        self.version = version
+        self._lock = threading.Lock()
+        self._elementos = {}
+        entradas = []
+        for elemento in elementos:
+            if elemento is None:
+                continue
+            self._elementos[elemento[:2]] = elemento
+            tipo, pk, texto = elemento[:3]
+            entradas.extend((clave, tipo, pk, es_inicio) for clave, es_inicio in _claves(texto))
+        entradas.sort()
+        self._entradas = entradas
+
+    def __len__(self):
+        return len(self._elementos)
+
+    def poner(self, tipo, pk, elemento):
+        # Sustituye (o quita, si elemento es None) lo indexado para (tipo, pk).
+        # Devuelve False si no cambió nada.
+        with self._lock:
+            anterior = self._elementos.get((tipo, pk))
+            if anterior == elemento:
+                return False
+            if anterior is not None:
+                for clave, es_inicio in _claves(anterior[2]):
+                    entrada = (clave, tipo, pk, es_inicio)
+                    posicion = bisect_left(self._entradas, entrada)
+                    if posicion < len(self._entradas) and self._entradas[posicion] == entrada:
+                        del self._entradas[posicion]
+                del self._elementos[(tipo, pk)]
+            if elemento is not None:
+                self._elementos[(tipo, pk)] = elemento
+                for clave, es_inicio in _claves(elemento[2]):
+                    insort(self._entradas, (clave, tipo, pk, es_inicio))
+            return True
+
+    def sugerir(self, prefijo, limite=None, tipos=None):
+        """Hasta `limite` sugerencias cuyo texto (o alguna palabra) empieza por `prefijo`.
+
+        Primero las que empiezan por el prefijo desde el inicio del texto, luego
+        las de mayor peso (los negocios usan su puntuación de ranking).
+        """
+        prefijo = normalizar_texto(prefijo)
+        if not prefijo:
+            return []
+        limite = limite or MAX_SUGERENCIAS
+        entradas = self._entradas
+        posicion = bisect_left(entradas, (prefijo,))
+        vistos = {}
+        for clave, tipo, pk, desde_inicio in entradas[posicion:posicion + MAX_CANDIDATOS]:
+            if not clave.startswith(prefijo):
+                break
+            if tipos and tipo not in tipos:
+                continue
+            elemento = self._elementos.get((tipo, pk))
+            if elemento is None:
+                continue
+            candidato = (not desde_inicio, -elemento[4], len(elemento[2]), elemento)
+            if (tipo, pk) not in vistos or candidato[:3] < vistos[(tipo, pk)][:3]:
+                vistos[(tipo, pk)] = candidato
+        mejores = sorted(vistos.values(), key=lambda orden: orden[:3])[:limite]
+        return [
+            {'tipo': tipo, 'id': pk, 'texto': texto, 'url': url}
+            for _, _, _, (tipo, pk, texto, url, _) in mejores
+        ]
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice():
+    global _indice
+    version = version_actual()
+    indice = _indice
+    if indice is None or indice.version != version:
+        with _indice_lock:
+            if _indice is None or _indice.version != version:
+                _indice = IndicePrefijos(_cargar_elementos(), version)
+            indice = _indice
+    return indice
+
+
+def actualizar(instancia, borrado=False):
+    """Refleja en el índice de este proceso el alta, cambio o baja de un objeto."""
+    elemento = None if borrado else _elemento(instancia)
+    tipo = elemento[0] if elemento else _tipo_de(instancia)
+    if tipo is None:
+        return
+    indice = _indice
+    if indice is None:
+        # Este proceso aún no lo ha construido; basta con avisar a los demás.
+        _subir_version()
+        return
+    if indice.poner(tipo, instancia.pk, elemento):
+        version = _subir_version()
+        # Si otro proceso también cambió algo, la versión habrá saltado más de uno
+        # y en la próxima consulta se reconstruye.
+        if version == indice.version + 1:
+            indice.version = version
+
+
+def invalidar():
+    """Obliga a todos los procesos a reconstruir el índice (tras cargas masivas sin señales)."""
+    _subir_version()
+
+
+def _tipo_de(instancia):
+    from django.contrib.auth.models import User
+    from .models import Categoria, Departamento, Negocio
+
+    for modelo, tipo in ((Negocio, 'negocio'), (Categoria, 'categoria'), (Departamento, 'departamento'),
+                         (User, 'usuario')):
+        if isinstance(instancia, modelo):
+            return tipo
+    return None
+
+
+def sugerir(prefijo, limite=None, tipos=None):
+    return obtener_indice().sugerir(prefijo, limite, tipos)
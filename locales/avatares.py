@@ -0,0 +1,108 @@
+import hashlib
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import InvalidStorageError, default_storage, storages
+from django.urls import reverse
+from django.utils.html import escape
+from PIL import Image, ImageDraw, ImageFont
+
+# Avatares con las iniciales del usuario, generados aquí en vez de pedirlos a
+# ui-avatars.com. El resultado depende solo de la URL (nombre, colores, tamaño y
+# formato), así que se guarda en disco la primera vez y se sirve con caché
+# "immutable": el navegador no vuelve a pedirlo.
+#
+# La URL es pública, así que solo se dibujan los ESTILOS que usan las plantillas y
+# solo para nombres de usuario que existen: si no, cualquiera podría llenar el
+# disco recorriendo nombres, colores y tamaños.
+CARPETA = getattr(settings, 'AVATARES_CARPETA', 'iniciales')
+# (fondo, color, tamaño) de cada {% avatar_iniciales %} de las plantillas
+ESTILOS = getattr(settings, 'AVATARES_ESTILOS', (
+    ('dcc7a1', '6b4226', 80),  # barra de navegación
+    ('b85c38', 'ffffff', 120),  # lista de usuarios
+    ('b85c38', 'ffffff', 150),  # perfiles
+))
+FORMATOS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+_SEPARADORES = re.compile(r'[\s._\-@+]+')
+# Cambiar si cambia el dibujo: invalida los archivos ya guardados.
+VERSION = 1
+
+
+def permitido(fondo, color, tamano, formato):
+    return formato in FORMATOS and (fondo.lower(), color.lower(), tamano) in ESTILOS
+
+
+def iniciales(nombre):
+    # "maria_lopez" → "ML", "roger" → "RO" (como ui-avatars).
+    partes = [p for p in _SEPARADORES.split(nombre or '') if p]
+    if len(partes) >= 2:
+        texto = partes[0][0] + partes[1][0]
+    elif partes:
+        texto = partes[0][:2]
+    else:
+        texto = '?'
+    return texto.upper()
+
+
+def svg(nombre, fondo, color, tamano):
+    mitad = tamano / 2
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{tamano}" height="{tamano}" '
+        f'viewBox="0 0 {tamano} {tamano}">'
+        f'<rect width="100%" height="100%" fill="#{fondo}"/>'
+        f'<text x="{mitad}" y="{mitad}" dy=".35em" text-anchor="middle" fill="#{color}" '
+        f'font-family="Lato, Helvetica, Arial, sans-serif" font-weight="bold" font-size="{tamano * 0.42:.1f}">'
+        f'{escape(iniciales(nombre))}</text></svg>'
+    ).encode()
+
+
+def png(nombre, fondo, color, tamano):
+    imagen = Image.new('RGB', (tamano, tamano), f'#{fondo}')
+    dibujo = ImageDraw.Draw(imagen)
+    fuente = ImageFont.load_default(size=round(tamano * 0.42))
+    dibujo.text((tamano / 2, tamano / 2), iniciales(nombre), fill=f'#{color}', font=fuente, anchor='mm')
+    salida = BytesIO()
+    imagen.save(salida, format='PNG', optimize=True)
+    return salida.getvalue()
+
+
+def _almacen():
+    try:
+        return storages['derivados']
+    except InvalidStorageError:
+        return default_storage
+
+
+def huella(nombre, fondo, color, tamano, formato):
+    # También es el ETag de la respuesta.
+    clave = f'{VERSION}|{nombre}|{fondo.lower()}|{color.lower()}|{tamano}|{formato}'
+    return hashlib.sha1(clave.encode()).hexdigest()
+
+
+def nombre_archivo(nombre, fondo, color, tamano, formato):
+    return f'{CARPETA}/{huella(nombre, fondo, color, tamano, formato)}.{formato}'
+
+
+def obtener(nombre, fondo, color, tamano, formato):
+    """Bytes del avatar, generándolo y guardándolo en disco si aún no existe.
+
+    None si `nombre` no es un usuario. Comprobarlo cuesta una consulta, así que
+    solo se hace cuando el archivo aún no está en disco.
+    """
+    almacen = _almacen()
+    ruta = nombre_archivo(nombre, fondo, color, tamano, formato)
+    if almacen.exists(ruta):
+        with almacen.open(ruta) as archivo:
+            return archivo.read()
+    if not User.objects.filter(username=nombre).exists():
+        return None
+    contenido = (svg if formato == 'svg' else png)(nombre, fondo, color, tamano)
+    almacen.save(ruta, ContentFile(contenido))
+    return contenido
+
+
+def url(nombre, fondo='B85C38', color='ffffff', tamano=120, formato='svg'):
+    return reverse('avatar_iniciales', args=[fondo.lower(), color.lower(), tamano, f'{nombre}.{formato}'])
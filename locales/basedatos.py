@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# Perfil de SQLite para producción.
+#
+# Con la configuración de fábrica SQLite usa un diario "rollback": mientras alguien
+# escribe nadie puede leer, y una transacción que empieza leyendo y luego escribe
+# (votar, comentar) falla con "database is locked" si otra escribió entretanto.
+# Con WAL los lectores no bloquean al escritor ni al revés; el resto de ajustes se
+# aplica a cada conexión nueva desde la señal connection_created.
+# settings.DATABASES completa el perfil con transaction_mode=IMMEDIATE (las
+# transacciones piden el bloqueo de escritura al empezar y esperan su turno en vez
+# de fallar) y CONN_MAX_AGE (la conexión se reutiliza entre peticiones).
+#
+# journal_mode=WAL no es un ajuste de la conexión: queda grabado en el archivo y
+# deja -wal/-shm a su lado. Por eso solo se pide con SQLITE_WAL (por defecto, con
+# DEBUG=False, es decir, en el servidor real); en desarrollo, en las pruebas y en
+# los comandos de manage.py el db.sqlite3 del repositorio queda como está.
+PRAGMAS = getattr(settings, 'SQLITE_PRAGMAS', {
+    'busy_timeout': 5000,  # ms que se espera un bloqueo antes de rendirse
+    'cache_size': -20000,  # negativo = KiB: unos 20 MB de páginas en memoria por conexión
+    'mmap_size': 128 * 1024 * 1024,  # lecturas directamente desde el archivo mapeado
+    'temp_store': 'MEMORY',
+})
+WAL = getattr(settings, 'SQLITE_WAL', not settings.DEBUG)
+PRAGMAS_WAL = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # con WAL no se pierde consistencia; solo hace fsync en los checkpoints
+}
+
+
+def pragmas_de_conexion(wal=None):
+    return {**PRAGMAS_WAL, **PRAGMAS} if (WAL if wal is None else wal) else PRAGMAS
+
+
+def aplicar_pragmas(cursor, pragmas=None):
+    for nombre, valor in (pragmas_de_conexion() if pragmas is None else pragmas).items():
+        cursor.execute(f'PRAGMA {nombre} = {valor}')
+
+
+def configurar_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            aplicar_pragmas(cursor)
+
+
+def activar():
+    connection_created.connect(configurar_sqlite, dispatch_uid='locales.basedatos.configurar_sqlite')
@@ -0,0 +1,301 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import metricas, versiones
+from .texto import normalizar_texto
+
+# Índice de texto completo (SQLite FTS5) del contenido publicado del sitio.
+#
+# Un único índice invertido para negocios, relatos, recetas, saberes y eventos:
+# todos comparten estadísticas de términos, así que el bm25 de un negocio y el
+# de una receta son comparables y los resultados se mezclan en un solo orden.
+# Cada fila es un documento con su tipo ("receta", "saber", ...) como columna
+# indexada, para poder filtrar por tipo dentro del MATCH. El rowid codifica el
+# tipo y el id del objeto (objeto_id * 16 + código del tipo), así actualizar o
+# borrar un documento es una búsqueda por clave y no un recorrido de la tabla.
+# "unicode61 remove_diacritics 2" pliega los acentos: "maiz" encuentra "maíz".
+TABLA = 'busqueda_indice'
+SQL_CREAR = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} "
+    f"USING fts5(tipo, titulo, cuerpo, tokenize='unicode61 remove_diacritics 2')"
+)
+# Pesos de bm25 por columna: el título cuenta diez veces más que el cuerpo.
+PESOS = '0.0, 10.0, 1.0'
+# Marcas temporales para los resaltados; se sustituyen por <mark> después de escapar el HTML.
+_INICIO, _FIN = '\x02', '\x03'
+_PALABRAS = re.compile(r'\w+')
+MAX_TERMINOS = 10
+
+# Las páginas de resultados se cachean por consulta normalizada; cualquier cambio
+# en el índice sube la versión (compartida por todos los procesos, ver
+# locales/versiones.py) y deja obsoletas todas las entradas a la vez.
+VERSION = 'busqueda'
+SEGUNDOS_CACHE = getattr(settings, 'BUSQUEDA_SEGUNDOS_CACHE', 600)
+
+
+class TipoIndexado:
+    def __init__(self, nombre, codigo, modelo, filtro_publicados, titulo, cuerpo, etiqueta, relacionados=()):
+        self.nombre = nombre
+        self.codigo = codigo
+        self.modelo = modelo
+        self.filtro_publicados = filtro_publicados
+        self.titulo = titulo
+        self.cuerpo = cuerpo
+        self.etiqueta = etiqueta
+        self.relacionados = list(relacionados)
+
+    def publicados(self):
+        queryset = self.modelo.objects.filter(**self.filtro_publicados)
+        if self.relacionados:
+            queryset = queryset.select_related(*self.relacionados)
+        return queryset
+
+    def esta_publicado(self, instancia):
+        return all(getattr(instancia, campo) == valor for campo, valor in self.filtro_publicados.items())
+
+    def rowid(self, pk):
+        return pk * 16 + self.codigo
+
+    def documento(self, instancia):
+        return self.rowid(instancia.pk), self.nombre, self.titulo(instancia) or '', self.cuerpo(instancia) or ''
+
+
+TIPOS = {}
+
+
+def registrar(nombre, codigo, modelo, filtro_publicados, titulo, cuerpo, etiqueta, relacionados=()):
+    TIPOS[nombre] = TipoIndexado(nombre, codigo, modelo, filtro_publicados, titulo, cuerpo, etiqueta, relacionados)
+
+
+def tipo_de_modelo(modelo):
+    for tipo in TIPOS.values():
+        if tipo.modelo is modelo:
+            return tipo
+    return None
+
+
+def registrar_tipos():
+    # Se llama desde LocalesConfig.ready(), cuando los modelos ya están cargados.
+    from eventos.models import EventoCultural
+    from .models import Negocio, Receta, Relato, SaberPopular
+
+    registrar('receta', 1, Receta, {'estado': 'approved'},
+              lambda r: r.titulo, lambda r: '\n'.join(filter(None, [r.descripcion, r.ingredientes, r.pasos])),
+              'Receta')
+    registrar('saber', 2, SaberPopular, {'estado': 'approved'},
+              lambda s: s.titulo, lambda s: s.contenido, 'Saber popular')
+    registrar('negocio', 3, Negocio, {},
+              lambda n: n.name,
+              lambda n: '\n'.join(filter(None, [
+                  n.description, n.address_text,
+                  n.categoria_relacionada.nombre if n.categoria_relacionada else None,
+              ])),
+              'Negocio', relacionados=['categoria_relacionada'])
+    registrar('relato', 4, Relato, {'status': 'approved'},
+              lambda r: r.title, lambda r: '\n'.join(filter(None, [r.content, r.ubicacion_texto])), 'Relato')
+    registrar('evento', 5, EventoCultural, {'publicado': True},
+              lambda e: e.nombre, lambda e: '\n'.join(filter(None, [e.descripcion, e.ubicacion_texto])),
+              'Evento cultural')
+
+
+_disponible = None
+
+
+def disponible():
+    # FTS5 solo existe en SQLite; con otro motor las vistas usan icontains.
+    global _disponible
+    if _disponible is None:
+        _disponible = connection.vendor == 'sqlite' and TABLA in connection.introspection.table_names()
+    return _disponible
+
+
+def version_actual():
+    return versiones.actual(VERSION)
+
+
+def invalidar_resultados():
+    versiones.subir(VERSION)
+
+
+def indexar(instancia):
+    # Actualiza (o quita) un objeto del índice según esté publicado o no.
+    tipo = tipo_de_modelo(type(instancia))
+    if tipo is None or not disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA} WHERE rowid = %s", [tipo.rowid(instancia.pk)])
+        if tipo.esta_publicado(instancia):
+            cursor.execute(f"INSERT INTO {TABLA} (rowid, tipo, titulo, cuerpo) VALUES (%s, %s, %s, %s)",
+                           tipo.documento(instancia))
+    invalidar_resultados()
+
+
+def desindexar(modelo, pks):
+    tipo = tipo_de_modelo(modelo)
+    if tipo is None or not disponible() or not pks:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLA} WHERE rowid = %s", [[tipo.rowid(pk)] for pk in pks])
+    invalidar_resultados()
+
+
+def reindexar_queryset(queryset, tamano_lote=500):
+    """Sincroniza con el índice todos los objetos de un queryset.
+
+    Para las acciones masivas del admin, que usan queryset.update() y por tanto
+    no disparan post_save.
+    """
+    tipo = tipo_de_modelo(queryset.model)
+    if tipo is None or not disponible():
+        return
+    pks = list(queryset.values_list('pk', flat=True))
+    desindexar(queryset.model, pks)
+    for inicio in range(0, len(pks), tamano_lote):
+        _insertar(tipo, tipo.publicados().filter(pk__in=pks[inicio:inicio + tamano_lote]))
+
+
+def _insertar(tipo, queryset):
+    documentos = [tipo.documento(instancia) for instancia in queryset]
+    if documentos:
+        with connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {TABLA} (rowid, tipo, titulo, cuerpo) VALUES (%s, %s, %s, %s)",
+                               documentos)
+    return len(documentos)
+
+
+def reconstruir(tipos=None, tamano_lote=1000):
+    # Vacía y vuelve a llenar el índice. Devuelve {tipo: documentos indexados}.
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR)
+        if tipos is None:
+            cursor.execute(f"DELETE FROM {TABLA}")
+        else:
+            for nombre in tipos:
+                cursor.execute(f"DELETE FROM {TABLA} WHERE tipo MATCH %s", [f'"{nombre}"'])
+    global _disponible
+    _disponible = None
+    totales = {}
+    for nombre in (tipos or TIPOS):
+        tipo = TIPOS[nombre]
+        totales[nombre] = 0
+        ids = list(tipo.publicados().order_by('pk').values_list('pk', flat=True))
+        for inicio in range(0, len(ids), tamano_lote):
+            totales[nombre] += _insertar(tipo, tipo.publicados().filter(pk__in=ids[inicio:inicio + tamano_lote]))
+    invalidar_resultados()
+    return totales
+
+
+def expresion_match(consulta, tipos):
+    """Convierte el texto del usuario en una expresión MATCH segura.
+
+    Cada palabra se busca como prefijo ("nacatamal"* también encuentra
+    "nacatamales") y todas deben aparecer en el título o el cuerpo.
+    """
+    terminos = _PALABRAS.findall(normalizar_texto(consulta))[:MAX_TERMINOS]
+    if not terminos:
+        return None
+    palabras = ' AND '.join(f'"{termino}"*' for termino in terminos)
+    filtro_tipos = ' OR '.join(f'"{tipo}"' for tipo in tipos)
+    return f'tipo : ({filtro_tipos}) AND {{titulo cuerpo}} : ({palabras})'
+
+
+def _resaltar(texto):
+    return mark_safe(escape(texto).replace(_INICIO, '<mark>').replace(_FIN, '</mark>'))
+
+
+class ResultadosBusqueda:
+    """Resultados ordenados por relevancia (bm25), paginables con Paginator.
+
+    Solo se consulta la porción que se pide: cada página es un LIMIT/OFFSET sobre
+    el índice y luego una consulta por clave primaria al modelo de cada tipo.
+    El recuento y las filas de cada página se guardan en caché por expresión
+    MATCH (la consulta ya normalizada), así que repetir una búsqueda no toca el índice.
+    """
+
+    def __init__(self, consulta, tipos=None):
+        self.tipos = sorted(tipos or TIPOS)
+        self.match = expresion_match(consulta, self.tipos)
+        self._total = None
+
+    def _clave(self, *partes):
+        resumen = hashlib.md5(self.match.encode()).hexdigest()
+        return ':'.join(['busqueda', str(version_actual()), resumen] + [str(p) for p in partes])
+
+    def count(self):
+        if self._total is None:
+            if self.match is None:
+                self._total = 0
+            else:
+                clave = self._clave('total')
+                self._total = cache.get(clave)
+                metricas.registrar_cache('busqueda', self._total is not None)
+                if self._total is None:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"SELECT count(*) FROM {TABLA} WHERE {TABLA} MATCH %s", [self.match])
+                        self._total = cursor.fetchone()[0]
+                    cache.set(clave, self._total, SEGUNDOS_CACHE)
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, rebanada):
+        if not isinstance(rebanada, slice):
+            return self[rebanada:rebanada + 1][0]
+        if self.match is None:
+            return []
+        inicio = rebanada.start or 0
+        limite = (rebanada.stop - inicio) if rebanada.stop is not None else -1
+        clave = self._clave(inicio, limite)
+        filas = cache.get(clave)
+        metricas.registrar_cache('busqueda', filas is not None)
+        if filas is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid, tipo, highlight({TABLA}, 1, %s, %s), snippet({TABLA}, 2, %s, %s, '…', 24), "
+                    f"bm25({TABLA}, {PESOS}) FROM {TABLA} WHERE {TABLA} MATCH %s "
+                    f"ORDER BY bm25({TABLA}, {PESOS}) LIMIT %s OFFSET %s",
+                    [_INICIO, _FIN, _INICIO, _FIN, self.match, limite, inicio],
+                )
+                filas = cursor.fetchall()
+            cache.set(clave, filas, SEGUNDOS_CACHE)
+        return self._cargar_objetos(filas)
+
+    def _cargar_objetos(self, filas):
+        por_tipo = {}
+        for rowid, tipo, _, _, _ in filas:
+            por_tipo.setdefault(tipo, []).append(rowid // 16)
+        objetos = {}
+        for tipo, pks in por_tipo.items():
+            consulta = TIPOS[tipo].modelo.objects.filter(pk__in=pks)
+            if tipo in SELECT_RELATED:
+                consulta = consulta.select_related(*SELECT_RELATED[tipo])
+            objetos[tipo] = consulta.in_bulk()
+        resultados = []
+        for rowid, tipo, titulo, fragmento, rango in filas:
+            objeto = objetos[tipo].get(rowid // 16)
+            if objeto is None:
+                continue
+            objeto.tipo_resultado = tipo
+            objeto.etiqueta_tipo = TIPOS[tipo].etiqueta
+            objeto.titulo_resaltado = _resaltar(titulo)
+            objeto.fragmento = _resaltar(fragmento)
+            objeto.relevancia = -rango
+            resultados.append(objeto)
+        return resultados
+
+
+SELECT_RELATED = {
+    'receta': ['autor'], 'saber': ['autor'], 'relato': ['author'],
+    'negocio': ['categoria_relacionada'], 'evento': [],
+}
+
+
+def buscar(consulta, tipos=None):
+    return ResultadosBusqueda(consulta, tipos)
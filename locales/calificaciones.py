@@ -0,0 +1,89 @@
+from django.db.models import Case, Count, DecimalField, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from . import ranking
+
+PUNTUACIONES = range(1, 6)
+CAMPOS_AGREGADOS = ['calificacion_suma', 'calificacion_conteo', 'calificacion_promedio', 'puntuacion_ranking'] + \
+                   [f'votos_{p}' for p in PUNTUACIONES]
+
+
+def aplicar_voto(negocio_id, puntuacion, signo=1):
+    """Suma (signo=1) o resta (signo=-1) un voto en los agregados del negocio.
+
+    Todo ocurre en un único UPDATE con expresiones F, así que dos votos
+    simultáneos no se pisan: cada uno incrementa sobre el valor que hay en la
+    base de datos, no sobre el que se leyó en Python.
+    """
+    from .models import Negocio
+
+    nueva_suma = F('calificacion_suma') + signo * puntuacion
+    nuevo_conteo = F('calificacion_conteo') + signo
+    Negocio.objects.filter(pk=negocio_id).update(
+        calificacion_suma=nueva_suma,
+        calificacion_conteo=nuevo_conteo,
+        calificacion_promedio=Case(
+            When(calificacion_conteo__gt=-signo,
+                 then=Round(Cast(nueva_suma, FloatField()) / nuevo_conteo, 2)),
+            default=Value(0),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+        puntuacion_ranking=ranking.expresion_puntuacion(nueva_suma, nuevo_conteo),
+        **{f'votos_{puntuacion}': F(f'votos_{puntuacion}') + signo},
+        updated_at=timezone.now(),
+    )
+    ranking.tras_voto(negocio_id)
+
+
+def _agregados_por_negocio(negocios=None):
+    from .models import Calificacion
+
+    calificaciones = Calificacion.objects.all()
+    if negocios is not None:
+        calificaciones = calificaciones.filter(negocio__in=negocios)
+    filas = calificaciones.values('negocio').order_by().annotate(
+        suma=Sum('puntuacion'),
+        conteo=Count('id'),
+        **{f'votos_{p}': Count('id', filter=Q(puntuacion=p)) for p in PUNTUACIONES},
+    )
+    return {fila['negocio']: fila for fila in filas}
+
+
+def _asignar_agregados(negocio, fila, media):
+    conteo = fila['conteo'] if fila else 0
+    suma = fila['suma'] if fila else 0
+    negocio.calificacion_suma = suma
+    negocio.calificacion_conteo = conteo
+    negocio.calificacion_promedio = round(suma / conteo, 2) if conteo else 0
+    negocio.puntuacion_ranking = ranking.puntuacion(suma, conteo, media)
+    for p in PUNTUACIONES:
+        setattr(negocio, f'votos_{p}', fila[f'votos_{p}'] if fila else 0)
+
+
+def recalcular_agregados(negocios=None, tamano_lote=500):
+    """Reconstruye los agregados desde cero con una sola consulta de agrupación.
+
+    Sirve para la carga inicial y para corregir cualquier desviación. Devuelve
+    el número de negocios actualizados.
+    """
+    from .models import Negocio
+
+    agregados = _agregados_por_negocio(negocios)
+    media = ranking.media_global()
+    queryset = Negocio.objects.only('id', *CAMPOS_AGREGADOS).order_by('id')
+    if negocios is not None:
+        queryset = queryset.filter(pk__in=negocios)
+    total = 0
+    lote = []
+    for negocio in queryset.iterator(chunk_size=tamano_lote):
+        _asignar_agregados(negocio, agregados.get(negocio.pk), media)
+        lote.append(negocio)
+        if len(lote) >= tamano_lote:
+            Negocio.objects.bulk_update(lote, CAMPOS_AGREGADOS)
+            total += len(lote)
+            lote = []
+    if lote:
+        Negocio.objects.bulk_update(lote, CAMPOS_AGREGADOS)
+        total += len(lote)
+    return total
@@ -0,0 +1,77 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+# Respuestas condicionales (ETag / Last-Modified) para páginas de detalle y listas.
+#
+# Cada vista decorada con @pagina_condicional(marca) tiene una función `marca` que,
+# con una consulta barata (MAX de updated_at, COUNT…), devuelve una tupla que
+# empieza por la fecha del último cambio de lo que muestra la página, o None si
+# no puede saberse (p. ej. el objeto no existe). Si el navegador ya tiene esa
+# versión, se responde 304 sin ejecutar la vista ni renderizar la plantilla.
+#
+# La página también depende de quién la ve (barra de navegación, permisos) y del
+# código de las plantillas, así que eso entra en el ETag aunque no en la fecha.
+
+
+@lru_cache(maxsize=None)
+def version_plantillas():
+    # Última modificación de las plantillas del proyecto: al desplegar cambios,
+    # las páginas guardadas por los navegadores dejan de valer.
+    carpetas = list(settings.TEMPLATES[0].get('DIRS', []))
+    carpetas += [os.path.join(app.path, 'templates') for app in apps.get_app_configs()
+                 if app.path.startswith(str(settings.BASE_DIR))]
+    ultima = 0
+    for carpeta in carpetas:
+        for raiz, _, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                ultima = max(ultima, os.path.getmtime(os.path.join(raiz, archivo)))
+    return ultima
+
+
+def _visitante(request):
+    # (partes del ETag, fecha de su último cambio o None): lo que cambia la página según quién la pide.
+    from .models import PerfilUsuario
+
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    if not request.user.is_authenticated:
+        return ('anonimo', token), None
+    perfil = PerfilUsuario.objects.filter(usuario_id=request.user.pk).values_list('updated_at', flat=True).first()
+    return (request.user.pk, token), perfil
+
+
+def pagina_condicional(marca):
+    """Decorador de vistas GET: 304 si la página no cambió desde la última visita.
+
+    `marca(request, *args, **kwargs)` devuelve (fecha_ultimo_cambio, ...) o None.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                # Con mensajes pendientes hay que renderizar para mostrarlos.
+                return vista(request, *args, **kwargs)
+            valores = marca(request, *args, **kwargs)
+            if valores is None or valores[0] is None:
+                return vista(request, *args, **kwargs)
+            visitante, cambio_visitante = _visitante(request)
+            plantillas = datetime.fromtimestamp(version_plantillas(), tz=timezone.utc)
+            # Last-Modified solo sirve a los navegadores que no mandan If-None-Match,
+            # así que también debe moverse si cambia el visitante o las plantillas.
+            fecha = max(f for f in (valores[0], cambio_visitante, plantillas) if f is not None)
+            etag = hashlib.sha1(repr((plantillas, *valores, *visitante, cambio_visitante)).encode()).hexdigest()
+            respuesta = condition(etag_func=lambda *a, **k: etag,
+                                  last_modified_func=lambda *a, **k: fecha)(vista)(request, *args, **kwargs)
+            # El navegador puede guardarla, pero debe preguntar cada vez (y es solo suya).
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            patch_vary_headers(respuesta, ('Cookie',))
+            return respuesta
+        return envoltura
+    return decorador
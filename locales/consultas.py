@@ -0,0 +1,135 @@
+import logging
+import logging.handlers
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+# Medición de las consultas SQL de cada petición (opcional: settings.CONSULTAS_MEDIR).
+#
+# Cuenta las consultas y el tiempo en la base de datos, y agrupa las sentencias por
+# "huella": el SQL con los valores ya sustituidos por marcadores, así que dos
+# consultas que solo cambian de id tienen la misma. Una huella que se repite
+# UMBRAL_REPETIDAS veces o más en la misma petición casi siempre es un N+1 (un
+# bucle de la plantilla que sigue una relación sin select_related/prefetch_related).
+#
+# El resultado va en cabeceras (X-Consultas*, Server-Timing), en el registro
+# 'locales.consultas' (archivo rotativo, ver LOGGING) y en un resumen por nombre de
+# URL de este proceso que los administradores ven en /consultas/.
+MEDIR = getattr(settings, 'CONSULTAS_MEDIR', False)
+UMBRAL_REPETIDAS = getattr(settings, 'CONSULTAS_UMBRAL_REPETIDAS', 3)
+CABECERAS = getattr(settings, 'CONSULTAS_CABECERAS', True)
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivoRotativo(logging.handlers.RotatingFileHandler):
+    # Crea la carpeta del registro al escribir la primera línea (con delay=True),
+    # no al importar settings: los comandos y las pruebas que no registran nada no la crean.
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+_LISTA_IN = re.compile(r'\((?:%s, )*%s\)')
+
+_resumen = defaultdict(lambda: {'peticiones': 0, 'consultas': 0, 'maximo': 0, 'tiempo': 0.0,
+                                'con_repetidas': 0, 'repetidas': Counter()})
+_resumen_lock = threading.Lock()
+
+
+def huella(sql):
+    # Las listas IN de distinto largo cuentan como la misma sentencia.
+    return _LISTA_IN.sub('(...)', sql)
+
+
+class Medicion:
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo = 0.0
+        self.huellas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.consultas += 1
+            self.huellas[huella(sql)] += 1
+
+    def repetidas(self):
+        """{huella: veces} de las sentencias sospechosas de N+1."""
+        return {sql: veces for sql, veces in self.huellas.most_common() if veces >= UMBRAL_REPETIDAS}
+
+
+def registrar(nombre_url, medicion):
+    repetidas = medicion.repetidas()
+    with _resumen_lock:
+        datos = _resumen[nombre_url]
+        datos['peticiones'] += 1
+        datos['consultas'] += medicion.consultas
+        datos['maximo'] = max(datos['maximo'], medicion.consultas)
+        datos['tiempo'] += medicion.tiempo
+        if repetidas:
+            datos['con_repetidas'] += 1
+            datos['repetidas'].update(repetidas)
+    return repetidas
+
+
+def resumen():
+    """Filas por nombre de URL, de la que más consultas hace por petición a la que menos."""
+    with _resumen_lock:
+        copia = {nombre: {**datos, 'repetidas': Counter(datos['repetidas'])} for nombre, datos in _resumen.items()}
+    filas = []
+    for nombre, datos in copia.items():
+        peticiones = datos['peticiones']
+        filas.append({
+            'url': nombre,
+            'peticiones': peticiones,
+            'consultas_media': round(datos['consultas'] / peticiones, 1),
+            'consultas_maximo': datos['maximo'],
+            'tiempo_medio_ms': round(datos['tiempo'] * 1000 / peticiones, 2),
+            'con_repetidas': datos['con_repetidas'],
+            'repetidas': datos['repetidas'].most_common(5),
+        })
+    return sorted(filas, key=lambda fila: fila['consultas_media'], reverse=True)
+
+
+def reiniciar():
+    with _resumen_lock:
+        _resumen.clear()
+
+
+class MedirConsultasMiddleware:
+    def __init__(self, get_response):
+        if not MEDIR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = Medicion()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(medicion))
+            response = self.get_response(request)
+        coincidencia = getattr(request, 'resolver_match', None)
+        nombre_url = (coincidencia.view_name if coincidencia else None) or '(sin nombre)'
+        repetidas = registrar(nombre_url, medicion)
+
+        tiempo_ms = medicion.tiempo * 1000
+        if CABECERAS:
+            response['X-Consultas'] = str(medicion.consultas)
+            response['X-Consultas-Tiempo'] = f'{tiempo_ms:.1f}'
+            response['X-Consultas-Repetidas'] = str(len(repetidas))
+            response['Server-Timing'] = f'db;dur={tiempo_ms:.1f};desc="{medicion.consultas} consultas"'
+        logger.info('%s %s [%s] %d consultas %.1f ms %d repetidas', request.method, request.path,
+                    nombre_url, medicion.consultas, tiempo_ms, len(repetidas))
+        for sql, veces in repetidas.items():
+            logger.warning('Posible N+1 en %s (%s): %d veces: %s', request.path, nombre_url, veces, sql)
+        return response
@@ -0,0 +1,73 @@
+import re
+
+from django.core.cache import cache
+
+from . import metricas, versiones
+from .texto import normalizar_texto
+
+# Los 15 departamentos y las 2 regiones autónomas de Nicaragua.
+DEPARTAMENTOS = [
+    'Boaco', 'Carazo', 'Chinandega', 'Chontales', 'Costa Caribe Norte', 'Costa Caribe Sur', 'Estelí',
+    'Granada', 'Jinotega', 'León', 'Madriz', 'Managua', 'Masaya', 'Matagalpa', 'Nueva Segovia',
+    'Río San Juan', 'Rivas',
+]
+
+# Otros nombres con los que aparecen en las direcciones (cabeceras, siglas, municipios conocidos).
+ALIAS = {
+    'raccn': 'Costa Caribe Norte', 'raan': 'Costa Caribe Norte', 'bilwi': 'Costa Caribe Norte',
+    'puerto cabezas': 'Costa Caribe Norte',
+    'raccs': 'Costa Caribe Sur', 'raas': 'Costa Caribe Sur', 'bluefields': 'Costa Caribe Sur',
+    'corn island': 'Costa Caribe Sur',
+    'ocotal': 'Nueva Segovia', 'somoto': 'Madriz', 'juigalpa': 'Chontales', 'san carlos': 'Río San Juan',
+    'jinotepe': 'Carazo', 'diriamba': 'Carazo', 'tipitapa': 'Managua', 'ciudad sandino': 'Managua',
+    'chichigalpa': 'Chinandega', 'san juan del sur': 'Rivas', 'ometepe': 'Rivas', 'moyogalpa': 'Rivas',
+}
+
+_NOMBRES = dict({normalizar_texto(d): d for d in DEPARTAMENTOS}, **ALIAS)
+_PATRONES = [
+    (re.compile(r'\b' + re.escape(clave) + r'\b'), departamento)
+    for clave, departamento in sorted(_NOMBRES.items(), key=lambda item: -len(item[0]))
+]
+
+
+def departamento_desde_direccion(direccion):
+    """Nombre oficial del departamento mencionado en una dirección, o None.
+
+    Las direcciones suelen terminar en "..., Managua, 11035, Nicaragua", así que
+    se revisan los tramos separados por comas de atrás hacia adelante.
+    """
+    for tramo in reversed(normalizar_texto(direccion).split(',')):
+        for patron, departamento in _PATRONES:
+            if patron.search(tramo):
+                return departamento
+    return None
+
+
+def asignar_departamento(instancia, direccion):
+    from .models import Departamento
+    nombre = departamento_desde_direccion(direccion)
+    instancia.departamento = Departamento.objects.filter(nombre=nombre).first() if nombre else None
+
+
+# La lista se guarda en la caché 'default' (de cada proceso) bajo una clave con la
+# versión compartida de locales/versiones.py: invalidarla en un proceso la invalida
+# en todos. El tiempo de vida solo limpia las listas de versiones viejas.
+VERSION = 'departamentos'
+SEGUNDOS_CACHE = 24 * 3600
+
+
+def departamentos_con_negocios():
+    # [(slug, nombre)] de los departamentos que tienen al menos un negocio.
+    clave = f'departamentos:con_negocios:{versiones.actual(VERSION)}'
+    lista = cache.get(clave)
+    metricas.registrar_cache('departamentos', lista is not None)
+    if lista is None:
+        from .models import Departamento
+        lista = list(Departamento.objects.filter(negocios__isnull=False).distinct()
+                     .order_by('nombre').values_list('slug', 'nombre'))
+        cache.set(clave, lista, SEGUNDOS_CACHE)
+    return lista
+
+
+def invalidar_lista():
+    versiones.subir(VERSION)
@@ -0,0 +1,190 @@
+import math
+import re
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from . import versiones
+from .texto import normalizar_texto
+
+# Índice de trigramas en memoria para encontrar negocios parecidos a una sugerencia.
+#
+# Los nombres se comparan por sus trigramas (sin acentos, mayúsculas ni signos; cada
+# palabra con dos espacios delante y uno detrás, como pg_trgm), así "Fritanga Doña
+# Tita" y "Fritanga Dona Tita, León" comparten casi todos. La similitud es un Dice
+# ponderado: cada trigrama pesa más cuanto menos negocios lo tienen, para que
+# palabras que se repiten en todo el directorio ("fritanga", "comedor", "hotel")
+# no basten para parecerse.
+#
+# Para no comparar con todos los negocios se usa un filtro de prefijo: un negocio
+# solo puede llegar al UMBRAL si comparte alguno de los trigramas más raros del
+# nombre buscado (los que quedan tras apartar los frecuentes cuyo peso, sumado, no
+# alcanza el solapamiento mínimo). Solo se recorren las listas de esos trigramas,
+# que son las cortas, y se verifica la similitud exacta de los candidatos.
+#
+# Igual que el autocompletado: cada proceso tiene su copia, las señales la
+# actualizan y suben su versión en locales/versiones.py, y los demás procesos, que
+# leen la misma versión, la reconstruyen.
+VERSION = 'duplicados'
+UMBRAL = getattr(settings, 'DUPLICADOS_UMBRAL', 0.75)
+MAX_CANDIDATOS = getattr(settings, 'DUPLICADOS_MAX_CANDIDATOS', 5)
+# Cuánto cuenta el parecido de la dirección en el orden de los candidatos
+PESO_DIRECCION = 0.15
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9 ]')
+
+Candidato = namedtuple('Candidato', 'negocio_id nombre direccion similitud')
+
+
+def version_actual():
+    return versiones.actual(VERSION)
+
+
+def _subir_version():
+    return versiones.subir(VERSION)
+
+
+def trigramas(texto):
+    palabras = _NO_ALFANUMERICO.sub(' ', normalizar_texto(texto)).split()
+    resultado = set()
+    for palabra in palabras:
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return frozenset(resultado)
+
+
+def _dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _cargar_elementos():
+    from .models import Negocio
+    return Negocio.objects.values_list('pk', 'name', 'address_text').iterator()
+
+
+class IndiceTrigramas:
+    def __init__(self, elementos, version):
+        self.version = version
+        self._lock = threading.Lock()
+        self._documentos = {}
+        self._listas = defaultdict(set)
+        for pk, nombre, direccion in elementos:
+            self._poner(pk, nombre, direccion)
+
+    def __len__(self):
+        return len(self._documentos)
+
+    def _poner(self, pk, nombre, direccion):
+        documento = (nombre, direccion or '', trigramas(nombre), trigramas(direccion or ''))
+        self._documentos[pk] = documento
+        for trigrama in documento[2]:
+            self._listas[trigrama].add(pk)
+
+    def poner(self, pk, nombre=None, direccion=None):
+        # Sustituye (o quita, si nombre es None) lo indexado para el negocio pk.
+        # Devuelve False si no cambió nada.
+        with self._lock:
+            anterior = self._documentos.get(pk)
+            if anterior is not None and nombre is not None and anterior[:2] == (nombre, direccion or ''):
+                return False
+            if anterior is None and nombre is None:
+                return False
+            if anterior is not None:
+                for trigrama in anterior[2]:
+                    lista = self._listas[trigrama]
+                    lista.discard(pk)
+                    if not lista:
+                        del self._listas[trigrama]
+                del self._documentos[pk]
+            if nombre is not None:
+                self._poner(pk, nombre, direccion)
+            return True
+
+    def _peso(self, trigrama):
+        # 1 para un trigrama que tienen todos los negocios, más cuanto más raro
+        return 1 + math.log((len(self._documentos) + 1) / (len(self._listas.get(trigrama, ())) + 1))
+
+    def candidatos(self, nombre, direccion='', limite=None, umbral=None, excluir=()):
+        """Negocios cuyo nombre se parece al dado, del más al menos parecido."""
+        umbral = UMBRAL if umbral is None else umbral
+        consulta = trigramas(nombre)
+        if not consulta:
+            return []
+        consulta_direccion = trigramas(direccion or '')
+        with self._lock:
+            pesos = {trigrama: self._peso(trigrama) for trigrama in consulta}
+            total = sum(pesos.values())
+            # Con Dice ponderado >= umbral, el solapamiento es al menos umbral·total/(2 - umbral).
+            minimo = umbral * total / (2 - umbral)
+            orden = sorted(consulta, key=pesos.get)
+            apartado, inicio = 0.0, 0
+            while inicio < len(orden) and apartado + pesos[orden[inicio]] < minimo:
+                apartado += pesos[orden[inicio]]
+                inicio += 1
+            ids = set()
+            for trigrama in orden[inicio:]:
+                ids.update(self._listas.get(trigrama, ()))
+
+            encontrados = []
+            for pk in ids.difference(excluir):
+                otro_nombre, otra_direccion, suyos, suyos_direccion = self._documentos[pk]
+                for trigrama in suyos - pesos.keys():
+                    pesos[trigrama] = self._peso(trigrama)
+                comun = sum(pesos[trigrama] for trigrama in consulta & suyos)
+                similitud = 2 * comun / (total + sum(pesos[trigrama] for trigrama in suyos))
+                if similitud < umbral:
+                    continue
+                if consulta_direccion and suyos_direccion:
+                    similitud = ((1 - PESO_DIRECCION) * similitud
+                                 + PESO_DIRECCION * _dice(consulta_direccion, suyos_direccion))
+                encontrados.append(Candidato(pk, otro_nombre, otra_direccion, round(similitud, 3)))
+        encontrados.sort(key=lambda candidato: (-candidato.similitud, candidato.negocio_id))
+        return encontrados[:limite or MAX_CANDIDATOS]
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice():
+    global _indice
+    version = version_actual()
+    indice = _indice
+    if indice is None or indice.version != version:
+        with _indice_lock:
+            if _indice is None or _indice.version != version:
+                _indice = IndiceTrigramas(_cargar_elementos(), version)
+            indice = _indice
+    return indice
+
+
+def actualizar(negocio, borrado=False):
+    """Refleja en el índice de este proceso el alta, cambio o baja de un negocio."""
+    indice = _indice
+    if indice is None:
+        _subir_version()
+        return
+    cambio = (indice.poner(negocio.pk) if borrado
+              else indice.poner(negocio.pk, negocio.name, negocio.address_text))
+    if cambio:
+        version = _subir_version()
+        if version == indice.version + 1:
+            indice.version = version
+
+
+def invalidar():
+    """Obliga a todos los procesos a reconstruir el índice (tras cargas masivas sin señales)."""
+    _subir_version()
+
+
+def candidatos(nombre, direccion='', limite=None, excluir=()):
+    return obtener_indice().candidatos(nombre, direccion, limite, excluir=excluir)
+
+
+def marcar(sugerencia):
+    """Apunta en la sugerencia el negocio más parecido (si lo hay); devuelve todos los candidatos."""
+    encontrados = candidatos(sugerencia.nombre_negocio, sugerencia.ubicacion_texto)
+    mejor = encontrados[0] if encontrados else None
+    sugerencia.duplicado_de_id = mejor.negocio_id if mejor else None
+    sugerencia.similitud_duplicado = mejor.similitud if mejor else None
+    return encontrados
@@ -0,0 +1,148 @@
+import gzip
+import posixpath
+import re
+from urllib.parse import unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.files.base import ContentFile
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:  # opcional: sin él solo se generan las versiones .gz
+    brotli = None
+
+# Archivos estáticos del sitio: Leaflet, htmx y las fuentes van dentro de la app
+# (locales/static/locales/vendor/) en vez de pedirse a unpkg, Google Fonts o
+# rawgit, y el CSS de cada plantilla está en locales/static/locales/css/.
+#
+# `manage.py collectstatic` hace de paso de construcción con EstaticosComprimidos:
+# 1. une los archivos de cada PAQUETE en uno solo (paquetes/<nombre>), corrigiendo
+#    las rutas relativas de los url() del CSS;
+# 2. añade el hash del contenido al nombre de cada archivo (ManifestStaticFilesStorage);
+# 3. deja junto a cada archivo de texto su versión .gz y, si está instalado
+#    `brotli`, .br, comprimidas una sola vez al máximo nivel.
+# Como el nombre cambia con el contenido, esos archivos se sirven con caché de un
+# año "immutable" (la vista `estatico`, o nginx con gzip_static/brotli_static).
+PAQUETES = getattr(settings, 'ESTATICOS_PAQUETES', {
+    'base.css': ['locales/css/fuentes.css', 'locales/css/base.css'],
+    'base.js': ['locales/vendor/htmx/htmx.min.js', 'locales/js/base.js'],
+    'mapa.css': ['locales/vendor/leaflet/leaflet.css'],
+    'mapa.js': ['locales/vendor/leaflet/leaflet.js'],
+})
+CARPETA = 'paquetes'
+COMPRIMIBLES = ('.css', '.js', '.svg', '.json', '.txt')
+TAMANO_MINIMO = 512  # bytes; por debajo la compresión no compensa
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_NORMAL = 'public, max-age=3600'
+
+_URL_CSS = re.compile(r"""url\(\s*(['"]?)(.*?)\1\s*\)""")
+_MAPA_FUENTE = re.compile(r'^(//# sourceMappingURL=.*|/\*# sourceMappingURL=.*\*/)$', re.M)
+
+
+def nombre_paquete(paquete):
+    return f'{CARPETA}/{paquete}'
+
+
+def _reubicar_urls(css, origen, destino):
+    # Las rutas relativas de `origen` pasan a ser relativas a `destino`.
+    desde = posixpath.dirname(origen)
+    hasta = posixpath.dirname(destino)
+
+    def reubicar(coincidencia):
+        comilla, url = coincidencia.groups()
+        if not url or url.startswith(('/', '#', 'data:')) or '://' in url:
+            return coincidencia.group(0)
+        nueva = posixpath.relpath(posixpath.normpath(posixpath.join(desde, url)), hasta)
+        return f'url({comilla}{nueva}{comilla})'
+
+    return _URL_CSS.sub(reubicar, css)
+
+
+def unir(paquete, leer):
+    """Contenido del paquete; `leer(ruta)` devuelve el texto de cada archivo fuente."""
+    destino = nombre_paquete(paquete)
+    partes = []
+    for origen in PAQUETES[paquete]:
+        texto = _MAPA_FUENTE.sub('', leer(origen)).strip()
+        if paquete.endswith('.css'):
+            texto = _reubicar_urls(texto, origen, destino)
+        partes.append(f'/* {origen} */\n{texto}\n')
+    # El ';' evita que dos scripts minificados se peguen en una sola expresión.
+    return ('\n' if paquete.endswith('.css') else ';\n').join(partes)
+
+
+def comprimir(datos):
+    """{extensión: bytes} con las versiones comprimidas que salen más pequeñas."""
+    versiones = {'.gz': gzip.compress(datos, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        versiones['.br'] = brotli.compress(datos, quality=11)
+    return {extension: comprimido for extension, comprimido in versiones.items() if len(comprimido) < len(datos)}
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+
+    def stored_name(self, name):
+        # Sin collectstatic (desarrollo, pruebas) no hay manifiesto: se usa el nombre tal cual.
+        limpio = self.clean_name(urlsplit(unquote(name)).path.strip())
+        if self.hash_key(limpio) not in self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = dict(paths)
+        for paquete in PAQUETES:
+            destino = self._guardar(nombre_paquete(paquete), unir(paquete, self._leer).encode())
+            paths[destino] = (self, destino)
+        yield from super().post_process(paths, dry_run, **options)
+        for nombre in sorted(set(paths) | set(self.hashed_files.values())):
+            if not nombre.endswith(COMPRIMIBLES) or not self.exists(nombre):
+                continue
+            with self.open(nombre) as archivo:
+                datos = archivo.read()
+            if len(datos) < TAMANO_MINIMO:
+                continue
+            for extension, comprimido in comprimir(datos).items():
+                self._guardar(nombre + extension, comprimido)
+
+    def _leer(self, ruta):
+        with self.open(ruta) as archivo:
+            return archivo.read().decode('utf-8')
+
+    def _guardar(self, nombre, datos):
+        if self.exists(nombre):
+            self.delete(nombre)
+        return self._save(nombre, ContentFile(datos))
+
+    def paquete_construido(self, paquete):
+        return self.hash_key(nombre_paquete(paquete)) in self.hashed_files
+
+    @cached_property
+    def nombres_con_hash(self):
+        return set(self.hashed_files.values())
+
+
+def archivos_de(paquete):
+    """Rutas que hay que enlazar para un paquete: el archivo unido si ya se
+    construyó con collectstatic (y no estamos en DEBUG), o sus fuentes una a una."""
+    if (not settings.DEBUG and isinstance(staticfiles_storage, EstaticosComprimidos)
+            and staticfiles_storage.paquete_construido(paquete)):
+        return [nombre_paquete(paquete)]
+    return list(PAQUETES[paquete])
+
+
+def es_inmutable(ruta):
+    # Solo los nombres con hash del manifiesto: su contenido no cambia nunca.
+    return isinstance(staticfiles_storage, EstaticosComprimidos) and ruta in staticfiles_storage.nombres_con_hash
+
+
+def version_servida(ruta, aceptadas):
+    """(ruta, Content-Encoding) de la mejor versión de `ruta` según Accept-Encoding."""
+    aceptadas = {parte.split(';')[0].strip().lower() for parte in aceptadas.split(',')}
+    for extension, codificacion in (('.br', 'br'), ('.gz', 'gzip')):
+        if codificacion in aceptadas and staticfiles_storage.exists(ruta + extension):
+            return ruta + extension, codificacion
+    return ruta, None
@@ -5,6 +5,7 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Field
 from .models import Relato, SugerenciaNegocio, Receta, PerfilUsuario, ReclamoNegocio, Negocio, MensajePropietario, \
     Comentario, Calificacion
+from .subidas import ImagenSubidaField, PdfSubidoField
 
 
 # Registro de usuario
@@ -48,6 +49,7 @@ class PerfilUsuarioForm(forms.ModelForm):
     class Meta:
         model = PerfilUsuario
         fields = ['biografia', 'telefono', 'ubicacion', 'avatar', 'rango']
+        field_classes = {'avatar': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -67,6 +69,7 @@ class PerfilUsuarioUpdateForm(forms.ModelForm):
     class Meta:
         model = PerfilUsuario
         fields = ['biografia', 'telefono', 'ubicacion', 'avatar']
+        field_classes = {'avatar': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -89,6 +92,7 @@ class RelatoForm(forms.ModelForm):
     class Meta:
         model = Relato
         fields = ['title', 'content', 'image', 'latitud', 'longitud', 'ubicacion_texto']
+        field_classes = {'image': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -121,6 +125,7 @@ class SugerenciaNegocioForm(forms.ModelForm):
         model = SugerenciaNegocio
         fields = ['nombre_negocio', 'ubicacion_texto', 'latitud', 'longitud',
                   'comentarios', 'categoria_relacionada', 'foto_referencia']
+        field_classes = {'foto_referencia': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -144,6 +149,7 @@ class RecetaForm(forms.ModelForm):
     class Meta:
         model = Receta
         fields = ['titulo', 'descripcion', 'ingredientes', 'pasos', 'imagen']
+        field_classes = {'imagen': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -163,6 +169,7 @@ class ReclamoNegocioForm(forms.ModelForm):
     class Meta:
         model = ReclamoNegocio
         fields = ['negocio', 'contrato_pdf', 'mensaje']
+        field_classes = {'contrato_pdf': PdfSubidoField}
         widgets = {
             'mensaje': forms.Textarea(attrs={'rows': 4, 'placeholder': 'Describe tu relación con el negocio...'}),
         }
@@ -210,6 +217,7 @@ class NegocioForm(forms.ModelForm):
             'is_turismo',
             'foto_principal'  # <-- Asegúrate de que este nombre sea correcto
         ]
+        field_classes = {'foto_principal': ImagenSubidaField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
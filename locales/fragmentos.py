@@ -0,0 +1,107 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.db import transaction
+
+from . import metricas, versiones as versiones_compartidas
+
+# Caché de fragmentos de plantilla: {% fragmento 'nombre' variaciones... %}.
+#
+# Cada fragmento declara aquí de qué datos depende (modelos u otras "dependencias"
+# con nombre). Cada dependencia tiene un número de versión (locales/versiones.py,
+# compartido por todos los procesos) y la clave
+# del fragmento incluye las versiones de todas las suyas, así que basta con subir
+# la versión (señales post_save/post_delete, acciones masivas del admin) para que
+# la próxima visita lo vuelva a generar: no hay que saber qué claves borrar y
+# nunca se sirve una versión vieja. Las claves antiguas caducan solas.
+#
+# El contenido va en la caché 'fragmentos' (settings.CACHES): en memoria del proceso
+# (LRU) o en disco para que varios procesos compartan lo ya generado. Las versiones
+# no dependen de ella, así que una invalidación llega a todos en cualquier caso.
+SEGUNDOS = getattr(settings, 'FRAGMENTOS_SEGUNDOS', 24 * 3600)
+
+FRAGMENTOS = {
+    'home_relatos': ('locales.relato', 'auth.user'),
+    'home_negocios': ('locales.negocio', 'locales.calificacion', 'ranking'),
+    'lista_negocios': ('locales.negocio', 'locales.categoria'),
+    'biblioteca_recetas': ('locales.receta', 'auth.user'),
+    'biblioteca_saberes': ('locales.saberpopular', 'auth.user'),
+    'eventos': ('eventos.eventocultural',),
+}
+
+_contadores = Counter()
+_contadores_lock = threading.Lock()
+
+
+def _cache():
+    try:
+        return caches['fragmentos']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _dependencia(dependencia):
+    # Un modelo se identifica por su etiqueta ('locales.negocio').
+    meta = getattr(dependencia, '_meta', None)
+    return meta.label_lower if meta else dependencia
+
+
+def _version(dependencia):
+    return f'fragmentos:{dependencia}'
+
+
+def versiones(dependencias):
+    return versiones_compartidas.varias([_version(d) for d in dependencias])
+
+
+def _subir(dependencia):
+    versiones_compartidas.subir(_version(dependencia))
+
+
+def invalidar(*dependencias):
+    """Sube la versión de cada dependencia (modelo o nombre) cuando termine la transacción.
+
+    Si se subiera antes del COMMIT, otra petición podría guardar con la versión
+    nueva un fragmento generado con los datos viejos.
+    """
+    for dependencia in {_dependencia(d) for d in dependencias}:
+        transaction.on_commit(lambda d=dependencia: _subir(d))
+
+
+def clave(nombre, variaciones=()):
+    dependencias = FRAGMENTOS[nombre]
+    partes = [*versiones(dependencias), *variaciones]
+    huella = hashlib.md5(repr(partes).encode()).hexdigest()
+    return f'fragmentos:{nombre}:{huella}'
+
+
+def obtener(nombre, variaciones, generar):
+    """Contenido del fragmento desde la caché, o generado con `generar()` y guardado."""
+    cache = _cache()
+    clave_fragmento = clave(nombre, variaciones)
+    contenido = cache.get(clave_fragmento)
+    acierto = contenido is not None
+    if not acierto:
+        contenido = generar()
+        cache.set(clave_fragmento, contenido, SEGUNDOS)
+    with _contadores_lock:
+        _contadores[(nombre, 'aciertos' if acierto else 'fallos')] += 1
+    metricas.registrar_cache(f'fragmentos:{nombre}', acierto)
+    return contenido
+
+
+def estadisticas():
+    """{nombre: {'aciertos', 'fallos', 'tasa'}} de este proceso desde que arrancó."""
+    with _contadores_lock:
+        copia = dict(_contadores)
+    resultado = {}
+    for nombre in FRAGMENTOS:
+        aciertos = copia.get((nombre, 'aciertos'), 0)
+        fallos = copia.get((nombre, 'fallos'), 0)
+        total = aciertos + fallos
+        resultado[nombre] = {'aciertos': aciertos, 'fallos': fallos,
+                             'tasa': round(aciertos / total, 3) if total else None}
+    return resultado
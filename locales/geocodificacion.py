@@ -0,0 +1,288 @@
+import json
+import logging
+import re
+import time
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .mapa import invalidar_mapa
+from .texto import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Tras un fallo del proveedor, la dirección cuenta como "no encontrada" durante este tiempo.
+REINTENTO_TRAS_FALLO = getattr(settings, 'GEOCODIFICACION_REINTENTO_TRAS_FALLO', 6 * 3600)  # segundos
+# Con False, los negocios guardados con un proveedor remoto quedan sin coordenadas hasta
+# que se ejecute `manage.py geocodificar_negocios` (por ejemplo desde cron).
+GEOCODIFICAR_AL_GUARDAR = getattr(settings, 'GEOCODIFICAR_AL_GUARDAR', True)
+
+
+class Geocodificador:
+    """Convierte una dirección de texto en coordenadas (latitud, longitud)."""
+    nombre = 'base'
+    remoto = False  # True si cada consulta sale a la red
+
+    def geocodificar(self, direccion):
+        raise NotImplementedError
+
+
+class GeocodificadorNominatim(Geocodificador):
+    """Consulta el servicio público de Nominatim (OpenStreetMap).
+
+    Nominatim pide como máximo una petición por segundo, así que las llamadas
+    consecutivas se espacian con `intervalo_minimo`.
+    """
+    nombre = 'nominatim'
+    remoto = True
+    url = 'https://nominatim.openstreetmap.org/search'
+
+    def __init__(self, user_agent='memorias-de-mi-pueblo', timeout=5, pais='ni', intervalo_minimo=1.0):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.pais = pais
+        self.intervalo_minimo = intervalo_minimo
+        self._ultima_peticion = 0.0
+
+    def geocodificar(self, direccion):
+        espera = self.intervalo_minimo - (time.monotonic() - self._ultima_peticion)
+        if espera > 0:
+            time.sleep(espera)
+        parametros = {'format': 'json', 'limit': 1, 'q': direccion}
+        if self.pais:
+            parametros['countrycodes'] = self.pais
+        peticion = Request(f'{self.url}?{urlencode(parametros)}', headers={'User-Agent': self.user_agent})
+        try:
+            with urlopen(peticion, timeout=self.timeout) as respuesta:
+                datos = json.load(respuesta)
+        finally:
+            self._ultima_peticion = time.monotonic()
+        if not datos:
+            return None
+        return float(datos[0]['lat']), float(datos[0]['lon'])
+
+
+class GeocodificadorGazetteer(Geocodificador):
+    """Nomenclátor local con las cabeceras y ciudades principales de Nicaragua.
+
+    No hace peticiones de red: busca el nombre de lugar más largo contenido en
+    la dirección. Sirve para desarrollo y como respaldo sin conexión.
+    """
+    nombre = 'gazetteer'
+
+    LUGARES = {
+        'managua': (12.136389, -86.251389),
+        'leon': (12.437800, -86.878000),
+        'granada': (11.934400, -85.956000),
+        'masaya': (11.974400, -86.094200),
+        'chinandega': (12.629400, -87.131100),
+        'esteli': (13.091900, -86.353800),
+        'matagalpa': (12.925600, -85.917500),
+        'jinotega': (13.091000, -86.002300),
+        'nueva segovia': (13.632200, -86.475700),
+        'ocotal': (13.632200, -86.475700),
+        'madriz': (13.481000, -86.583300),
+        'somoto': (13.481000, -86.583300),
+        'boaco': (12.472200, -85.658600),
+        'chontales': (12.106300, -85.364500),
+        'juigalpa': (12.106300, -85.364500),
+        'rio san juan': (11.123600, -84.778600),
+        'san carlos': (11.123600, -84.778600),
+        'rivas': (11.437200, -85.826400),
+        'carazo': (11.849400, -86.199200),
+        'jinotepe': (11.849400, -86.199200),
+        'diriamba': (11.858000, -86.239000),
+        'tipitapa': (12.197000, -86.097000),
+        'chichigalpa': (12.577000, -87.027000),
+        'san juan del sur': (11.252900, -85.870500),
+        'ometepe': (11.540000, -85.700000),
+        'moyogalpa': (11.540000, -85.700000),
+        'raccn': (14.030000, -83.388000),
+        'costa caribe norte': (14.030000, -83.388000),
+        'bilwi': (14.030000, -83.388000),
+        'puerto cabezas': (14.030000, -83.388000),
+        'raccs': (12.013700, -83.763500),
+        'costa caribe sur': (12.013700, -83.763500),
+        'bluefields': (12.013700, -83.763500),
+        'corn island': (12.169000, -83.040000),
+    }
+
+    def __init__(self, lugares=None):
+        self.lugares = dict(self.LUGARES, **(lugares or {}))
+        # Los nombres más largos primero: "san juan del sur" antes que "san carlos".
+        self._patrones = [
+            (re.compile(r'\b' + re.escape(nombre) + r'\b'), coordenadas)
+            for nombre, coordenadas in sorted(self.lugares.items(), key=lambda item: -len(item[0]))
+        ]
+
+    def geocodificar(self, direccion):
+        texto = normalizar_texto(direccion)
+        for patron, coordenadas in self._patrones:
+            if patron.search(texto):
+                return coordenadas
+        return None
+
+
+_geocodificador = None
+
+
+def obtener_geocodificador():
+    global _geocodificador
+    backend = getattr(settings, 'GEOCODIFICADOR_BACKEND', 'locales.geocodificacion.GeocodificadorGazetteer')
+    if _geocodificador is None or _geocodificador[0] != backend:
+        opciones = getattr(settings, 'GEOCODIFICADOR_OPCIONES', {})
+        _geocodificador = (backend, import_string(backend)(**opciones))
+    return _geocodificador[1]
+
+
+def normalizar_direccion(direccion):
+    return normalizar_texto(direccion).strip(' ,.')[:255]
+
+
+def _a_decimal(valor):
+    return Decimal(str(round(valor, 7)))
+
+
+def geocodificar_direccion(direccion, geocodificador=None):
+    """Devuelve (latitud, longitud) como Decimal, o None si no se encontró.
+
+    Las respuestas, incluidas las vacías y los fallos, se guardan en
+    UbicacionGeocodificada: una dirección conocida no se vuelve a consultar al
+    proveedor, y una que falló no se reintenta hasta pasado REINTENTO_TRAS_FALLO.
+    """
+    clave = normalizar_direccion(direccion)
+    if not clave:
+        return None
+    entrada = _entrada_vigente(clave)
+    if entrada is None:
+        entrada = _consultar_y_guardar(clave, direccion, geocodificador or obtener_geocodificador())
+    return entrada.coordenadas()
+
+
+def _entrada_vigente(clave):
+    from .models import UbicacionGeocodificada
+
+    entrada = UbicacionGeocodificada.objects.filter(direccion_normalizada=clave).first()
+    return entrada if entrada is not None and entrada.vigente() else None
+
+
+def _consultar_y_guardar(clave, direccion, geocodificador):
+    from .models import UbicacionGeocodificada
+
+    reintentar_despues = None
+    try:
+        coordenadas = geocodificador.geocodificar(direccion)
+    except Exception as e:
+        # El fallo también se guarda, como "no encontrada" con fecha de caducidad: sin esto
+        # cada guardado del negocio volvería a esperar al proveedor caído.
+        logger.warning("No se pudo geocodificar %r: %s", direccion, e)
+        coordenadas = None
+        reintentar_despues = timezone.now() + timedelta(seconds=REINTENTO_TRAS_FALLO)
+    latitud, longitud = (_a_decimal(coordenadas[0]), _a_decimal(coordenadas[1])) if coordenadas else (None, None)
+    entrada, _ = UbicacionGeocodificada.objects.update_or_create(
+        direccion_normalizada=clave,
+        defaults={'latitud': latitud, 'longitud': longitud, 'proveedor': geocodificador.nombre,
+                  'fecha': timezone.now(), 'reintentar_despues': reintentar_despues},
+    )
+    return entrada
+
+
+def geocodificar_negocio(negocio, geocodificador=None):
+    # Solo asigna los campos; quien llama decide cuándo guardar.
+    coordenadas = geocodificar_direccion(negocio.address_text, geocodificador)
+    negocio.latitud, negocio.longitud = coordenadas if coordenadas else (None, None)
+    return coordenadas is not None
+
+
+def geocodificar_al_guardar(negocio):
+    """Versión de geocodificar_negocio para la señal pre_save, que nunca sale a la red.
+
+    Con un proveedor local (o si la dirección ya está en la caché) asigna las
+    coordenadas enseguida. Si el proveedor es remoto y la dirección es nueva, deja
+    el negocio sin coordenadas y devuelve False: la consulta se hace después del
+    commit con programar_geocodificacion, fuera de la transacción del guardado.
+    """
+    geocodificador = obtener_geocodificador()
+    clave = normalizar_direccion(negocio.address_text)
+    entrada = _entrada_vigente(clave) if clave else None
+    if entrada is None and clave:
+        if geocodificador.remoto:
+            negocio.latitud = negocio.longitud = None
+            return False
+        entrada = _consultar_y_guardar(clave, negocio.address_text, geocodificador)
+    coordenadas = entrada.coordenadas() if entrada else None
+    negocio.latitud, negocio.longitud = coordenadas if coordenadas else (None, None)
+    return True
+
+
+def programar_geocodificacion(negocio_id):
+    if GEOCODIFICAR_AL_GUARDAR:
+        transaction.on_commit(lambda: geocodificar_pendiente(negocio_id))
+
+
+def geocodificar_pendiente(negocio_id):
+    """Consulta al proveedor la dirección de un negocio ya guardado y guarda sus coordenadas."""
+    from .models import Negocio
+
+    negocio = Negocio.objects.filter(pk=negocio_id).only('id', 'address_text').first()
+    if negocio is None or not geocodificar_negocio(negocio):
+        return
+    # update() no dispara señales; el filtro por address_text descarta el resultado si
+    # la dirección cambió mientras se esperaba al proveedor.
+    Negocio.objects.filter(pk=negocio_id, address_text=negocio.address_text).update(
+        latitud=negocio.latitud, longitud=negocio.longitud, updated_at=timezone.now())
+    invalidar_mapa()
+
+
+def asignar_coordenadas(negocios, geocodificador=None):
+    """Como geocodificar_negocio para varios a la vez, sin guardarlos.
+
+    Las direcciones ya conocidas se leen de la caché con una sola consulta y cada
+    dirección desconocida se pide una vez al proveedor. Devuelve cuántos negocios
+    quedaron con coordenadas.
+    """
+    from .models import UbicacionGeocodificada
+
+    geocodificador = geocodificador or obtener_geocodificador()
+    claves = [normalizar_direccion(n.address_text) for n in negocios]
+    conocidas = {
+        u.direccion_normalizada: u
+        for u in UbicacionGeocodificada.objects.filter(direccion_normalizada__in=set(claves))
+        if u.vigente()
+    }
+    encontrados = 0
+    for negocio, clave in zip(negocios, claves):
+        if clave and clave not in conocidas:
+            conocidas[clave] = _consultar_y_guardar(clave, negocio.address_text, geocodificador)
+        entrada = conocidas.get(clave)
+        coordenadas = entrada.coordenadas() if entrada else None
+        negocio.latitud, negocio.longitud = coordenadas if coordenadas else (None, None)
+        encontrados += coordenadas is not None
+    return encontrados
+
+
+def geocodificar_lote(negocios, geocodificador=None, tamano_lote=200):
+    """Geocodifica varios negocios resolviendo cada dirección distinta una sola vez.
+
+    Los negocios se guardan con bulk_update. Devuelve (actualizados, sin_resultado).
+    """
+    from .models import Negocio
+
+    geocodificador = geocodificador or obtener_geocodificador()
+    actualizados = sin_resultado = 0
+    negocios = list(negocios)
+    for inicio in range(0, len(negocios), tamano_lote):
+        lote = negocios[inicio:inicio + tamano_lote]
+        encontrados = asignar_coordenadas(lote, geocodificador)
+        actualizados += encontrados
+        sin_resultado += len(lote) - encontrados
+        Negocio.objects.bulk_update(lote, ['latitud', 'longitud'])
+    # bulk_update no dispara señales: los grupos del mapa se invalidan aquí.
+    invalidar_mapa()
+    return actualizados, sin_resultado
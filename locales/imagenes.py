@@ -0,0 +1,159 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import InvalidStorageError, default_storage, storages
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import versiones
+
+# Versiones reducidas (derivados) de las imágenes subidas.
+#
+# Cada derivado se guarda junto a los demás en MEDIA_ROOT/derivados/ con un
+# nombre que sale del original, el ancho y el formato, así se genera una sola vez
+# y el nombre cambia solo si cambia el original (Django nunca reutiliza nombres).
+# Se crean a demanda desde las etiquetas de plantilla o de antemano con
+# `manage.py generar_derivados`.
+# Los originales se leen del almacenamiento por defecto; los derivados, que tienen
+# nombres fijos, se escriben en el almacenamiento 'derivados'.
+CARPETA = getattr(settings, 'IMAGENES_CARPETA_DERIVADOS', 'derivados')
+CALIDAD = {'webp': 80, 'jpeg': 82}
+EXTENSIONES = {'webp': 'webp', 'jpeg': 'jpg'}
+FORMATOS = ('webp', 'jpeg')
+
+# Tamaños por uso: anchos a generar y atributo sizes del <img>.
+TAMANOS = {
+    'miniatura': ((100, 200), '100px'),
+    'avatar': ((80, 160, 240), '120px'),
+    'tarjeta': ((320, 640), '(max-width: 600px) 100vw, 320px'),
+    'detalle': ((640, 1024, 1600), '(max-width: 700px) 100vw, 600px'),
+}
+
+# Lo que se sabe de cada derivado (su ancho real) va en la caché 'default' de cada
+# proceso bajo una clave con la versión compartida de locales/versiones.py: al borrar
+# derivados se sube y ningún proceso sigue apuntando a archivos que ya no existen.
+VERSION = 'imagenes'
+
+# Si un original no se puede abrir, no se reintenta en cada petición.
+SEGUNDOS_ERROR = 3600
+_SIN_DERIVADO = 0
+
+
+def _almacen():
+    try:
+        return storages['derivados']
+    except InvalidStorageError:
+        return default_storage
+
+
+def nombre_derivado(nombre, ancho, formato):
+    base, _ = os.path.splitext(nombre)
+    return f'{CARPETA}/{base}-{ancho}w.{EXTENSIONES[formato]}'
+
+
+def _clave(nombre_derivado, version):
+    return f'imagenes:ancho:{version}:{nombre_derivado}'
+
+
+def _guardar(original, nombre, ancho, formato):
+    """Genera un derivado y devuelve su ancho real (nunca se amplía el original)."""
+    imagen = original
+    if imagen.width > ancho:
+        imagen = imagen.resize((ancho, max(1, round(imagen.height * ancho / imagen.width))), Image.LANCZOS)
+    if formato == 'jpeg' and imagen.mode in ('RGBA', 'LA'):
+        # JPEG no tiene transparencia: se pone sobre fondo blanco en vez de negro.
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        imagen = fondo
+    elif imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if formato == 'webp' and 'transparency' in imagen.info else 'RGB')
+    contenido = BytesIO()
+    imagen.save(contenido, format=formato.upper(), quality=CALIDAD[formato], optimize=True)
+    destino = nombre_derivado(nombre, ancho, formato)
+    almacen = _almacen()
+    if almacen.exists(destino):
+        almacen.delete(destino)
+    almacen.save(destino, ContentFile(contenido.getvalue()))
+    return imagen.width
+
+
+def generar(campo, anchos, formatos=FORMATOS, forzar=False):
+    """Asegura que existan los derivados de un archivo de imagen.
+
+    Devuelve {(ancho, formato): ancho_real}; los que no se pudieron generar
+    quedan fuera. El original se abre una sola vez para todos los tamaños.
+    """
+    if not campo:
+        return {}
+    nombre = campo.name
+    pedidos = [(ancho, formato) for ancho in anchos for formato in formatos]
+    version = versiones.actual(VERSION)
+    claves = {pedido: _clave(nombre_derivado(nombre, *pedido), version) for pedido in pedidos}
+    conocidos = {} if forzar else cache.get_many(claves.values())
+    resultado = {}
+    faltan = []
+    for pedido, clave in claves.items():
+        if clave in conocidos:
+            if conocidos[clave] != _SIN_DERIVADO:
+                resultado[pedido] = conocidos[clave]
+        else:
+            faltan.append(pedido)
+    if not faltan:
+        return resultado
+
+    try:
+        with default_storage.open(nombre) as archivo, Image.open(archivo) as abierta:
+            original = ImageOps.exif_transpose(abierta)
+            if original.mode == 'P':
+                original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+            for ancho, formato in faltan:
+                destino = nombre_derivado(nombre, ancho, formato)
+                if not forzar and _almacen().exists(destino):
+                    with _almacen().open(destino) as existente, Image.open(existente) as derivado:
+                        real = derivado.width
+                else:
+                    real = _guardar(original, nombre, ancho, formato)
+                resultado[(ancho, formato)] = real
+                cache.set(claves[(ancho, formato)], real, None)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError, ValueError):
+        cache.set_many({claves[pedido]: _SIN_DERIVADO for pedido in faltan}, SEGUNDOS_ERROR)
+    return resultado
+
+
+def srcset(campo, tamano, formato):
+    """(srcset, url_menor) de un campo en un formato, o (None, None) si no hay derivados."""
+    anchos, _ = TAMANOS[tamano]
+    generados = generar(campo, anchos)
+    reales = {}
+    for ancho in anchos:
+        if (ancho, formato) in generados:
+            # Si el original es pequeño varios anchos dan el mismo archivo útil: basta uno.
+            reales.setdefault(generados[(ancho, formato)], nombre_derivado(campo.name, ancho, formato))
+    if not reales:
+        return None, None
+    almacen = _almacen()
+    partes = [f'{almacen.url(nombre)} {real}w' for real, nombre in sorted(reales.items())]
+    return ', '.join(partes), almacen.url(reales[min(reales)])
+
+
+def url_derivado(campo, ancho, formato='webp'):
+    """URL de un único derivado; si no se puede generar, la del original."""
+    if not campo:
+        return ''
+    generados = generar(campo, (ancho,), (formato,))
+    if (ancho, formato) in generados:
+        return _almacen().url(nombre_derivado(campo.name, ancho, formato))
+    return campo.url
+
+
+def borrar_derivados(nombre):
+    # Quita del disco todos los derivados de un original y lo que sabían de ellos las cachés.
+    for tamano in TAMANOS.values():
+        for ancho in tamano[0]:
+            for formato in FORMATOS:
+                destino = nombre_derivado(nombre, ancho, formato)
+                if _almacen().exists(destino):
+                    _almacen().delete(destino)
+    versiones.subir(VERSION)
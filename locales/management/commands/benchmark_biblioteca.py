@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from locales import busqueda
+from locales.models import Receta, SaberPopular
+
+PALABRAS = (
+    'maíz yuca plátano frijol queso cuajada chicharrón repollo tomate cebolla chile achiote cacao café '
+    'pinol pinolillo tiste rosquilla nacatamal vigorón indio viejo gallo pinto quesillo tortilla manteca '
+    'masa cerdo res gallina naranja agria hoja chayote ayote pipián elote atol güirila leña comal '
+    'abuela pueblo fiesta patronal mercado río lago volcán luna lluvia cosecha remedio hierba sábila '
+    'manzanilla culantro hierbabuena jengibre canela clavo miel dulce sal vinagre olla barro'
+).split()
+CONSULTAS = ['nacatamal', 'maiz cuajada', 'pinol', 'hierbabuena remedio', 'gallo pinto']
+
+
+SILABAS = 'ma ta co ri lo pe sa nu gui ca jo te ba chi ña ro la me'.split()
+
+
+def _texto(azar, palabras, relleno):
+    # Una de cada diez palabras es culinaria; el resto, relleno sintético que
+    # imita un vocabulario amplio (los términos buscados no aparecen en todo el corpus).
+    return ' '.join(azar.choice(PALABRAS) if azar.random() < 0.1 else azar.choice(relleno) for _ in range(palabras))
+
+
+class Command(BaseCommand):
+    help = ("Compara la búsqueda de la biblioteca con icontains y con el índice FTS5 sobre un corpus "
+            "sintético. Los datos se crean dentro de una transacción que se revierte al final.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documentos', type=int, default=20000,
+                            help="Recetas y saberes a sembrar de cada tipo (por defecto 20000).")
+        parser.add_argument('--repeticiones', type=int, default=5, help="Veces que se mide cada consulta.")
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not busqueda.disponible():
+            raise CommandError("El índice FTS5 no está disponible (requiere SQLite y la migración 0011).")
+        azar = random.Random(options['semilla'])
+        total = options['documentos']
+        relleno = [''.join(azar.choice(SILABAS) for _ in range(azar.randint(2, 4))) for _ in range(20000)]
+        with transaction.atomic():
+            inicio = time.perf_counter()
+            Receta.objects.bulk_create([
+                Receta(titulo=_texto(azar, 3, relleno), descripcion=_texto(azar, 30, relleno), ingredientes=_texto(azar, 15, relleno),
+                       pasos=_texto(azar, 80, relleno), estado='approved')
+                for _ in range(total)
+            ], batch_size=1000)
+            SaberPopular.objects.bulk_create([
+                SaberPopular(titulo=_texto(azar, 3, relleno), contenido=_texto(azar, 120, relleno), estado='approved')
+                for _ in range(total)
+            ], batch_size=1000)
+            self.stdout.write(f"Sembrados {total} recetas y {total} saberes en {time.perf_counter() - inicio:.1f}s")
+
+            inicio = time.perf_counter()
+            busqueda.reconstruir()
+            self.stdout.write(f"Índice reconstruido en {time.perf_counter() - inicio:.1f}s\n")
+
+            self.stdout.write(f"{'consulta':<22}{'icontains (ms)':>16}{'fts5 (ms)':>12}{'resultados':>14}")
+            for consulta in CONSULTAS:
+                lento = self._medir(lambda: self._icontains(consulta), options['repeticiones'])
+                # buscar() cachea recuento y páginas: sin vaciar la caché antes de cada
+                # repetición se mediría la caché y no la consulta MATCH.
+                rapido = self._medir(lambda: self._fts(consulta), options['repeticiones'],
+                                     antes=busqueda.invalidar_resultados)
+                resultados = busqueda.buscar(consulta, ['receta', 'saber']).count()
+                self.stdout.write(f"{consulta:<22}{lento:>16.1f}{rapido:>12.1f}{resultados:>14}")
+            transaction.set_rollback(True)
+
+    def _medir(self, funcion, repeticiones, antes=None):
+        tiempos = []
+        for _ in range(repeticiones):
+            if antes:
+                antes()
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return sorted(tiempos)[len(tiempos) // 2]
+
+    def _icontains(self, consulta):
+        # Lo que hacía la vista antes: recuento y primera página de cada listado.
+        recetas = Receta.objects.filter(estado='approved').filter(
+            Q(titulo__icontains=consulta) | Q(ingredientes__icontains=consulta) | Q(pasos__icontains=consulta)
+        ).order_by('-fecha_creacion')
+        saberes = SaberPopular.objects.filter(estado='approved').filter(
+            Q(titulo__icontains=consulta) | Q(contenido__icontains=consulta)
+        ).order_by('-fecha_creacion')
+        for queryset in (recetas, saberes):
+            queryset.count()
+            list(queryset[:10])
+
+    def _fts(self, consulta):
+        for tipo in ('receta', 'saber'):
+            resultados = busqueda.buscar(consulta, [tipo])
+            resultados.count()
+            resultados[:10]
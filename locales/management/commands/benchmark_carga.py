@@ -0,0 +1,180 @@
+import json
+import random
+import threading
+import time
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from eventos.models import EventoCultural
+from locales.models import Negocio
+from .seed_bench import CONTRASENA, PREFIJO
+
+# Mezcla de rutas con su peso (proporción de peticiones). Las que llevan usuario
+# necesitan sesión: cada trabajador inicia sesión con un usuario de seed_bench.
+MEZCLA = {
+    'home': 25,
+    'lista_negocios': 15,
+    'detalle_negocio': 30,
+    'biblioteca': 10,
+    'eventos': 10,
+    'comentar_y_calificar': 10,
+}
+
+
+class SinRedirecciones(HTTPRedirectHandler):
+    # Se mide cada petición por separado: un 302 es una respuesta válida, no se sigue.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def percentil(valores, p):
+    # Método del rango más cercano sobre la lista ya ordenada
+    if not valores:
+        return None
+    return round(valores[min(len(valores) - 1, max(0, int(round(p / 100 * len(valores) + 0.5)) - 1))], 1)
+
+
+class Trabajador(threading.Thread):
+    def __init__(self, numero, base, negocios, paginas_eventos, semilla, usuario):
+        super().__init__(daemon=True)
+        self.base = base
+        self.negocios = negocios
+        self.paginas_eventos = paginas_eventos
+        self.fin = None  # se fija justo antes de arrancar, cuando todos han iniciado sesión
+        self.azar = random.Random(semilla + numero)
+        self.usuario = usuario
+        self.galletas = CookieJar()
+        self.abridor = build_opener(HTTPCookieProcessor(self.galletas), SinRedirecciones)
+        self.resultados = {nombre: {'tiempos': [], 'errores': 0, 'estados': {}} for nombre in MEZCLA}
+
+    def _pedir(self, ruta, datos=None):
+        cuerpo = None
+        cabeceras = {'User-Agent': 'benchmark_carga'}
+        if datos is not None:
+            datos = dict(datos, csrfmiddlewaretoken=self._csrf())
+            cuerpo = urlencode(datos).encode()
+            cabeceras['Referer'] = self.base + ruta
+        peticion = Request(self.base + ruta, data=cuerpo, headers=cabeceras)
+        try:
+            with self.abridor.open(peticion, timeout=30) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except HTTPError as error:
+            return error.code
+
+    def _csrf(self):
+        return next((galleta.value for galleta in self.galletas if galleta.name == 'csrftoken'), '')
+
+    def iniciar_sesion(self):
+        login = reverse('login_view')
+        self._pedir(login)  # deja la cookie csrftoken
+        estado = self._pedir(login, {'username': self.usuario, 'password': CONTRASENA})
+        if estado != 302:
+            raise CommandError(f"No se pudo iniciar sesión como {self.usuario} (respuesta {estado}).")
+
+    def _peticion(self, nombre):
+        azar = self.azar
+        if nombre == 'home':
+            return self._pedir(reverse('home_view'))
+        if nombre == 'lista_negocios':
+            return self._pedir(reverse('lista_negocios'))
+        if nombre == 'detalle_negocio':
+            return self._pedir(reverse('detalle_negocio', args=[azar.choice(self.negocios)]))
+        if nombre == 'biblioteca':
+            return self._pedir(f"{reverse('biblioteca_view')}?page_recetas={azar.randint(1, 5)}")
+        if nombre == 'eventos':
+            return self._pedir(f"{reverse('evento_cultural_list')}?page={azar.randint(1, self.paginas_eventos)}")
+        if nombre == 'comentar_y_calificar':
+            return self._pedir(reverse('comentar_y_calificar', args=[azar.choice(self.negocios)]),
+                               {'texto': 'Comentario de carga', 'puntuacion': azar.randint(1, 5)})
+        raise ValueError(nombre)
+
+    def run(self):
+        nombres, pesos = list(MEZCLA), list(MEZCLA.values())
+        while time.monotonic() < self.fin:
+            nombre = self.azar.choices(nombres, weights=pesos)[0]
+            resultado = self.resultados[nombre]
+            inicio = time.perf_counter()
+            try:
+                estado = self._peticion(nombre)
+            except (URLError, OSError):
+                estado = 'conexión'
+            resultado['tiempos'].append((time.perf_counter() - inicio) * 1000)
+            resultado['estados'][str(estado)] = resultado['estados'].get(str(estado), 0) + 1
+            if estado not in (200, 302):
+                resultado['errores'] += 1
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga contra un servidor en marcha: varios trabajadores repiten una mezcla "
+            "ponderada de rutas y se informa, en JSON, del rendimiento y la latencia (p50/p95/p99) "
+            "por ruta. Pensado para usarse tras seed_bench, con DEBUG=False.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Dirección del servidor.")
+        parser.add_argument('--trabajadores', type=int, default=8)
+        parser.add_argument('--segundos', type=float, default=30)
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--salida', help="Archivo donde guardar el JSON (además de mostrarlo).")
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        negocios = list(Negocio.objects.order_by('?').values_list('pk', flat=True)[:5000])
+        usuarios = list(User.objects.filter(username__startswith=PREFIJO).order_by('pk')
+                        .values_list('username', flat=True)[:options['trabajadores']])
+        if not negocios or len(usuarios) < options['trabajadores']:
+            raise CommandError("Faltan datos: ejecuta antes `manage.py seed_bench`.")
+        paginas_eventos = max(1, EventoCultural.objects.filter(publicado=True).count() // 5)
+
+        trabajadores = [Trabajador(i, base, negocios, paginas_eventos, options['semilla'], usuario)
+                        for i, usuario in enumerate(usuarios)]
+        for trabajador in trabajadores:
+            trabajador.iniciar_sesion()
+        inicio = time.monotonic()
+        fin = inicio + options['segundos']
+        for trabajador in trabajadores:
+            trabajador.fin = fin
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.monotonic() - inicio
+
+        informe = {
+            'url': base,
+            'trabajadores': len(trabajadores),
+            'segundos': round(duracion, 2),
+            'mezcla': MEZCLA,
+            'rutas': {},
+        }
+        total, errores = 0, 0
+        for nombre in MEZCLA:
+            tiempos = sorted(t for trabajador in trabajadores for t in trabajador.resultados[nombre]['tiempos'])
+            estados = {}
+            for trabajador in trabajadores:
+                for estado, veces in trabajador.resultados[nombre]['estados'].items():
+                    estados[estado] = estados.get(estado, 0) + veces
+            fallos = sum(trabajador.resultados[nombre]['errores'] for trabajador in trabajadores)
+            total, errores = total + len(tiempos), errores + fallos
+            informe['rutas'][nombre] = {
+                'peticiones': len(tiempos),
+                'errores': fallos,
+                'estados': estados,
+                'por_segundo': round(len(tiempos) / duracion, 1),
+                'p50_ms': percentil(tiempos, 50),
+                'p95_ms': percentil(tiempos, 95),
+                'p99_ms': percentil(tiempos, 99),
+                'max_ms': round(tiempos[-1], 1) if tiempos else None,
+            }
+        informe['total'] = {'peticiones': total, 'errores': errores, 'por_segundo': round(total / duracion, 1)}
+
+        texto = json.dumps(informe, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+        self.stdout.write(texto)
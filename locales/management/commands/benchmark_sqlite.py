@@ -0,0 +1,134 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from locales.basedatos import aplicar_pragmas, pragmas_de_conexion
+
+# Perfiles a comparar: (nombre, pragmas, BEGIN de las escrituras, conexión persistente)
+PERFILES = [
+    ('por defecto', {}, 'BEGIN', False),
+    ('producción', pragmas_de_conexion(wal=True), 'BEGIN IMMEDIATE', True),
+]
+
+
+class Command(BaseCommand):
+    help = ("Mide lecturas y escrituras concurrentes sobre una base SQLite temporal con la "
+            "configuración de fábrica y con el perfil de locales/basedatos.py.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segundos', type=float, default=5, help="Duración de cada prueba.")
+        parser.add_argument('--lectores', type=int, default=4, help="Hilos que leen (páginas de comentarios).")
+        parser.add_argument('--escritores', type=int, default=4,
+                            help="Hilos que escriben (comentario + voto en una transacción).")
+        parser.add_argument('--negocios', type=int, default=500)
+        parser.add_argument('--comentarios', type=int, default=50000, help="Comentarios iniciales.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{options['lectores']} lectores y {options['escritores']} escritores durante "
+                          f"{options['segundos']:g}s por perfil\n")
+        self.stdout.write(f"{'perfil':<14}{'lecturas/s':>12}{'escrituras/s':>14}{'bloqueos':>10}"
+                          f"{'p95 lectura (ms)':>18}{'p95 escritura (ms)':>20}")
+        with tempfile.TemporaryDirectory() as carpeta:
+            for nombre, pragmas, inicio_transaccion, persistente in PERFILES:
+                ruta = os.path.join(carpeta, f'{len(os.listdir(carpeta))}.sqlite3')
+                self._sembrar(ruta, options['negocios'], options['comentarios'])
+                resultado = self._medir(ruta, pragmas, inicio_transaccion, persistente, options)
+                self.stdout.write(
+                    f"{nombre:<14}{resultado['lecturas'] / options['segundos']:>12.0f}"
+                    f"{resultado['escrituras'] / options['segundos']:>14.0f}{resultado['bloqueos']:>10}"
+                    f"{resultado['p95_lectura']:>18.1f}{resultado['p95_escritura']:>20.1f}"
+                )
+
+    def _sembrar(self, ruta, negocios, comentarios):
+        azar = random.Random(1)
+        conexion = sqlite3.connect(ruta)
+        conexion.executescript("""
+            CREATE TABLE negocio (id INTEGER PRIMARY KEY, suma INTEGER NOT NULL, conteo INTEGER NOT NULL);
+            CREATE TABLE comentario (id INTEGER PRIMARY KEY, negocio_id INTEGER NOT NULL, texto TEXT NOT NULL,
+                                     fecha REAL NOT NULL);
+            CREATE INDEX comentario_negocio_fecha ON comentario (negocio_id, fecha DESC, id DESC);
+        """)
+        conexion.executemany('INSERT INTO negocio VALUES (?, 0, 0)', ((i,) for i in range(1, negocios + 1)))
+        conexion.executemany(
+            'INSERT INTO comentario (negocio_id, texto, fecha) VALUES (?, ?, ?)',
+            ((azar.randint(1, negocios), 'x' * azar.randint(20, 400), azar.random()) for _ in range(comentarios)),
+        )
+        conexion.commit()
+        conexion.close()
+
+    def _medir(self, ruta, pragmas, inicio_transaccion, persistente, options):
+        negocios = options['negocios']
+        fin = time.perf_counter() + options['segundos']
+        totales = {'lecturas': 0, 'escrituras': 0, 'bloqueos': 0}
+        latencias = {'lectura': [], 'escritura': []}
+        lock = threading.Lock()
+
+        def conectar():
+            # isolation_level=None: las transacciones se abren a mano, como hace Django.
+            conexion = sqlite3.connect(ruta, isolation_level=None, check_same_thread=False)
+            aplicar_pragmas(conexion, pragmas)
+            return conexion
+
+        def leer(conexion, azar):
+            negocio = azar.randint(1, negocios)
+            conexion.execute('SELECT suma, conteo FROM negocio WHERE id = ?', (negocio,)).fetchone()
+            conexion.execute('SELECT id, texto, fecha FROM comentario WHERE negocio_id = ? '
+                             'ORDER BY fecha DESC, id DESC LIMIT 10', (negocio,)).fetchall()
+
+        def escribir(conexion, azar):
+            # Como comentar_y_calificar: lee el negocio y luego escribe dentro de la misma transacción.
+            negocio = azar.randint(1, negocios)
+            conexion.execute(inicio_transaccion)
+            try:
+                conexion.execute('SELECT suma FROM negocio WHERE id = ?', (negocio,)).fetchone()
+                conexion.execute('INSERT INTO comentario (negocio_id, texto, fecha) VALUES (?, ?, ?)',
+                                 (negocio, 'comentario nuevo', time.time()))
+                conexion.execute('UPDATE negocio SET suma = suma + ?, conteo = conteo + 1 WHERE id = ?',
+                                 (azar.randint(1, 5), negocio))
+                conexion.execute('COMMIT')
+            except sqlite3.OperationalError:
+                if conexion.in_transaction:
+                    conexion.execute('ROLLBACK')
+                raise
+
+        def trabajador(operacion, tipo, semilla):
+            azar = random.Random(semilla)
+            conexion = conectar() if persistente else None
+            hechas, bloqueos, tiempos = 0, 0, []
+            while time.perf_counter() < fin:
+                inicio = time.perf_counter()
+                # Sin conexión persistente, cada operación (una petición) abre la suya.
+                actual = conexion or conectar()
+                try:
+                    operacion(actual, azar)
+                    hechas += 1
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                except sqlite3.OperationalError:
+                    bloqueos += 1
+                finally:
+                    if conexion is None:
+                        actual.close()
+            if conexion is not None:
+                conexion.close()
+            with lock:
+                totales['lecturas' if tipo == 'lectura' else 'escrituras'] += hechas
+                totales['bloqueos'] += bloqueos
+                latencias[tipo].extend(tiempos)
+
+        hilos = [threading.Thread(target=trabajador, args=(leer, 'lectura', i)) for i in range(options['lectores'])]
+        hilos += [threading.Thread(target=trabajador, args=(escribir, 'escritura', 100 + i))
+                  for i in range(options['escritores'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        def p95(valores):
+            return sorted(valores)[int(len(valores) * 0.95)] if valores else 0.0
+
+        return {**totales, 'p95_lectura': p95(latencias['lectura']), 'p95_escritura': p95(latencias['escritura'])}
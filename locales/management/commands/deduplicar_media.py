@@ -0,0 +1,103 @@
+import os
+import shutil
+from collections import defaultdict
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from locales import imagenes
+from locales.almacenamiento import CARPETA, AlmacenamientoDeduplicado, es_nombre_de_contenido, huella_de, \
+    nombre_de_contenido
+from locales.models import ArchivoContenido
+
+
+def _campos_deduplicados():
+    # (modelo, campo) de todos los FileField que usan el almacenamiento por contenido.
+    for modelo in apps.get_models():
+        for campo in modelo._meta.get_fields():
+            if isinstance(campo, models.FileField) and isinstance(campo.storage, AlmacenamientoDeduplicado):
+                yield modelo, campo
+
+
+class Command(BaseCommand):
+    help = ("Pasa los archivos subidos con nombre antiguo al almacenamiento por contenido: los que son "
+            "idénticos quedan en un único archivo y las filas apuntan a él. Al final recuenta las referencias.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help="Solo informa, no cambia nada.")
+        parser.add_argument('--purgar', action='store_true',
+                            help="Borra los archivos por contenido que ya no usa ninguna fila.")
+
+    def handle(self, *args, **options):
+        campos = list(_campos_deduplicados())
+        if not campos:
+            self.stdout.write("Ningún campo usa AlmacenamientoDeduplicado; revisa STORAGES['default'].")
+            return
+        almacen = campos[0][1].storage
+        # Nombres por defecto (p. ej. el avatar genérico): las filas nuevas los siguen usando.
+        reservados = {campo.default for _, campo in campos if isinstance(campo.default, str)}
+
+        usos = defaultdict(list)
+        for modelo, campo in campos:
+            nombres = modelo._default_manager.exclude(**{campo.name: ''}).exclude(**{f'{campo.name}__isnull': True}) \
+                .values_list(campo.name, flat=True).distinct()
+            for nombre in nombres:
+                if not es_nombre_de_contenido(nombre) and nombre not in reservados:
+                    usos[nombre].append((modelo, campo))
+
+        movidos = faltantes = ahorrados = 0
+        destinos = set()
+        for nombre, campos_con_nombre in sorted(usos.items()):
+            ruta = almacen.path(nombre)
+            if not os.path.exists(ruta):
+                faltantes += 1
+                self.stderr.write(f"  Falta en disco: {nombre}")
+                continue
+            with open(ruta, 'rb') as archivo:
+                huella = huella_de(archivo)
+            destino = nombre_de_contenido(huella, nombre)
+            tamano = os.path.getsize(ruta)
+            if destino in destinos or os.path.exists(almacen.path(destino)):
+                ahorrados += tamano
+            destinos.add(destino)
+            movidos += 1
+            if options['simular']:
+                continue
+            with transaction.atomic():
+                ruta_destino = almacen.path(destino)
+                if not os.path.exists(ruta_destino):
+                    os.makedirs(os.path.dirname(ruta_destino), exist_ok=True)
+                    shutil.copy2(ruta, ruta_destino)
+                ArchivoContenido.objects.get_or_create(nombre=destino, defaults={'huella': huella, 'tamano': tamano})
+                for modelo, campo in campos_con_nombre:
+                    modelo._default_manager.filter(**{campo.name: nombre}).update(**{campo.name: destino})
+            os.remove(ruta)
+            imagenes.borrar_derivados(nombre)
+
+        self.stdout.write(f"{movidos} archivo(s) {'por pasar' if options['simular'] else 'pasados'} al "
+                          f"almacenamiento por contenido, {ahorrados / 1024 / 1024:.1f} MB de duplicados, "
+                          f"{faltantes} sin archivo en disco.")
+        if not options['simular']:
+            self._recontar(campos, almacen, options['purgar'])
+
+    def _recontar(self, campos, almacen, purgar):
+        referencias = defaultdict(int)
+        for modelo, campo in campos:
+            filas = modelo._default_manager.filter(**{f'{campo.name}__startswith': f'{CARPETA}/'}) \
+                .values(campo.name).annotate(total=models.Count('pk')).values_list(campo.name, 'total')
+            for nombre, total in filas:
+                referencias[nombre] += total
+        actualizados, huerfanos = [], []
+        for archivo in ArchivoContenido.objects.all():
+            archivo.referencias = referencias.get(archivo.nombre, 0)
+            (actualizados if archivo.referencias else huerfanos).append(archivo)
+        ArchivoContenido.objects.bulk_update(actualizados + huerfanos, ['referencias'], batch_size=500)
+        if purgar:
+            for archivo in huerfanos:
+                almacen.delete(archivo.nombre)
+            ArchivoContenido.objects.filter(pk__in=[a.pk for a in huerfanos]).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Referencias recontadas: {len(actualizados)} archivo(s) en uso, {len(huerfanos)} sin uso"
+            f"{' (borrados)' if purgar else ''}."
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from locales import imagenes
+from locales.models import Negocio, PerfilUsuario, Relato
+
+# (modelo, campo, tamaños que usan las plantillas)
+CAMPOS = {
+    'negocios': (Negocio, 'foto_principal', ['miniatura', 'tarjeta', 'detalle']),
+    'avatares': (PerfilUsuario, 'avatar', ['avatar']),
+    'relatos': (Relato, 'image', ['tarjeta']),
+}
+
+
+class Command(BaseCommand):
+    help = "Genera de antemano las versiones reducidas (WebP y JPEG) de las imágenes subidas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('grupos', nargs='*',
+                            help=f"Qué imágenes procesar: {', '.join(CAMPOS)} (por defecto todas).")
+        parser.add_argument('--forzar', action='store_true', help="Regenera aunque ya existan.")
+
+    def handle(self, *args, **options):
+        desconocidos = set(options['grupos']) - set(CAMPOS)
+        if desconocidos:
+            raise CommandError(f"Grupos desconocidos: {', '.join(sorted(desconocidos))}")
+        for grupo in options['grupos'] or CAMPOS:
+            modelo, campo, tamanos = CAMPOS[grupo]
+            anchos = sorted({ancho for tamano in tamanos for ancho in imagenes.TAMANOS[tamano][0]})
+            field = modelo._meta.get_field(campo)
+            generados = fallidos = 0
+            nombres = modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}) \
+                .values_list(campo, flat=True).distinct()
+            for nombre in nombres.iterator():
+                # Se trabaja sobre nombres distintos: un original compartido se procesa una vez.
+                archivo = field.attr_class(None, field, nombre)
+                resultado = imagenes.generar(archivo, anchos, forzar=options['forzar'])
+                if len(resultado) == len(anchos) * len(imagenes.FORMATOS):
+                    generados += 1
+                else:
+                    fallidos += 1
+                    self.stderr.write(f"  No se pudo procesar {nombre}")
+            self.stdout.write(f"{grupo}: {generados} imagen(es) listas, {fallidos} con error.")
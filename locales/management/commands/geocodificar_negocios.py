@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from locales.geocodificacion import geocodificar_lote, obtener_geocodificador
+from locales.models import Negocio, UbicacionGeocodificada
+
+
+class Command(BaseCommand):
+    help = "Rellena latitud/longitud de los negocios usando el geocodificador configurado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help="Vuelve a geocodificar también los negocios que ya tienen coordenadas.")
+        parser.add_argument('--limpiar-cache', action='store_true',
+                            help="Borra la caché de direcciones antes de empezar.")
+        parser.add_argument('--lote', type=int, default=200, help="Negocios por lote (por defecto 200).")
+
+    def handle(self, *args, **options):
+        if options['limpiar_cache']:
+            borradas, _ = UbicacionGeocodificada.objects.all().delete()
+            self.stdout.write(f"Caché vaciada ({borradas} direcciones).")
+
+        negocios = Negocio.objects.only('id', 'address_text', 'latitud', 'longitud').order_by('id')
+        if not options['todos']:
+            negocios = negocios.filter(latitud__isnull=True)
+
+        geocodificador = obtener_geocodificador()
+        actualizados, sin_resultado = geocodificar_lote(negocios, geocodificador, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{actualizados} negocio(s) geocodificados con '{geocodificador.nombre}', {sin_resultado} sin resultado."
+        ))
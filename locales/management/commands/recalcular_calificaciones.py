@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from locales.calificaciones import recalcular_agregados
+from locales.ranking import recalcular_todo
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la suma, el conteo, el promedio y el histograma de calificaciones de cada negocio."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help="Negocios por bulk_update (por defecto 500).")
+
+    def handle(self, *args, **options):
+        total = recalcular_agregados(tamano_lote=options['lote'])
+        # Con los agregados corregidos también cambia la media global del ranking.
+        recalcular_todo()
+        self.stdout.write(self.style.SUCCESS(f"Agregados recalculados para {total} negocio(s)."))
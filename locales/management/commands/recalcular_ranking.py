@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from locales.ranking import recalcular_todo
+
+
+class Command(BaseCommand):
+    help = ("Recalcula la puntuación bayesiana de todos los negocios y categorías. "
+            "Conviene programarlo (por ejemplo, cada hora con cron) porque la media global "
+            "que usan las actualizaciones incrementales solo se refresca aquí.")
+
+    def handle(self, *args, **options):
+        negocios, categorias, media = recalcular_todo()
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranking recalculado: {negocios} negocio(s), {categorias} categoría(s), media global {media:.2f}."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from locales import busqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero el índice de búsqueda de texto completo (SQLite FTS5)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipos', nargs='*', help=f"Tipos a reindexar (por defecto todos: {', '.join(busqueda.TIPOS)}).")
+
+    def handle(self, *args, **options):
+        tipos = options['tipos'] or None
+        desconocidos = set(tipos or []) - set(busqueda.TIPOS)
+        if desconocidos:
+            raise CommandError(f"Tipos desconocidos: {', '.join(sorted(desconocidos))}")
+        totales = busqueda.reconstruir(tipos)
+        for tipo, total in totales.items():
+            self.stdout.write(f"{tipo}: {total} documento(s)")
+        self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
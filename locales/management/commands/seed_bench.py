@@ -0,0 +1,281 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from eventos.models import EventoCultural
+from locales import autocompletado, busqueda, departamentos, duplicados, fragmentos, mapa, ranking
+from locales.calificaciones import recalcular_agregados
+from locales.models import (
+    Calificacion, Categoria, Comentario, Departamento, MensajePropietario, Negocio, PerfilUsuario, Rango,
+    ReclamoNegocio, Relato, ReporteComentario, Receta, SaberPopular, SugerenciaNegocio, UbicacionGeocodificada,
+)
+
+# Todo lo que se genera cuelga de usuarios con este prefijo: así --limpiar sabe qué borrar
+# y benchmark_carga puede iniciar sesión con ellos (contraseña CONTRASENA).
+PREFIJO = 'bench_'
+CONTRASENA = 'bench'
+
+CANTIDADES = {
+    'usuarios': 2000,
+    'negocios': 10000,
+    'comentarios': 100000,
+    'relatos': 5000,
+    'recetas': 5000,
+    'saberes': 5000,
+    'eventos': 1000,
+    'sugerencias': 2000,
+    'reclamos': 200,
+    'reportes': 500,
+    'mensajes': 200,
+}
+
+CATEGORIAS = ['Comida', 'Hospedaje', 'Turismo', 'Artesanías', 'Transporte', 'Café', 'Mercados', 'Música']
+TIPOS_NEGOCIO = ['Fritanga', 'Comedor', 'Hostal', 'Cafetería', 'Taller', 'Pulpería', 'Panadería', 'Tour',
+                 'Bar', 'Cocina', 'Rosquillería', 'Hotelito']
+APELLIDOS = ['Doña Tere', 'El Güegüense', 'La Pólvora', 'Los Laureles', 'El Malinche', 'La Calzada',
+             'Sandino', 'El Coyotepe', 'La Ceiba', 'Momotombo', 'San Jerónimo', 'La Merced', 'El Tamarindo']
+PALABRAS = (
+    'maíz yuca plátano frijol queso cuajada chicharrón repollo tomate cebolla chile achiote cacao café '
+    'pinol pinolillo tiste rosquilla nacatamal vigorón indio viejo gallo pinto quesillo tortilla manteca '
+    'abuela pueblo fiesta patronal mercado río lago volcán luna lluvia cosecha remedio hierba sábila '
+    'barrio esquina parque iglesia calle mercado sabroso atención precio limpio rápido amable lindo bueno'
+).split()
+# Centro aproximado de cada departamento (lat, lng) para repartir los puntos del mapa.
+CENTROS = {
+    'Boaco': (12.47, -85.66), 'Carazo': (11.85, -86.20), 'Chinandega': (12.63, -87.13),
+    'Chontales': (12.10, -85.37), 'Costa Caribe Norte': (14.03, -83.39), 'Costa Caribe Sur': (12.01, -83.76),
+    'Estelí': (13.09, -86.35), 'Granada': (11.93, -85.96), 'Jinotega': (13.09, -86.00),
+    'León': (12.43, -86.88), 'Madriz': (13.48, -86.58), 'Managua': (12.13, -86.25), 'Masaya': (11.97, -86.09),
+    'Matagalpa': (12.93, -85.92), 'Nueva Segovia': (13.63, -86.48), 'Río San Juan': (11.13, -84.78),
+    'Rivas': (11.44, -85.83),
+}
+
+
+def _texto(azar, palabras):
+    return ' '.join(azar.choice(PALABRAS) for _ in range(palabras)).capitalize() + '.'
+
+
+def _fecha(azar, ahora, dias=730):
+    # Más actividad reciente que antigua
+    return ahora - timedelta(days=dias * azar.random() ** 2, seconds=azar.randrange(86400))
+
+
+class Command(BaseCommand):
+    help = ("Genera datos sintéticos y reproducibles (misma --semilla, mismos datos) para medir el sitio "
+            "con volúmenes reales, p. ej. --negocios 100000 --comentarios 1000000. Inserta por lotes con "
+            "bulk_create y al final recalcula calificaciones, ranking e índices.")
+
+    def add_arguments(self, parser):
+        for nombre, cantidad in CANTIDADES.items():
+            parser.add_argument(f'--{nombre}', type=int, default=cantidad, help=f"Por defecto {cantidad}.")
+        parser.add_argument('--proporcion-calificados', type=float, default=0.7,
+                            help="Parte de los comentarios que llevan calificación.")
+        parser.add_argument('--lote', type=int, default=5000, help="Filas por INSERT.")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--limpiar', action='store_true',
+                            help=f"Borra antes lo generado por una ejecución anterior (usuarios '{PREFIJO}*').")
+
+    def handle(self, *args, **options):
+        self.azar = random.Random(options['semilla'])
+        self.lote = options['lote']
+        self.ahora = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        inicio = time.perf_counter()
+        if options['limpiar']:
+            self._limpiar()
+        elif User.objects.filter(username__startswith=PREFIJO).exists():
+            self.stdout.write(self.style.WARNING(
+                f"Ya hay usuarios '{PREFIJO}*': se añaden más datos (usa --limpiar para empezar de cero)."))
+
+        usuarios = self._usuarios(options['usuarios'])
+        negocios = self._negocios(options['negocios'], usuarios)
+        comentarios = self._comentarios(options['comentarios'], options['proporcion_calificados'], negocios, usuarios)
+        self._contenido(options, usuarios, negocios, comentarios)
+        self._recalcular()
+        self.stdout.write(self.style.SUCCESS(f"Listo en {time.perf_counter() - inicio:.1f}s."))
+        self.stdout.write("Las cachés en memoria de un servidor ya arrancado no se enteran: reinícialo antes de medir.")
+
+    def _crear(self, modelo, filas, etiqueta=None):
+        """Inserta las filas (un iterable) por lotes, cada lote en su transacción; devuelve los ids."""
+        inicio = time.perf_counter()
+        ids, lote = [], []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= self.lote:
+                ids += self._insertar(modelo, lote)
+                lote = []
+        if lote:
+            ids += self._insertar(modelo, lote)
+        self.stdout.write(f"  {etiqueta or modelo._meta.verbose_name_plural}: {len(ids)} "
+                          f"en {time.perf_counter() - inicio:.1f}s")
+        return ids
+
+    def _insertar(self, modelo, lote):
+        with transaction.atomic():
+            return [objeto.pk for objeto in modelo.objects.bulk_create(lote, batch_size=self.lote)]
+
+    def _limpiar(self):
+        generados = User.objects.filter(username__startswith=PREFIJO)
+        # Los negocios y sugerencias no se borran en cascada con su usuario (SET_NULL)
+        Negocio.objects.filter(created_by__in=generados).delete()
+        SugerenciaNegocio.objects.filter(sugerido_por__in=generados).delete()
+        Receta.objects.filter(autor__in=generados).delete()
+        SaberPopular.objects.filter(autor__in=generados).delete()
+        EventoCultural.objects.filter(publicado_por__in=generados).delete()
+        UbicacionGeocodificada.objects.filter(proveedor='seed_bench').delete()
+        borrados, _ = generados.delete()
+        self.stdout.write(f"Borradas {borrados} filas de la ejecución anterior.")
+
+    def _usuarios(self, cantidad):
+        azar = self.azar
+        # Un único hash para todos: calcular uno por usuario (PBKDF2) tardaría minutos
+        contrasena = make_password(CONTRASENA)
+        desde = User.objects.filter(username__startswith=PREFIJO).count()
+        ids = self._crear(User, (
+            User(username=f'{PREFIJO}{i}', email=f'{PREFIJO}{i}@example.com', password=contrasena,
+                 first_name=azar.choice(APELLIDOS).split()[-1], date_joined=_fecha(azar, self.ahora))
+            for i in range(desde, desde + cantidad)
+        ), 'usuarios')
+        rango, _ = Rango.objects.get_or_create(nombre='Visitante')
+        self._crear(PerfilUsuario, (
+            PerfilUsuario(usuario_id=pk, rango=rango, ubicacion=azar.choice(list(CENTROS)),
+                          biografia=_texto(azar, 12))
+            for pk in ids
+        ), 'perfiles')
+        return ids
+
+    def _negocios(self, cantidad, usuarios):
+        azar = self.azar
+        categorias = [Categoria.objects.get_or_create(nombre=nombre)[0] for nombre in CATEGORIAS]
+        lista_departamentos = list(Departamento.objects.all()) or [None]
+        ids = self._crear(Negocio, (self._negocio(azar, i, categorias, lista_departamentos, usuarios)
+                                    for i in range(cantidad)), 'negocios')
+        # La caché de geocodificación tiene una entrada por dirección distinta
+        direcciones = Negocio.objects.filter(pk__in=ids[:50000]).values_list('address_text', 'latitud', 'longitud')
+        vistas = set(UbicacionGeocodificada.objects.values_list('direccion_normalizada', flat=True))
+        nuevas = {}
+        for direccion, lat, lng in direcciones:
+            clave = direccion.lower()
+            if clave not in vistas and clave not in nuevas:
+                nuevas[clave] = UbicacionGeocodificada(direccion_normalizada=clave, latitud=lat, longitud=lng,
+                                                       proveedor='seed_bench')
+        self._crear(UbicacionGeocodificada, nuevas.values(), 'direcciones geocodificadas')
+        return ids
+
+    def _negocio(self, azar, i, categorias, lista_departamentos, usuarios):
+        categoria = azar.choice(categorias)
+        departamento = azar.choice(lista_departamentos)
+        lat, lng = CENTROS.get(getattr(departamento, 'nombre', None), (12.13, -86.25))
+        turismo = categoria.slug == 'turismo'
+        return Negocio(
+            name=f'{azar.choice(TIPOS_NEGOCIO)} {azar.choice(APELLIDOS)} {i}',
+            description=_texto(azar, azar.randint(15, 60)),
+            address_text=f'Barrio {azar.choice(APELLIDOS)}, {getattr(departamento, "nombre", "Managua")}',
+            departamento=departamento, categoria_relacionada=categoria,
+            hours='Lunes a sábado, 7am - 9pm',
+            created_by_id=azar.choice(usuarios),
+            propietario_id=azar.choice(usuarios) if azar.random() < 0.2 else None,
+            is_turismo=turismo, paquetes_turismo=_texto(azar, 30) if turismo else None,
+            phone=f'+505 {azar.randint(2000, 8999)} {azar.randint(1000, 9999)}',
+            latitud=round(lat + azar.gauss(0, 0.15), 6), longitud=round(lng + azar.gauss(0, 0.15), 6),
+        )
+
+    def _comentarios(self, cantidad, proporcion, negocios, usuarios):
+        azar = self.azar
+        # Pocos negocios concentran muchos comentarios (como en la realidad): pesos de Pareto
+        pesos = [azar.paretovariate(1.2) for _ in negocios]
+        elegidos = azar.choices(negocios, weights=pesos, k=cantidad) if negocios else []
+        filas = [(negocio, azar.choice(usuarios), _fecha(azar, self.ahora)) for negocio in elegidos]
+        ids = self._crear(Comentario, (
+            Comentario(negocio_id=negocio, usuario_id=usuario, texto=_texto(azar, azar.randint(5, 60)), fecha=fecha)
+            for negocio, usuario, fecha in filas
+        ), 'comentarios')
+        self._crear(Calificacion, (
+            Calificacion(negocio_id=negocio, usuario_id=usuario, fecha=fecha, comentario_id=comentario,
+                         puntuacion=azar.choices((1, 2, 3, 4, 5), weights=(5, 5, 15, 35, 40))[0])
+            for comentario, (negocio, usuario, fecha) in zip(ids, filas) if azar.random() < proporcion
+        ), 'calificaciones')
+        return ids
+
+    def _contenido(self, options, usuarios, negocios, comentarios):
+        azar = self.azar
+
+        def estado():
+            return azar.choices(('approved', 'pending', 'rejected'), weights=(85, 10, 5))[0]
+
+        def relato():
+            lugar = azar.choice(list(CENTROS))
+            lat, lng = CENTROS[lugar]
+            return Relato(title=_texto(azar, 5)[:200], content=_texto(azar, azar.randint(80, 400)),
+                          author_id=azar.choice(usuarios), status=estado(), created_at=_fecha(azar, self.ahora),
+                          ubicacion_texto=lugar, latitud=round(lat + azar.gauss(0, 0.2), 6),
+                          longitud=round(lng + azar.gauss(0, 0.2), 6))
+
+        self._crear(Relato, (relato() for _ in range(options['relatos'])), 'relatos')
+        self._crear(Receta, (
+            Receta(titulo=_texto(azar, 3)[:200], descripcion=_texto(azar, 25), ingredientes=_texto(azar, 15),
+                   pasos=_texto(azar, 100), autor_id=azar.choice(usuarios), estado=estado(),
+                   fecha_creacion=_fecha(azar, self.ahora))
+            for _ in range(options['recetas'])
+        ), 'recetas')
+        self._crear(SaberPopular, (
+            SaberPopular(titulo=_texto(azar, 3)[:200], contenido=_texto(azar, 150), autor_id=azar.choice(usuarios),
+                         estado=estado(), fecha_creacion=_fecha(azar, self.ahora))
+            for _ in range(options['saberes'])
+        ), 'saberes')
+        eventos = []
+        for _ in range(options['eventos']):
+            fecha_inicio = self.ahora + timedelta(days=azar.randint(-180, 365), hours=azar.randint(8, 20))
+            eventos.append(EventoCultural(
+                nombre=f'Fiesta de {azar.choice(APELLIDOS)}', descripcion=_texto(azar, 60),
+                fecha_inicio=fecha_inicio, fecha_fin=fecha_inicio + timedelta(hours=azar.randint(2, 72)),
+                ubicacion_texto=azar.choice(list(CENTROS)), publicado=azar.random() < 0.8,
+                publicado_por_id=azar.choice(usuarios)))
+        self._crear(EventoCultural, eventos, 'eventos')
+        categorias = list(Categoria.objects.values_list('pk', flat=True))
+        self._crear(SugerenciaNegocio, (
+            SugerenciaNegocio(nombre_negocio=f'{azar.choice(TIPOS_NEGOCIO)} {azar.choice(APELLIDOS)}',
+                              ubicacion_texto=azar.choice(list(CENTROS)), comentarios=_texto(azar, 20),
+                              sugerido_por_id=azar.choice(usuarios), fecha_sugerencia=_fecha(azar, self.ahora),
+                              estado=azar.choices(('pending', 'approved', 'rejected'), weights=(60, 30, 10))[0],
+                              categoria_relacionada_id=azar.choice(categorias))
+            for _ in range(options['sugerencias'])
+        ), 'sugerencias')
+        self._crear(ReclamoNegocio, (
+            ReclamoNegocio(negocio_id=azar.choice(negocios), usuario_id=azar.choice(usuarios),
+                           mensaje=_texto(azar, 30), aprobado=azar.random() < 0.3)
+            for _ in range(options['reclamos'] if negocios else 0)
+        ), 'reclamos')
+        self._crear(ReporteComentario, (
+            ReporteComentario(comentario_id=azar.choice(comentarios), usuario_id=azar.choice(usuarios),
+                              motivo=_texto(azar, 10))
+            for _ in range(options['reportes'] if comentarios else 0)
+        ), 'reportes de comentarios')
+        self._crear(MensajePropietario, (
+            MensajePropietario(propietario_id=azar.choice(usuarios), asunto=_texto(azar, 5)[:255],
+                               cuerpo=_texto(azar, 50), leido=azar.random() < 0.5)
+            for _ in range(options['mensajes'])
+        ), 'mensajes')
+
+    def _recalcular(self):
+        # bulk_create no emite señales: se rehace de una vez lo que mantienen incrementalmente
+        pasos = [
+            ('agregados de calificaciones', recalcular_agregados),
+            ('ranking', ranking.recalcular_todo),
+            ('índice de búsqueda', busqueda.reconstruir if busqueda.disponible() else lambda: None),
+        ]
+        for etiqueta, funcion in pasos:
+            inicio = time.perf_counter()
+            funcion()
+            self.stdout.write(f"  {etiqueta} en {time.perf_counter() - inicio:.1f}s")
+        mapa.invalidar_mapa()
+        departamentos.invalidar_lista()
+        autocompletado.invalidar()
+        duplicados.invalidar()
+        fragmentos.invalidar(*{dependencia for dependencias in fragmentos.FRAGMENTOS.values()
+                               for dependencia in dependencias})
@@ -0,0 +1,161 @@
+import math
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from . import versiones
+
+# Celdas de la rejilla por cada tesela de 256px: con 4, un grupo cubre ~64px en pantalla.
+CELDAS_POR_TESELA = getattr(settings, 'MAPA_CELDAS_POR_TESELA', 4)
+# A partir de este zoom ya no se agrupa y se devuelven los marcadores individuales.
+ZOOM_MAX_AGRUPACION = getattr(settings, 'MAPA_ZOOM_MAX_AGRUPACION', 15)
+
+VERSION = 'mapa'
+
+
+def version_actual():
+    return versiones.actual(VERSION)
+
+
+def invalidar_mapa():
+    # Se llama cuando un relato o negocio cambia de posición, aparece o desaparece.
+    versiones.subir(VERSION)
+
+
+def _tamano_celda(zoom):
+    return 360.0 / (2 ** zoom * CELDAS_POR_TESELA)
+
+
+def _celda(lat, lng, zoom):
+    tamano = _tamano_celda(zoom)
+    return math.floor((lng + 180.0) / tamano), math.floor((lat + 90.0) / tamano)
+
+
+def _cargar_puntos():
+    from .models import Negocio, Relato
+
+    puntos = []
+    negocios = Negocio.objects.filter(latitud__isnull=False, longitud__isnull=False) \
+        .values_list('id', 'name', 'address_text', 'latitud', 'longitud')
+    for pk, nombre, direccion, lat, lng in negocios.iterator():
+        puntos.append({
+            'tipo': 'negocio', 'id': pk, 'nombre': nombre, 'detalle': direccion,
+            'url': reverse('detalle_negocio', args=[pk]), 'lat': float(lat), 'lng': float(lng),
+        })
+    relatos = Relato.objects.filter(status='approved', latitud__isnull=False, longitud__isnull=False) \
+        .values_list('id', 'title', 'content', 'latitud', 'longitud')
+    for pk, titulo, contenido, lat, lng in relatos.iterator():
+        puntos.append({
+            'tipo': 'relato', 'id': pk, 'nombre': titulo, 'detalle': Truncator(contenido).words(20, html=True),
+            'url': None, 'lat': float(lat), 'lng': float(lng),
+        })
+    return puntos
+
+
+class IndiceMapa:
+    """Rejilla espacial de los puntos del mapa con los grupos de cada zoom.
+
+    El índice base guarda los puntos por celda del zoom más fino; los grupos de
+    cada nivel se calculan la primera vez que se piden y quedan guardados hasta
+    que cambie la versión del mapa.
+    """
+
+    def __init__(self, puntos, version):
+        self.version = version
+        self.puntos = puntos
+        self._celdas_finas = self._agrupar_puntos(ZOOM_MAX_AGRUPACION)
+        self._grupos = {}
+        self._lock = threading.Lock()
+
+    def _agrupar_puntos(self, zoom):
+        celdas = {}
+        for punto in self.puntos:
+            celdas.setdefault(_celda(punto['lat'], punto['lng'], zoom), []).append(punto)
+        return celdas
+
+    def grupos(self, zoom):
+        grupos = self._grupos.get(zoom)
+        if grupos is None:
+            with self._lock:
+                grupos = self._grupos.get(zoom)
+                if grupos is None:
+                    grupos = self._calcular_grupos(zoom)
+                    self._grupos[zoom] = grupos
+        return grupos
+
+    def _calcular_grupos(self, zoom):
+        grupos = {}
+        for punto in self.puntos:
+            clave = _celda(punto['lat'], punto['lng'], zoom)
+            grupo = grupos.get(clave)
+            if grupo is None:
+                grupos[clave] = grupo = {'conteo': 0, 'lat': 0.0, 'lng': 0.0, 'negocio': 0, 'relato': 0,
+                                         'punto': punto}
+            grupo['conteo'] += 1
+            grupo['lat'] += punto['lat']
+            grupo['lng'] += punto['lng']
+            grupo[punto['tipo']] += 1
+        return grupos
+
+    def consultar(self, oeste, sur, este, norte, zoom):
+        zoom = max(0, min(int(zoom), ZOOM_MAX_AGRUPACION))
+        celdas = self._celdas_finas if zoom == ZOOM_MAX_AGRUPACION else self.grupos(zoom)
+        x0, y0 = _celda(sur, oeste, zoom)
+        x1, y1 = _celda(norte, este, zoom)
+        total_rango = (x1 - x0 + 1) * (y1 - y0 + 1)
+        if total_rango <= len(celdas):
+            claves = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            seleccion = [(clave, celdas[clave]) for clave in claves if clave in celdas]
+        else:
+            seleccion = [(clave, valor) for clave, valor in celdas.items()
+                         if x0 <= clave[0] <= x1 and y0 <= clave[1] <= y1]
+
+        features = []
+        if zoom == ZOOM_MAX_AGRUPACION:
+            for _, puntos in seleccion:
+                features.extend(_feature_punto(p) for p in puntos
+                                if sur <= p['lat'] <= norte and oeste <= p['lng'] <= este)
+        else:
+            for _, grupo in seleccion:
+                if grupo['conteo'] == 1:
+                    features.append(_feature_punto(grupo['punto']))
+                else:
+                    features.append(_feature_grupo(grupo))
+        return {'type': 'FeatureCollection', 'features': features}
+
+
+def _feature_punto(punto):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [punto['lng'], punto['lat']]},
+        'properties': {'tipo': punto['tipo'], 'id': punto['id'], 'nombre': punto['nombre'],
+                       'detalle': punto['detalle'], 'url': punto['url']},
+    }
+
+
+def _feature_grupo(grupo):
+    conteo = grupo['conteo']
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [grupo['lng'] / conteo, grupo['lat'] / conteo]},
+        'properties': {'grupo': True, 'conteo': conteo, 'negocios': grupo['negocio'], 'relatos': grupo['relato']},
+    }
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obtener_indice():
+    # Un índice por proceso; la versión compartida (locales/versiones.py) indica cuándo reconstruirlo.
+    global _indice
+    version = version_actual()
+    indice = _indice
+    if indice is None or indice.version != version:
+        with _indice_lock:
+            if _indice is None or _indice.version != version:
+                _indice = IndiceMapa(_cargar_puntos(), version)
+            indice = _indice
+    return indice
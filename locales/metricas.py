@@ -0,0 +1,267 @@
+import bisect
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+# Métricas de operación en formato de texto de Prometheus (/metrics).
+#
+# Por nombre de URL: peticiones (con método y código de estado) e histogramas del
+# tiempo de respuesta, del tiempo en la base de datos y del de plantillas; además,
+# consultas SQL y aciertos/fallos de cada caché lógica (fragmentos, ranking...).
+#
+# Sin cerrojos: cada hilo suma solo en su propio fragmento (_fragmentos[ident]) y
+# al exponerlas se suman todos. Los identificadores de hilo se reutilizan cuando un
+# hilo termina, así que hay tantos fragmentos como hilos vivos a la vez, y lo que
+# sumó un hilo muerto se conserva en el que herede su identificador.
+#
+# Con varios procesos (gunicorn), cada uno vuelca sus totales cada VOLCADO_SEGUNDOS
+# a DIRECTORIO/metricas-<pid>.json y /metrics suma todos los archivos. Los de procesos
+# ya terminados se siguen sumando (los contadores nunca bajan): hay que vaciar el
+# directorio al arrancar el servidor, no al reiniciar un trabajador.
+ACTIVAS = getattr(settings, 'METRICAS_ACTIVAS', True)
+DIRECTORIO = getattr(settings, 'METRICAS_DIR', None)
+VOLCADO_SEGUNDOS = getattr(settings, 'METRICAS_VOLCADO_SEGUNDOS', 5)
+IPS = getattr(settings, 'METRICAS_IPS', ('127.0.0.1', '::1'))
+
+PREFIJO = 'memoria_'
+CUBETAS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+AYUDA = {
+    'peticiones_total': ('counter', 'Peticiones atendidas por nombre de URL, método y código de estado.'),
+    'peticion_segundos': ('histogram', 'Tiempo de respuesta de la vista, middleware incluido.'),
+    'bd_segundos': ('histogram', 'Tiempo en la base de datos por petición.'),
+    'bd_consultas_total': ('counter', 'Consultas SQL ejecutadas.'),
+    'plantillas_segundos': ('histogram', 'Tiempo renderizando plantillas por petición.'),
+    'cache_total': ('counter', 'Lecturas de cada caché lógica, por resultado (acierto o fallo).'),
+}
+
+
+class _Fragmento:
+    def __init__(self):
+        self.contadores = defaultdict(float)
+        # clave -> [una cuenta por cubeta..., +Inf, suma]
+        self.histogramas = {}
+
+
+_fragmentos = {}
+_hilo = threading.local()
+_proximo_volcado = 0.0
+
+
+def _fragmento():
+    ident = threading.get_ident()
+    fragmento = _fragmentos.get(ident)
+    if fragmento is None:
+        fragmento = _fragmentos.setdefault(ident, _Fragmento())
+    return fragmento
+
+
+def sumar(nombre, etiquetas, valor=1):
+    _fragmento().contadores[(nombre, etiquetas)] += valor
+
+
+def observar(nombre, etiquetas, valor):
+    histogramas = _fragmento().histogramas
+    cuentas = histogramas.get((nombre, etiquetas))
+    if cuentas is None:
+        cuentas = histogramas[(nombre, etiquetas)] = [0] * (len(CUBETAS) + 2)
+    cuentas[bisect.bisect_left(CUBETAS, valor)] += 1
+    cuentas[-1] += valor
+
+
+def registrar_cache(cache, acierto):
+    """Anota una lectura de la caché lógica `cache` ('ranking', 'fragmentos:home_relatos'...)."""
+    if ACTIVAS:
+        sumar('cache_total', (('cache', cache), ('resultado', 'acierto' if acierto else 'fallo')))
+
+
+def reiniciar():
+    _fragmentos.clear()
+
+
+def instantanea():
+    """(contadores, histogramas) sumados de todos los hilos de este proceso."""
+    contadores, histogramas = defaultdict(float), {}
+    for fragmento in list(_fragmentos.values()):
+        # dict() copia de una vez (con el GIL tomado) aunque otro hilo esté sumando
+        for clave, valor in dict(fragmento.contadores).items():
+            contadores[clave] += valor
+        for clave, cuentas in dict(fragmento.histogramas).items():
+            total = histogramas.setdefault(clave, [0] * (len(CUBETAS) + 2))
+            for i, cuenta in enumerate(list(cuentas)):
+                total[i] += cuenta
+    return contadores, histogramas
+
+
+# Volcado a disco y suma de procesos
+
+def _a_json(contadores, histogramas):
+    return {
+        'contadores': [[nombre, list(etiquetas), valor] for (nombre, etiquetas), valor in contadores.items()],
+        'histogramas': [[nombre, list(etiquetas), cuentas] for (nombre, etiquetas), cuentas in histogramas.items()],
+    }
+
+
+def volcar():
+    """Escribe los totales de este proceso en DIRECTORIO (de forma atómica)."""
+    global _proximo_volcado
+    _proximo_volcado = time.monotonic() + VOLCADO_SEGUNDOS
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    destino = os.path.join(DIRECTORIO, f'metricas-{os.getpid()}.json')
+    temporal = f'{destino}.{threading.get_ident()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(_a_json(*instantanea()), archivo)
+    os.replace(temporal, destino)
+
+
+def _sumar_archivos():
+    contadores, histogramas = defaultdict(float), {}
+    for ruta in glob.glob(os.path.join(DIRECTORIO, 'metricas-*.json')):
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                datos = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        for nombre, etiquetas, valor in datos['contadores']:
+            contadores[(nombre, tuple(map(tuple, etiquetas)))] += valor
+        for nombre, etiquetas, cuentas in datos['histogramas']:
+            total = histogramas.setdefault((nombre, tuple(map(tuple, etiquetas))), [0] * (len(CUBETAS) + 2))
+            for i, cuenta in enumerate(cuentas):
+                total[i] += cuenta
+    return contadores, histogramas
+
+
+def totales():
+    """Los de este proceso, o los de todos si hay DIRECTORIO compartido."""
+    if not DIRECTORIO:
+        return instantanea()
+    volcar()
+    return _sumar_archivos()
+
+
+# Formato de texto de Prometheus
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in etiquetas) + '}'
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def exponer():
+    contadores, histogramas = totales()
+    por_nombre = defaultdict(list)
+    for (nombre, etiquetas), valor in contadores.items():
+        por_nombre[nombre].append((etiquetas, valor))
+    for (nombre, etiquetas), cuentas in histogramas.items():
+        por_nombre[nombre].append((etiquetas, cuentas))
+
+    lineas = []
+    for nombre in sorted(por_nombre):
+        tipo, ayuda = AYUDA.get(nombre, ('untyped', ''))
+        metrica = PREFIJO + nombre
+        lineas.append(f'# HELP {metrica} {ayuda}')
+        lineas.append(f'# TYPE {metrica} {tipo}')
+        for etiquetas, valor in sorted(por_nombre[nombre]):
+            if tipo != 'histogram':
+                lineas.append(f'{metrica}{_etiquetas(etiquetas)} {_numero(valor)}')
+                continue
+            acumulado = 0
+            for limite, cuenta in zip((*CUBETAS, '+Inf'), valor[:-1]):
+                acumulado += cuenta
+                lineas.append(f'{metrica}_bucket{_etiquetas((*etiquetas, ("le", limite)))} {acumulado}')
+            lineas.append(f'{metrica}_sum{_etiquetas(etiquetas)} {_numero(valor[-1])}')
+            lineas.append(f'{metrica}_count{_etiquetas(etiquetas)} {acumulado}')
+    return '\n'.join(lineas) + '\n'
+
+
+# Medición de cada petición
+
+class _Peticion:
+    def __init__(self):
+        self.bd = 0.0
+        self.consultas = 0
+        self.plantillas = 0.0
+        self.profundidad = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.bd += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def _medir_plantilla(render):
+    # Solo cuenta la plantilla más externa: las incluidas ya están dentro de su tiempo.
+    @functools.wraps(render)
+    def envoltura(self, context):
+        peticion = getattr(_hilo, 'peticion', None)
+        if peticion is None or peticion.profundidad:
+            return render(self, context)
+        peticion.profundidad += 1
+        inicio = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            peticion.plantillas += time.perf_counter() - inicio
+            peticion.profundidad -= 1
+    envoltura.medida = True
+    return envoltura
+
+
+def activar():
+    """Mide el tiempo de plantillas (se llama desde LocalesConfig.ready)."""
+    if ACTIVAS and not getattr(Template.render, 'medida', False):
+        Template.render = _medir_plantilla(Template.render)
+
+
+class MetricasMiddleware:
+    # Va el primero para que el tiempo incluya al resto de middleware.
+    def __init__(self, get_response):
+        if not ACTIVAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        peticion = _hilo.peticion = _Peticion()
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(connections[alias].execute_wrapper(peticion))
+                response = self.get_response(request)
+        finally:
+            _hilo.peticion = None
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        url = (coincidencia.view_name if coincidencia else None) or 'sin_ruta'
+        etiquetas = (('url', url),)
+        sumar('peticiones_total', (*etiquetas, ('metodo', request.method), ('estado', str(response.status_code))))
+        observar('peticion_segundos', etiquetas, duracion)
+        observar('bd_segundos', etiquetas, peticion.bd)
+        observar('plantillas_segundos', etiquetas, peticion.plantillas)
+        if peticion.consultas:
+            sumar('bd_consultas_total', etiquetas, peticion.consultas)
+        if DIRECTORIO and time.monotonic() >= _proximo_volcado:
+            volcar()
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0004_alter_sugerencianegocio_latitud_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relato',
+            name='latitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='relato',
+            name='longitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='relato',
+            name='ubicacion_texto',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Ubicación en el mapa'),
+        ),
+        migrations.AlterField(
+            model_name='sugerencianegocio',
+            name='latitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='sugerencianegocio',
+            name='longitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0005_relato_latitud_relato_longitud_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UbicacionGeocodificada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direccion_normalizada', models.CharField(max_length=255, unique=True)),
+                ('latitud', models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True)),
+                ('longitud', models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True)),
+                ('proveedor', models.CharField(max_length=50)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Ubicaciones geocodificadas',
+            },
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='latitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='longitud',
+            field=models.DecimalField(blank=True, decimal_places=15, max_digits=20, null=True),
+        ),
+    ]
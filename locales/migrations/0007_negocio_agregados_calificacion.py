@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def rellenar_agregados(apps, schema_editor):
+    Negocio = apps.get_model('locales', 'Negocio')
+    Calificacion = apps.get_model('locales', 'Calificacion')
+    filas = Calificacion.objects.values('negocio').order_by().annotate(
+        suma=Sum('puntuacion'),
+        conteo=Count('id'),
+        **{f'votos_{p}': Count('id', filter=Q(puntuacion=p)) for p in range(1, 6)},
+    )
+    campos = ['calificacion_suma', 'calificacion_conteo', 'calificacion_promedio'] + \
+             [f'votos_{p}' for p in range(1, 6)]
+    negocios = []
+    for fila in filas:
+        negocio = Negocio(pk=fila['negocio'], calificacion_suma=fila['suma'], calificacion_conteo=fila['conteo'],
+                          calificacion_promedio=round(fila['suma'] / fila['conteo'], 2))
+        for p in range(1, 6):
+            setattr(negocio, f'votos_{p}', fila[f'votos_{p}'])
+        negocios.append(negocio)
+    Negocio.objects.bulk_update(negocios, campos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0006_negocio_coordenadas_ubicaciongeocodificada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='calificacion_conteo',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='calificacion_suma',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='votos_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='votos_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='votos_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='votos_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='votos_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(rellenar_agregados, migrations.RunPython.noop),
+    ]
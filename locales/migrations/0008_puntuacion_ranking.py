@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:53
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+PESO_PREVIO = 5
+MEDIA_PREVIA = 3.0
+
+
+def calcular_puntuaciones(apps, schema_editor):
+    Negocio = apps.get_model('locales', 'Negocio')
+    Categoria = apps.get_model('locales', 'Categoria')
+    totales = Negocio.objects.aggregate(suma=Sum('calificacion_suma'), conteo=Sum('calificacion_conteo'))
+    media = totales['suma'] / totales['conteo'] if totales['conteo'] else MEDIA_PREVIA
+
+    def puntuacion(suma, conteo):
+        return (PESO_PREVIO * media + suma) / (PESO_PREVIO + conteo)
+
+    negocios = list(Negocio.objects.only('id', 'calificacion_suma', 'calificacion_conteo'))
+    for negocio in negocios:
+        negocio.puntuacion_ranking = puntuacion(negocio.calificacion_suma, negocio.calificacion_conteo)
+    Negocio.objects.bulk_update(negocios, ['puntuacion_ranking'], batch_size=500)
+
+    por_categoria = Negocio.objects.exclude(categoria_relacionada=None).values('categoria_relacionada') \
+        .order_by().annotate(suma=Sum('calificacion_suma'), conteo=Sum('calificacion_conteo'))
+    totales_categoria = {fila['categoria_relacionada']: fila for fila in por_categoria}
+    categorias = list(Categoria.objects.all())
+    for categoria in categorias:
+        fila = totales_categoria.get(categoria.pk, {'suma': 0, 'conteo': 0})
+        categoria.puntuacion_ranking = puntuacion(fila['suma'], fila['conteo'])
+    Categoria.objects.bulk_update(categorias, ['puntuacion_ranking'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0007_negocio_agregados_calificacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='puntuacion_ranking',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='puntuacion_ranking',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_puntuaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0008_puntuacion_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['negocio', '-fecha', '-id'], name='comentario_negocio_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+# Copia de locales/departamentos.py tal como estaba al crear esta migración: si el módulo
+# cambia, lo que hace esta migración no debe cambiar con él.
+DEPARTAMENTOS = [
+    'Boaco', 'Carazo', 'Chinandega', 'Chontales', 'Costa Caribe Norte', 'Costa Caribe Sur', 'Estelí',
+    'Granada', 'Jinotega', 'León', 'Madriz', 'Managua', 'Masaya', 'Matagalpa', 'Nueva Segovia',
+    'Río San Juan', 'Rivas',
+]
+
+ALIAS = {
+    'raccn': 'Costa Caribe Norte', 'raan': 'Costa Caribe Norte', 'bilwi': 'Costa Caribe Norte',
+    'puerto cabezas': 'Costa Caribe Norte',
+    'raccs': 'Costa Caribe Sur', 'raas': 'Costa Caribe Sur', 'bluefields': 'Costa Caribe Sur',
+    'corn island': 'Costa Caribe Sur',
+    'ocotal': 'Nueva Segovia', 'somoto': 'Madriz', 'juigalpa': 'Chontales', 'san carlos': 'Río San Juan',
+    'jinotepe': 'Carazo', 'diriamba': 'Carazo', 'tipitapa': 'Managua', 'ciudad sandino': 'Managua',
+    'chichigalpa': 'Chinandega', 'san juan del sur': 'Rivas', 'ometepe': 'Rivas', 'moyogalpa': 'Rivas',
+}
+
+
+def normalizar_texto(texto):
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return re.sub(r'\s+', ' ', sin_acentos.lower()).strip()
+
+
+PATRONES = [
+    (re.compile(r'\b' + re.escape(clave) + r'\b'), departamento)
+    for clave, departamento in sorted(dict({normalizar_texto(d): d for d in DEPARTAMENTOS}, **ALIAS).items(),
+                                      key=lambda item: -len(item[0]))
+]
+
+
+def departamento_desde_direccion(direccion):
+    for tramo in reversed(normalizar_texto(direccion).split(',')):
+        for patron, departamento in PATRONES:
+            if patron.search(tramo):
+                return departamento
+    return None
+
+
+def cargar_departamentos(apps, schema_editor):
+    Departamento = apps.get_model('locales', 'Departamento')
+    Negocio = apps.get_model('locales', 'Negocio')
+    SugerenciaNegocio = apps.get_model('locales', 'SugerenciaNegocio')
+    ids = {}
+    for nombre in DEPARTAMENTOS:
+        departamento, _ = Departamento.objects.get_or_create(nombre=nombre, defaults={'slug': slugify(nombre)})
+        ids[nombre] = departamento.pk
+
+    negocios = list(Negocio.objects.only('id', 'address_text'))
+    for negocio in negocios:
+        negocio.departamento_id = ids.get(departamento_desde_direccion(negocio.address_text))
+    Negocio.objects.bulk_update(negocios, ['departamento'], batch_size=500)
+
+    sugerencias = list(SugerenciaNegocio.objects.only('id', 'ubicacion_texto'))
+    for sugerencia in sugerencias:
+        sugerencia.departamento_id = ids.get(departamento_desde_direccion(sugerencia.ubicacion_texto))
+    SugerenciaNegocio.objects.bulk_update(sugerencias, ['departamento'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0009_comentario_negocio_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Departamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(blank=True, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Departamentos',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='negocio',
+            name='departamento',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='negocios', to='locales.departamento'),
+        ),
+        migrations.AddField(
+            model_name='sugerencianegocio',
+            name='departamento',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sugerencias', to='locales.departamento'),
+        ),
+        migrations.RunPython(cargar_departamentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:02
+
+from django.db import migrations
+
+# El esquema tal como era en esta migración (no el de locales/busqueda.py, que puede cambiar).
+SQL_CREAR = ("CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_indice "
+             "USING fts5(tipo, titulo, cuerpo, tokenize='unicode61 remove_diacritics 2')")
+INSERTAR = "INSERT INTO busqueda_indice (rowid, tipo, titulo, cuerpo) VALUES (%s, %s, %s, %s)"
+
+
+def crear_indice(apps, schema_editor):
+    # Tabla virtual FTS5: solo existe en SQLite. Con otro motor la búsqueda sigue usando icontains.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Receta = apps.get_model('locales', 'Receta')
+    SaberPopular = apps.get_model('locales', 'SaberPopular')
+    documentos = [
+        (r.pk * 16 + 1, 'receta', r.titulo, '\n'.join(filter(None, [r.descripcion, r.ingredientes, r.pasos])))
+        for r in Receta.objects.filter(estado='approved')
+    ] + [
+        (s.pk * 16 + 2, 'saber', s.titulo, s.contenido)
+        for s in SaberPopular.objects.filter(estado='approved')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SQL_CREAR)
+        cursor.executemany(INSERTAR, documentos)
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS busqueda_indice")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0010_departamento'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
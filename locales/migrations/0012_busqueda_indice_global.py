@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:10
+
+from django.db import migrations
+
+# La tabla que creó 0011, escrita aquí literalmente (no desde locales/busqueda.py, que puede cambiar).
+INSERTAR = "INSERT INTO busqueda_indice (rowid, tipo, titulo, cuerpo) VALUES (%s, %s, %s, %s)"
+
+
+def _unir(*partes):
+    return '\n'.join(filter(None, partes))
+
+
+def indexar_resto(apps, schema_editor):
+    # Negocios, relatos y eventos entran al mismo índice que la biblioteca (0011).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Negocio = apps.get_model('locales', 'Negocio')
+    Relato = apps.get_model('locales', 'Relato')
+    EventoCultural = apps.get_model('eventos', 'EventoCultural')
+    documentos = [
+        (n.pk * 16 + 3, 'negocio', n.name, _unir(
+            n.description, n.address_text, n.categoria_relacionada.nombre if n.categoria_relacionada else None))
+        for n in Negocio.objects.select_related('categoria_relacionada')
+    ] + [
+        (r.pk * 16 + 4, 'relato', r.title, _unir(r.content, r.ubicacion_texto))
+        for r in Relato.objects.filter(status='approved')
+    ] + [
+        (e.pk * 16 + 5, 'evento', e.nombre, _unir(e.descripcion, e.ubicacion_texto))
+        for e in EventoCultural.objects.filter(publicado=True)
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(INSERTAR, documentos)
+
+
+def quitar_resto(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DELETE FROM busqueda_indice WHERE tipo MATCH %s",
+                              ['"negocio" OR "relato" OR "evento"'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0011_busqueda_indice'),
+        ('eventos', '0002_eventocultural_publicado'),
+    ]
+
+    operations = [
+        migrations.RunPython(indexar_resto, quitar_resto),
+    ]
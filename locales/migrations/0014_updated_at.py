@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0013_archivocontenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='negocio',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='receta',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='relato',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
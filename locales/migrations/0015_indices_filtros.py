@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0014_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='negocio',
+            index=models.Index(fields=['categoria_relacionada', 'is_turismo'], name='negocio_categoria_turismo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receta',
+            index=models.Index(fields=['estado', '-fecha_creacion'], name='receta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relato',
+            index=models.Index(fields=['status', '-created_at'], name='relato_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saberpopular',
+            index=models.Index(fields=['estado', '-fecha_creacion'], name='saber_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sugerencianegocio',
+            index=models.Index(fields=['estado', '-fecha_sugerencia'], name='sugerencia_estado_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0015_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sugerencianegocio',
+            name='duplicado_de',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sugerencias_duplicadas', to='locales.negocio', verbose_name='Posible duplicado de'),
+        ),
+        migrations.AddField(
+            model_name='sugerencianegocio',
+            name='similitud_duplicado',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
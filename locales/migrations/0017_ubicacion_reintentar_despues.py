@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0016_sugerencia_duplicado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ubicaciongeocodificada',
+            name='reintentar_despues',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locales', '0017_ubicacion_reintentar_despues'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivocontenido',
+            name='huella',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='archivocontenido',
+            name='nombre',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -1,10 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils.html import format_html
-from django.db.models import Avg
 from django.utils import timezone
 
 
@@ -12,6 +11,8 @@ from django.utils import timezone
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
+    # Promedio bayesiano de todos sus negocios (locales/ranking.py)
+    puntuacion_ranking = models.FloatField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -25,6 +26,24 @@ class Categoria(models.Model):
         verbose_name_plural = "Categorías"
 
 
+# Departamentos y regiones autónomas de Nicaragua
+class Departamento(models.Model):
+    nombre = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(unique=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.nombre)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name_plural = "Departamentos"
+        ordering = ['nombre']
+
+
 # Rango de usuario, se usará en PerfilUsuario
 class Rango(models.Model):
     nombre = models.CharField(max_length=50, unique=True)
@@ -44,6 +63,7 @@ class PerfilUsuario(models.Model):
     biografia = models.TextField(max_length=500, blank=True, null=True)
     telefono = models.CharField(max_length=20, blank=True, null=True)
     ubicacion = models.CharField(max_length=100, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'Perfil de {self.usuario.username}'
@@ -74,6 +94,7 @@ class Relato(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='relatos')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     image = models.ImageField(upload_to='relatos_images/', blank=True, null=True)
 
     # ¡NUEVOS CAMPOS AGREGADOS!
@@ -84,12 +105,21 @@ class Relato(models.Model):
     def __str__(self):
         return self.title
 
+    class Meta:
+        indexes = [
+            # Relatos aprobados (inicio, mapa) y cola de moderación del admin, de más reciente a más antiguo
+            models.Index(fields=['status', '-created_at'], name='relato_estado_fecha_idx'),
+        ]
+
 
 # Modelo para Negocios (Locales)
 class Negocio(models.Model):
     name = models.CharField(max_length=200, verbose_name="Nombre del Negocio")
     description = models.TextField(verbose_name="Descripción")
     address_text = models.CharField(max_length=255, verbose_name="Dirección")
+    # Se deduce de address_text al guardar (locales/departamentos.py)
+    departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='negocios', editable=False)
     hours = models.CharField(max_length=100, blank=True, null=True, verbose_name="Horario")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='negocios_creados')
     propietario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
@@ -97,6 +127,16 @@ class Negocio(models.Model):
     foto_principal = models.ImageField(upload_to='negocios_fotos/', blank=True, null=True,
                                        verbose_name="Foto Principal")
     calificacion_promedio = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
+    # Agregados de las calificaciones, mantenidos por locales/calificaciones.py
+    calificacion_suma = models.PositiveIntegerField(default=0)
+    calificacion_conteo = models.PositiveIntegerField(default=0)
+    votos_1 = models.PositiveIntegerField(default=0)
+    votos_2 = models.PositiveIntegerField(default=0)
+    votos_3 = models.PositiveIntegerField(default=0)
+    votos_4 = models.PositiveIntegerField(default=0)
+    votos_5 = models.PositiveIntegerField(default=0)
+    # Promedio bayesiano para ordenar el "top" de la portada (locales/ranking.py)
+    puntuacion_ranking = models.FloatField(default=0, db_index=True, editable=False)
     categoria_relacionada = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True,
                                               verbose_name="Categoría")
     paquetes_turismo = models.TextField(blank=True, null=True, verbose_name="Paquetes de Turismo")
@@ -112,13 +152,84 @@ class Negocio(models.Model):
     propietario_contacto = models.CharField(max_length=100, blank=True, null=True,
                                             verbose_name="Información de Contacto del Propietario")
 
+    # Coordenadas calculadas a partir de address_text (ver locales/geocodificacion.py)
+    latitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
+    longitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
+
+    # Fecha del último cambio; la usan las respuestas condicionales (locales/condicional.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Los agregados de calificaciones solo se modifican con UPDATE atómicos; un guardado
+        # normal (formulario, admin) no debe sobrescribirlos con valores leídos antes.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            from .calificaciones import CAMPOS_AGREGADOS
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name not in CAMPOS_AGREGADOS]
+        super().save(*args, **kwargs)
+
     def update_calificacion_promedio(self):
-        avg_rating = self.calificacion_set.aggregate(Avg('puntuacion'))['puntuacion__avg']
-        self.calificacion_promedio = round(avg_rating, 2) if avg_rating else 0.0
-        self.save()
+        # Recalcula desde cero los agregados de este negocio (normalmente no hace falta:
+        # cada Calificacion los actualiza de forma incremental al guardarse o borrarse).
+        from .calificaciones import recalcular_agregados, CAMPOS_AGREGADOS
+        recalcular_agregados([self.pk])
+        self.refresh_from_db(fields=CAMPOS_AGREGADOS)
+
+    def histograma_votos(self):
+        return [(p, getattr(self, f'votos_{p}')) for p in range(5, 0, -1)]
+
+    class Meta:
+        indexes = [
+            # Listado por categoría y plan de turismo; también sirve para las búsquedas por categoría sola
+            models.Index(fields=['categoria_relacionada', 'is_turismo'], name='negocio_categoria_turismo_idx'),
+        ]
+
+
+# Caché persistente de dirección -> coordenadas para no repetir consultas al geocodificador
+class UbicacionGeocodificada(models.Model):
+    direccion_normalizada = models.CharField(max_length=255, unique=True)
+    latitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
+    longitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
+    proveedor = models.CharField(max_length=50)
+    fecha = models.DateTimeField(default=timezone.now)
+    # Solo en los fallos del proveedor (red, límite de peticiones): hasta esta fecha la
+    # entrada vale como "no encontrada" y no se vuelve a preguntar.
+    reintentar_despues = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.direccion_normalizada
+
+    def vigente(self):
+        return self.reintentar_despues is None or self.reintentar_despues > timezone.now()
+
+    def coordenadas(self):
+        # None también se guarda: significa que el proveedor no encontró la dirección.
+        if self.latitud is None or self.longitud is None:
+            return None
+        return self.latitud, self.longitud
+
+    class Meta:
+        verbose_name_plural = "Ubicaciones geocodificadas"
+
+
+# Archivo único del almacenamiento por contenido (locales/almacenamiento.py)
+class ArchivoContenido(models.Model):
+    huella = models.CharField(max_length=64)  # sha256 en hexadecimal
+    # La cuenta es por archivo: el mismo contenido subido como .jpg y como .jpeg son
+    # dos archivos, cada uno con su fila.
+    nombre = models.CharField(max_length=255, unique=True)
+    tamano = models.PositiveBigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.nombre
+
+    class Meta:
+        verbose_name_plural = "Archivos por contenido"
 
 
 # Modelo para Sugerencia de Negocio
@@ -130,6 +241,8 @@ class SugerenciaNegocio(models.Model):
     ]
     nombre_negocio = models.CharField(max_length=100)
     ubicacion_texto = models.CharField(max_length=255, verbose_name="Ubicación")
+    departamento = models.ForeignKey(Departamento, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='sugerencias', editable=False)
     latitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
     longitud = models.DecimalField(max_digits=20, decimal_places=15, null=True, blank=True)
     comentarios = models.TextField(blank=True, null=True)
@@ -140,6 +253,11 @@ class SugerenciaNegocio(models.Model):
     foto_aprobada = models.BooleanField(default=False)
     categoria_relacionada = models.ForeignKey(Categoria, on_delete=models.SET_NULL, null=True, blank=True,
                                               verbose_name="Categoría sugerida")
+    # Negocio existente más parecido al recibir la sugerencia (locales/duplicados.py); al
+    # aprobarla se actualiza ese negocio en lugar de crear otro. El equipo puede quitarlo.
+    duplicado_de = models.ForeignKey(Negocio, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='sugerencias_duplicadas', verbose_name="Posible duplicado de")
+    similitud_duplicado = models.FloatField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"Sugerencia: {self.nombre_negocio}"
@@ -147,6 +265,10 @@ class SugerenciaNegocio(models.Model):
     class Meta:
         verbose_name_plural = "Sugerencias de Negocio"
         ordering = ['-fecha_sugerencia']
+        indexes = [
+            # Cola de sugerencias pendientes del admin, en el orden por defecto
+            models.Index(fields=['estado', '-fecha_sugerencia'], name='sugerencia_estado_fecha_idx'),
+        ]
 
 
 # Modelo para Recetas
@@ -164,12 +286,17 @@ class Receta(models.Model):
     autor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='recetas')
     estado = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     fecha_creacion = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.titulo
 
     class Meta:
         verbose_name_plural = "Recetas"
+        indexes = [
+            # Biblioteca (aprobadas, más recientes primero) y moderación por estado
+            models.Index(fields=['estado', '-fecha_creacion'], name='receta_estado_fecha_idx'),
+        ]
 
 
 # Modelo para Saber Popular
@@ -191,6 +318,9 @@ class SaberPopular(models.Model):
 
     class Meta:
         verbose_name_plural = "Saberes Populares"
+        indexes = [
+            models.Index(fields=['estado', '-fecha_creacion'], name='saber_estado_fecha_idx'),
+        ]
 
 
 # Modelo para Comentarios
@@ -205,6 +335,10 @@ class Comentario(models.Model):
 
     class Meta:
         verbose_name_plural = "Comentarios"
+        indexes = [
+            # Paginación por cursor (fecha, id) de los comentarios de un negocio
+            models.Index(fields=['negocio', '-fecha', '-id'], name='comentario_negocio_fecha_idx'),
+        ]
 
 
 # Modelo para Calificaciones
@@ -223,8 +357,18 @@ class Calificacion(models.Model):
         verbose_name_plural = "Calificaciones"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.negocio.update_calificacion_promedio()
+        from .calificaciones import aplicar_voto
+        with transaction.atomic():
+            anterior = None
+            if self.pk:
+                anterior = Calificacion.objects.select_for_update().filter(pk=self.pk) \
+                    .values_list('negocio_id', 'puntuacion').first()
+            super().save(*args, **kwargs)
+            if anterior == (self.negocio_id, self.puntuacion):
+                return
+            if anterior:
+                aplicar_voto(anterior[0], anterior[1], -1)
+            aplicar_voto(self.negocio_id, self.puntuacion, 1)
 
 
 # Modelo para Reclamo de Negocio
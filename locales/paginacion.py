@@ -0,0 +1,47 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def codificar_cursor(fecha, pk):
+    texto = f'{fecha.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    # Devuelve (fecha, pk) o None si el cursor no es válido. Los cursores los
+    # escribe codificar_cursor (fecha con zona horaria, id positivo); cualquier
+    # otra cosa viene de una URL manipulada y se trata como la primera página.
+    if not cursor:
+        return None
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        fecha, pk = texto.split('|')
+        fecha, pk = datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if fecha.tzinfo is None or not 0 < pk < 2 ** 63:
+        return None
+    return fecha, pk
+
+
+def pagina_por_cursor(queryset, cursor, tamano, campo_fecha='fecha'):
+    """Pagina de más reciente a más antiguo usando (fecha, id) como cursor.
+
+    A diferencia de OFFSET, cada página cuesta lo mismo sin importar cuántas
+    se hayan pasado: la condición del cursor se resuelve con el índice.
+    Devuelve (elementos, cursor_siguiente); el cursor es None en la última página.
+    """
+    queryset = queryset.order_by(f'-{campo_fecha}', '-id')
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        fecha, pk = posicion
+        queryset = queryset.filter(Q(**{f'{campo_fecha}__lt': fecha}) | Q(**{campo_fecha: fecha, 'id__lt': pk}))
+    elementos = list(queryset[:tamano + 1])
+    siguiente = None
+    if len(elementos) > tamano:
+        elementos = elementos[:tamano]
+        ultimo = elementos[-1]
+        siguiente = codificar_cursor(getattr(ultimo, campo_fecha), ultimo.pk)
+    return elementos, siguiente
@@ -0,0 +1,235 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .consultas import Medicion
+
+# Perfilado bajo demanda de una sola petición, para administradores.
+#
+# Un usuario staff añade ?perfilar=1 a la URL (o manda la cabecera X-Perfilar: 1) y
+# esa petición se ejecuta bajo cProfile y con un muestreador que cada INTERVALO_MS
+# apunta la pila de llamadas del hilo que la atiende. Se guardan tres archivos en
+# DIRECTORIO con el mismo nombre:
+#   .prof    estadísticas de cProfile (pstats, snakeviz...)
+#   .folded  pilas muestreadas en formato "plegado" (flamegraph.pl, speedscope.app)
+#   .json    resumen: tiempo total, de base de datos (con nº de consultas) y de
+#            plantillas, y las funciones más costosas; es lo que lista /perfiles/.
+# Solo se conservan los MAXIMO perfiles más recientes y de menos de DIAS días.
+#
+# Las peticiones que no lo piden solo pagan una búsqueda en la cadena de consulta y
+# otra en las cabeceras; con PERFILADO_ACTIVO = False el middleware ni se instala.
+ACTIVO = getattr(settings, 'PERFILADO_ACTIVO', True)
+DIRECTORIO = getattr(settings, 'PERFILADO_DIR', os.path.join(settings.BASE_DIR, 'perfiles'))
+MAXIMO = getattr(settings, 'PERFILADO_MAXIMO', 100)
+DIAS = getattr(settings, 'PERFILADO_DIAS', 7)
+INTERVALO_MS = getattr(settings, 'PERFILADO_INTERVALO_MS', 5)
+
+PARAMETRO = 'perfilar'
+CABECERA = 'HTTP_X_PERFILAR'
+FORMATOS = {'prof': 'application/octet-stream', 'folded': 'text/plain; charset=utf-8',
+            'json': 'application/json'}
+NOMBRE_VALIDO = re.compile(r'^[\w.-]+$')
+
+# Una petición perfilada a la vez por proceso: dos cProfile activos se estorban.
+_en_curso = threading.Lock()
+
+_prefijos = sorted({os.path.abspath(ruta) + os.sep for ruta in sys.path if ruta}, key=len, reverse=True)
+_nombres = {}
+
+
+def _nombre_de(codigo):
+    # "locales/views.py:home_view", sin el prefijo de sys.path para que se lea bien en la gráfica
+    nombre = _nombres.get(codigo)
+    if nombre is None:
+        archivo = codigo.co_filename
+        for prefijo in _prefijos:
+            if archivo.startswith(prefijo):
+                archivo = archivo[len(prefijo):]
+                break
+        nombre = _nombres[codigo] = f'{archivo}:{codigo.co_name}'
+    return nombre
+
+
+class Muestreador(threading.Thread):
+    """Cada `intervalo` segundos apunta la pila del hilo `objetivo` (de la raíz a la hoja)."""
+
+    def __init__(self, objetivo, intervalo):
+        super().__init__(daemon=True)
+        self.objetivo = objetivo
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            marco = sys._current_frames().get(self.objetivo)
+            pila = []
+            while marco is not None:
+                pila.append(_nombre_de(marco.f_code))
+                marco = marco.f_back
+            if pila:
+                self.pilas[';'.join(reversed(pila))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+    def plegado(self):
+        return ''.join(f'{pila} {veces}\n' for pila, veces in self.pilas.most_common())
+
+
+def pedido(request):
+    if PARAMETRO in request.META.get('QUERY_STRING', ''):
+        return request.GET.get(PARAMETRO) not in (None, '0')
+    return request.META.get(CABECERA, '0') not in ('', '0')
+
+
+def _tiempo_de_plantillas(estadisticas):
+    # Tiempo acumulado de Template.render: cProfile ya descuenta las llamadas anidadas
+    # (include, extends) de una misma función, así que no se cuenta dos veces.
+    codigo = Template.render.__code__
+    for (archivo, linea, funcion), datos in estadisticas.stats.items():
+        if funcion == codigo.co_name and linea == codigo.co_firstlineno and archivo == codigo.co_filename:
+            return datos[3]
+    return 0.0
+
+
+def _funciones_costosas(estadisticas, cantidad=15):
+    salida = io.StringIO()
+    estadisticas.stream = salida
+    estadisticas.sort_stats('cumulative').print_stats(cantidad)
+    texto = salida.getvalue()
+    for prefijo in _prefijos:
+        texto = texto.replace(prefijo, '')
+    return texto
+
+
+def guardar(meta, perfil, muestreador):
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    base = os.path.join(DIRECTORIO, meta['nombre'])
+    perfil.dump_stats(base + '.prof')
+    with open(base + '.folded', 'w', encoding='utf-8') as archivo:
+        archivo.write(muestreador.plegado())
+    with open(base + '.json', 'w', encoding='utf-8') as archivo:
+        json.dump(meta, archivo, ensure_ascii=False, indent=2)
+    podar()
+
+
+def podar():
+    """Borra los perfiles de más de DIAS días y los que pasen de MAXIMO (los más viejos)."""
+    limite = time.time() - DIAS * 86400
+    perfiles = sorted((os.path.getmtime(os.path.join(DIRECTORIO, archivo)), archivo[:-len('.json')])
+                      for archivo in os.listdir(DIRECTORIO) if archivo.endswith('.json'))
+    sobrantes = max(0, len(perfiles) - MAXIMO)
+    for i, (modificado, nombre) in enumerate(perfiles):
+        if i < sobrantes or modificado < limite:
+            for formato in FORMATOS:
+                try:
+                    os.remove(os.path.join(DIRECTORIO, f'{nombre}.{formato}'))
+                except FileNotFoundError:
+                    pass
+
+
+def listar():
+    """Resúmenes de los perfiles guardados, del más reciente al más antiguo."""
+    if not os.path.isdir(DIRECTORIO):
+        return []
+    perfiles = []
+    for archivo in os.listdir(DIRECTORIO):
+        if archivo.endswith('.json'):
+            try:
+                with open(os.path.join(DIRECTORIO, archivo), encoding='utf-8') as entrada:
+                    perfiles.append(json.load(entrada))
+            except (OSError, ValueError):
+                continue  # a medio escribir o podado mientras tanto
+    return sorted(perfiles, key=lambda meta: meta['fecha'], reverse=True)
+
+
+def ruta_de(nombre, formato):
+    """Ruta del archivo pedido, o None si el nombre o el formato no son válidos o no existe."""
+    if formato not in FORMATOS or not NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = os.path.join(DIRECTORIO, f'{nombre}.{formato}')
+    return ruta if os.path.isfile(ruta) else None
+
+
+class PerfilarMiddleware:
+    # Va después de AuthenticationMiddleware: necesita request.user.
+    def __init__(self, get_response):
+        if not ACTIVO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (pedido(request) and request.user.is_staff):
+            return self.get_response(request)
+        if not _en_curso.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Perfil'] = 'ocupado'
+            return response
+        try:
+            return self._perfilar(request)
+        finally:
+            _en_curso.release()
+
+    def _perfilar(self, request):
+        medicion = Medicion()
+        perfil = cProfile.Profile()
+        muestreador = Muestreador(threading.get_ident(), INTERVALO_MS / 1000)
+        fecha = datetime.now()
+        with ExitStack() as pila:
+            for alias in connections:
+                pila.enter_context(connections[alias].execute_wrapper(medicion))
+            muestreador.start()
+            inicio = time.perf_counter()
+            perfil.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                perfil.disable()
+                total = time.perf_counter() - inicio
+                muestreador.parar()
+
+        estadisticas = pstats.Stats(perfil)
+        coincidencia = getattr(request, 'resolver_match', None)
+        nombre_url = (coincidencia.view_name if coincidencia else None) or 'sin-nombre'
+        etiqueta = re.sub(r'[^\w-]', '_', nombre_url)
+        meta = {
+            'nombre': f'{fecha:%Y%m%d-%H%M%S}-{etiqueta}-{uuid.uuid4().hex[:6]}',
+            'fecha': fecha.isoformat(timespec='seconds'),
+            'metodo': request.method,
+            'ruta': request.get_full_path(),
+            'url': nombre_url,
+            'usuario': request.user.get_username(),
+            'estado': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'bd_ms': round(medicion.tiempo * 1000, 1),
+            'consultas': medicion.consultas,
+            'repetidas': len(medicion.repetidas()),
+            'plantillas_ms': round(_tiempo_de_plantillas(estadisticas) * 1000, 1),
+            'muestras': sum(muestreador.pilas.values()),
+            'funciones': _funciones_costosas(estadisticas),
+        }
+        guardar(meta, perfil, muestreador)
+
+        response['X-Perfil'] = meta['nombre']
+        tiempos = (f"total;dur={meta['total_ms']}, bd;dur={meta['bd_ms']};desc=\"{meta['consultas']} consultas\", "
+                   f"plantillas;dur={meta['plantillas_ms']}")
+        previo = response.get('Server-Timing')
+        response['Server-Timing'] = f'{previo}, {tiempos}' if previo else tiempos
+        return response
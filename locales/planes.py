@@ -0,0 +1,45 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection, connections
+
+# Planes de ejecución de SQLite (EXPLAIN QUERY PLAN) de un queryset.
+#
+# "SCAN tabla" a secas es un recorrido completo de la tabla; con "USING INDEX" o
+# "USING COVERING INDEX" recorre un índice (por ejemplo uno parcial, que solo
+# contiene las filas que cumplen su condición) y "SEARCH" es una búsqueda por índice.
+_ESCANEO_COMPLETO = re.compile(r'^SCAN (\S+)$')
+
+
+def explicar(sql, parametros=(), alias='default'):
+    """Filas del plan como texto, por ejemplo 'SEARCH locales_relato USING INDEX ... (status=?)'."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+        return [fila[-1] for fila in cursor.fetchall()]
+
+
+def plan_de_consulta(queryset):
+    sql, parametros = queryset.query.sql_with_params()
+    return explicar(sql, parametros, queryset.db)
+
+
+@contextmanager
+def consultas_ejecutadas():
+    """Reúne los SELECT que se ejecutan dentro del bloque como (sql, parámetros).
+
+    Se explican después, fuera del bloque, para no mezclar los EXPLAIN con las consultas.
+    """
+    consultas = []
+
+    def anotar(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            consultas.append((sql, params or ()))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(anotar):
+        yield consultas
+
+
+def tablas_recorridas(plan):
+    """Tablas que el plan lee completas, sin ayuda de ningún índice."""
+    return [m.group(1) for m in map(_ESCANEO_COMPLETO.match, plan) if m]
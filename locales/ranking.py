@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+from . import fragmentos, metricas, versiones
+
+# Promedio bayesiano: cada negocio empieza con PESO_PREVIO votos "virtuales" iguales a la
+# media de todo el sitio, así un 5.0 con un solo voto no supera a un 4.8 con cien.
+PESO_PREVIO = getattr(settings, 'RANKING_PESO_PREVIO', 5)
+MEDIA_PREVIA = getattr(settings, 'RANKING_MEDIA_PREVIA', 3.0)
+TOP_N = getattr(settings, 'RANKING_TOP_N', 12)
+SEGUNDOS_CACHE = getattr(settings, 'RANKING_SEGUNDOS_CACHE', 300)
+
+# La media y el top se guardan en la caché 'default' (de cada proceso) bajo claves con
+# versiones compartidas (locales/versiones.py): `recalcular_ranking`, que corre en su
+# propio proceso, y un voto en cualquier worker los invalidan en todos.
+VERSION_MEDIA = 'ranking_media'
+VERSION_TOP = 'ranking_top'
+
+
+def media_global(recalcular=False):
+    if recalcular:
+        versiones.subir(VERSION_MEDIA)
+    clave = f'ranking:media_global:{versiones.actual(VERSION_MEDIA)}'
+    media = cache.get(clave)
+    if media is None:
+        from .models import Negocio
+        totales = Negocio.objects.aggregate(suma=Sum('calificacion_suma'), conteo=Sum('calificacion_conteo'))
+        media = totales['suma'] / totales['conteo'] if totales['conteo'] else MEDIA_PREVIA
+        cache.set(clave, media, None)
+    return media
+
+
+def puntuacion(suma, conteo, media=None):
+    media = media_global() if media is None else media
+    return (PESO_PREVIO * media + suma) / (PESO_PREVIO + conteo)
+
+
+def expresion_puntuacion(suma, conteo, media=None):
+    # Lo mismo que puntuacion() pero como expresión SQL, para usarla dentro de un UPDATE.
+    media = media_global() if media is None else media
+    return (Value(PESO_PREVIO * media) + Cast(suma, FloatField())) / (Value(PESO_PREVIO) + conteo)
+
+
+def _subconsulta_categoria(campo):
+    from .models import Negocio
+    return Coalesce(Subquery(
+        Negocio.objects.filter(categoria_relacionada=OuterRef('pk')).order_by()
+        .values('categoria_relacionada').annotate(total=Sum(campo)).values('total')
+    ), 0, output_field=IntegerField())
+
+
+def actualizar_categoria(categoria_id, media=None):
+    from .models import Categoria
+    if categoria_id is None:
+        return
+    Categoria.objects.filter(pk=categoria_id).update(puntuacion_ranking=expresion_puntuacion(
+        _subconsulta_categoria('calificacion_suma'), _subconsulta_categoria('calificacion_conteo'), media))
+
+
+def tras_voto(negocio_id):
+    # La puntuación del negocio ya se actualizó en el mismo UPDATE que el voto;
+    # aquí solo queda su categoría y la lista cacheada de la portada.
+    from .models import Negocio
+    categoria_id = Negocio.objects.filter(pk=negocio_id).values_list('categoria_relacionada', flat=True).first()
+    actualizar_categoria(categoria_id)
+    invalidar_top()
+
+
+def recalcular_todo():
+    """Recalcula la media global y la puntuación de todos los negocios y categorías.
+
+    Pensado para ejecutarse periódicamente (cron) con `manage.py recalcular_ranking`,
+    ya que los votos nuevos mueven la media global y las actualizaciones
+    incrementales la toman de la caché.
+    """
+    from .models import Categoria, Negocio
+    media = media_global(recalcular=True)
+    negocios = Negocio.objects.update(
+        puntuacion_ranking=expresion_puntuacion(F('calificacion_suma'), F('calificacion_conteo'), media))
+    categorias = Categoria.objects.update(puntuacion_ranking=expresion_puntuacion(
+        _subconsulta_categoria('calificacion_suma'), _subconsulta_categoria('calificacion_conteo'), media))
+    invalidar_top()
+    return negocios, categorias, media
+
+
+def invalidar_top():
+    versiones.subir(VERSION_TOP)
+    # La portada muestra el top dentro de un fragmento cacheado.
+    fragmentos.invalidar('ranking')
+
+
+def top_negocios(n=None, categoria=None):
+    """Los n negocios mejor puntuados, opcionalmente de una categoría.
+
+    Se cachean solo los ids (la lista cambia con los votos, no con cada edición);
+    resolverlos es una consulta por clave primaria.
+    """
+    from .models import Negocio
+    n = n or TOP_N
+    clave = f'ranking:top:{versiones.actual(VERSION_TOP)}:{categoria.pk if categoria else "todas"}:{n}'
+    ids = cache.get(clave)
+    metricas.registrar_cache('ranking', ids is not None)
+    if ids is None:
+        queryset = Negocio.objects.all()
+        if categoria is not None:
+            queryset = queryset.filter(categoria_relacionada=categoria)
+        ids = list(queryset.order_by('-puntuacion_ranking', '-calificacion_conteo', 'id')
+                   .values_list('id', flat=True)[:n])
+        cache.set(clave, ids, SEGUNDOS_CACHE)
+    negocios = Negocio.objects.in_bulk(ids)
+    return [negocios[pk] for pk in ids if pk in negocios]
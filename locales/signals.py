@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import PerfilUsuario, Rango
+from .models import PerfilUsuario, Rango, Negocio, Relato, Calificacion, SugerenciaNegocio, Departamento, Receta, \
+    SaberPopular, Categoria, ReclamoNegocio
+from eventos.models import EventoCultural
+from .calificaciones import aplicar_voto
+from . import almacenamiento, ranking, busqueda, autocompletado, duplicados, fragmentos
+from .geocodificacion import geocodificar_al_guardar, programar_geocodificacion
+from .mapa import invalidar_mapa
+from .departamentos import asignar_departamento, invalidar_lista as invalidar_lista_departamentos
 
 @receiver(post_save, sender=User)
 def crear_perfil_usuario(sender, instance, created, **kwargs):
@@ -11,4 +19,229 @@ def crear_perfil_usuario(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def guardar_perfil_usuario(sender, instance, **kwargs):
-    instance.perfilusuario.save()
\ No newline at end of file
+    instance.perfilusuario.save()
+
+# Valores guardados antes de cada cambio, para que los receptores de abajo sepan qué cambió
+# sin consultar la base de datos cada uno por su cuenta.
+CAMPOS_ANTERIORES = {
+    Negocio: ('address_text', 'departamento_id', 'latitud', 'longitud', 'name'),
+    Relato: ('latitud', 'longitud', 'status', 'title', 'content'),
+    SugerenciaNegocio: ('ubicacion_texto',),
+}
+
+# Campos con archivo en el almacenamiento por contenido (locales/almacenamiento.py). Al
+# borrar la fila o cambiarle el archivo se suelta su referencia al anterior; el archivo
+# se quita del disco cuando ninguna otra fila lo usa.
+CAMPOS_ARCHIVO = {
+    PerfilUsuario: ('avatar',),
+    Negocio: ('foto_principal',),
+    Relato: ('image',),
+    SugerenciaNegocio: ('foto_referencia',),
+    Receta: ('imagen',),
+    SaberPopular: ('imagen',),
+    ReclamoNegocio: ('contrato_pdf',),
+}
+
+# Campos que se muestran en el mapa: si cambian, los grupos precalculados dejan de valer.
+CAMPOS_MAPA = {
+    Negocio: ('latitud', 'longitud', 'name', 'address_text'),
+    Relato: ('latitud', 'longitud', 'status', 'title', 'content'),
+}
+
+@receiver(pre_save, sender=Negocio)
+@receiver(pre_save, sender=Relato)
+@receiver(pre_save, sender=SugerenciaNegocio)
+@receiver(pre_save, sender=PerfilUsuario)
+@receiver(pre_save, sender=Receta)
+@receiver(pre_save, sender=SaberPopular)
+@receiver(pre_save, sender=ReclamoNegocio)
+def recordar_estado_anterior(sender, instance, raw=False, **kwargs):
+    instance._anterior = None
+    if not raw and instance.pk:
+        campos = CAMPOS_ANTERIORES.get(sender, ()) + CAMPOS_ARCHIVO.get(sender, ())
+        instance._anterior = sender.objects.filter(pk=instance.pk).values(*campos).first()
+
+def _cambio(instance, campo):
+    anterior = getattr(instance, '_anterior', None)
+    return anterior is None or anterior[campo] != getattr(instance, campo)
+
+@receiver(pre_save, sender=PerfilUsuario)
+@receiver(pre_save, sender=Negocio)
+@receiver(pre_save, sender=Relato)
+@receiver(pre_save, sender=SugerenciaNegocio)
+@receiver(pre_save, sender=Receta)
+@receiver(pre_save, sender=SaberPopular)
+@receiver(pre_save, sender=ReclamoNegocio)
+def soltar_archivos_reemplazados(sender, instance, update_fields=None, raw=False, **kwargs):
+    anterior = getattr(instance, '_anterior', None)
+    if raw or anterior is None:
+        return
+    for campo in CAMPOS_ARCHIVO[sender]:
+        if not anterior[campo] or (update_fields is not None and campo not in update_fields):
+            continue
+        if instance.__dict__.get(campo) is None:
+            # Lo deja FieldFile.delete(), que ya soltó la referencia. Para vaciar un campo
+            # sin borrar, asignar '' (como el "borrar" de los formularios).
+            continue
+        archivo = getattr(instance, campo)
+        # Una subida sin confirmar se guarda ahora y suma su propia referencia aunque el
+        # contenido sea el mismo.
+        if not archivo._committed or archivo.name != anterior[campo]:
+            almacenamiento.soltar(archivo.storage, anterior[campo])
+
+@receiver(post_delete, sender=PerfilUsuario)
+@receiver(post_delete, sender=Negocio)
+@receiver(post_delete, sender=Relato)
+@receiver(post_delete, sender=SugerenciaNegocio)
+@receiver(post_delete, sender=Receta)
+@receiver(post_delete, sender=SaberPopular)
+@receiver(post_delete, sender=ReclamoNegocio)
+def soltar_archivos_borrados(sender, instance, **kwargs):
+    for campo in CAMPOS_ARCHIVO[sender]:
+        archivo = getattr(instance, campo)
+        if archivo:
+            almacenamiento.soltar(archivo.storage, archivo.name)
+
+@receiver(pre_save, sender=Negocio)
+def geocodificar_si_cambia_direccion(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Solo se vuelve a geocodificar cuando cambia address_text (o nunca se hizo).
+    if raw or (update_fields is not None and 'address_text' not in update_fields):
+        return
+    if _cambio(instance, 'address_text') or instance.latitud is None:
+        # Con un proveedor remoto y una dirección nueva no se espera a la red aquí:
+        # se consulta después del commit (post_save de abajo).
+        instance._geocodificar_despues = not geocodificar_al_guardar(instance)
+
+@receiver(post_save, sender=Negocio)
+def geocodificar_despues_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_geocodificar_despues', False):
+        instance._geocodificar_despues = False
+        programar_geocodificacion(instance.pk)
+
+@receiver(pre_save, sender=Negocio)
+def asignar_departamento_negocio(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'address_text' not in update_fields):
+        return
+    if _cambio(instance, 'address_text'):
+        asignar_departamento(instance, instance.address_text)
+
+@receiver(pre_save, sender=SugerenciaNegocio)
+def asignar_departamento_sugerencia(sender, instance, raw=False, **kwargs):
+    if not raw and _cambio(instance, 'ubicacion_texto'):
+        asignar_departamento(instance, instance.ubicacion_texto)
+
+@receiver(post_save, sender=Negocio)
+def invalidar_departamentos_si_cambia(sender, instance, created, raw=False, **kwargs):
+    if not raw and (created or _cambio(instance, 'departamento_id')):
+        invalidar_lista_departamentos()
+
+@receiver(post_delete, sender=Negocio)
+@receiver(post_save, sender=Departamento)
+@receiver(post_delete, sender=Departamento)
+def invalidar_departamentos(sender, **kwargs):
+    invalidar_lista_departamentos()
+
+@receiver(post_save, sender=Negocio)
+@receiver(post_save, sender=Relato)
+def invalidar_mapa_si_cambia(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or any(_cambio(instance, campo) for campo in CAMPOS_MAPA[sender]):
+        invalidar_mapa()
+
+@receiver(post_delete, sender=Negocio)
+@receiver(post_delete, sender=Relato)
+def invalidar_mapa_al_borrar(sender, instance, **kwargs):
+    invalidar_mapa()
+
+@receiver(post_delete, sender=Calificacion)
+def descontar_calificacion(sender, instance, **kwargs):
+    # También se ejecuta al borrar desde un queryset o en cascada desde el usuario.
+    aplicar_voto(instance.negocio_id, instance.puntuacion, -1)
+
+@receiver(pre_save, sender=Negocio)
+def puntuacion_inicial(sender, instance, raw=False, **kwargs):
+    # Un negocio nuevo, sin votos, entra al ranking con la media global.
+    if not raw and instance._state.adding:
+        instance.puntuacion_ranking = ranking.puntuacion(instance.calificacion_suma, instance.calificacion_conteo)
+
+@receiver(post_save, sender=Negocio)
+def invalidar_top_al_crear(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ranking.invalidar_top()
+
+@receiver(post_delete, sender=Negocio)
+def invalidar_top_al_borrar(sender, instance, **kwargs):
+    ranking.invalidar_top()
+
+@receiver(post_save, sender=Receta)
+@receiver(post_save, sender=SaberPopular)
+@receiver(post_save, sender=Negocio)
+@receiver(post_save, sender=Relato)
+@receiver(post_save, sender=EventoCultural)
+def actualizar_indice_busqueda(sender, instance, raw=False, **kwargs):
+    # Entra al índice al aprobarse y sale si se rechaza o vuelve a pendiente.
+    if not raw:
+        busqueda.indexar(instance)
+
+@receiver(post_delete, sender=Receta)
+@receiver(post_delete, sender=SaberPopular)
+@receiver(post_delete, sender=Negocio)
+@receiver(post_delete, sender=Relato)
+@receiver(post_delete, sender=EventoCultural)
+def quitar_del_indice_busqueda(sender, instance, **kwargs):
+    busqueda.desindexar(sender, [instance.pk])
+
+@receiver(post_save, sender=Categoria)
+def reindexar_negocios_de_categoria(sender, instance, created, raw=False, **kwargs):
+    # El nombre de la categoría forma parte del documento de cada negocio.
+    if not created and not raw:
+        busqueda.reindexar_queryset(Negocio.objects.filter(categoria_relacionada=instance))
+
+@receiver(post_save, sender=Categoria)
+def marcar_negocios_de_categoria(sender, instance, created, raw=False, **kwargs):
+    # La página de cada negocio muestra el nombre de su categoría: cambia su updated_at
+    # para que las respuestas condicionales (locales/condicional.py) no sirvan la versión vieja.
+    if not created and not raw:
+        Negocio.objects.filter(categoria_relacionada=instance).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Negocio)
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Departamento)
+@receiver(post_save, sender=User)
+def actualizar_autocompletado(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Los inicios de sesión guardan User solo con last_login: no cambia nada sugerible.
+    if raw or (update_fields and set(update_fields) == {'last_login'}):
+        return
+    autocompletado.actualizar(instance)
+
+@receiver(post_delete, sender=Negocio)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Departamento)
+@receiver(post_delete, sender=User)
+def quitar_del_autocompletado(sender, instance, **kwargs):
+    autocompletado.actualizar(instance, borrado=True)
+
+@receiver(post_save, sender=Negocio)
+def actualizar_indice_duplicados(sender, instance, created, raw=False, **kwargs):
+    # Solo el nombre y la dirección cuentan para parecerse a una sugerencia.
+    if not raw and (created or _cambio(instance, 'name') or _cambio(instance, 'address_text')):
+        duplicados.actualizar(instance)
+
+@receiver(post_delete, sender=Negocio)
+def quitar_del_indice_duplicados(sender, instance, **kwargs):
+    duplicados.actualizar(instance, borrado=True)
+
+@receiver([post_save, post_delete], sender=Relato)
+@receiver([post_save, post_delete], sender=Negocio)
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Calificacion)
+@receiver([post_save, post_delete], sender=Receta)
+@receiver([post_save, post_delete], sender=SaberPopular)
+@receiver([post_save, post_delete], sender=EventoCultural)
+@receiver([post_save, post_delete], sender=User)
+def invalidar_fragmentos(sender, instance, update_fields=None, **kwargs):
+    # Nueva versión de los fragmentos de plantilla que dependen del modelo (locales/fragmentos.py).
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    fragmentos.invalidar(sender)
@@ -0,0 +1,63 @@
+(function () {
+    // Autocompletado del buscador: las sugerencias llegan del índice en memoria y,
+    // al elegir una, se va directo a su página.
+    const entrada = document.querySelector('.nav-buscar input');
+    if (!entrada) return;
+    const lista = document.getElementById('sugerencias-busqueda');
+    let urls = {};
+    let pendiente = null;
+    entrada.addEventListener('input', function () {
+        if (urls[entrada.value]) {
+            window.location.href = urls[entrada.value];
+            return;
+        }
+        if (pendiente) pendiente.abort();
+        if (entrada.value.trim().length < 2) return;
+        pendiente = new AbortController();
+        fetch(`${entrada.dataset.autocompletar}?q=${encodeURIComponent(entrada.value)}`, {signal: pendiente.signal})
+            .then(respuesta => respuesta.json())
+            .then(datos => {
+                urls = {};
+                lista.innerHTML = '';
+                datos.sugerencias.forEach(s => {
+                    urls[s.texto] = s.url;
+                    const opcion = document.createElement('option');
+                    opcion.value = s.texto;
+                    opcion.label = s.tipo;
+                    lista.appendChild(opcion);
+                });
+            })
+            .catch(() => {});
+    });
+})();
+
+function toggleMapa(id, direccion) {
+    const mapaDiv = document.getElementById(`mapa-${id}`);
+    const btn = document.getElementById(`btn-${id}`);
+
+    document.querySelectorAll('[id^="mapa-"]').forEach(div => {
+        if (div.id !== `mapa-${id}`) {
+            div.innerHTML = '';
+            const negocioId = div.id.replace('mapa-', '');
+            const otherBtn = document.getElementById(`btn-${negocioId}`);
+            if (otherBtn) otherBtn.textContent = 'Ver ubicación';
+        }
+    });
+
+    if (mapaDiv.innerHTML.trim() !== '') {
+        mapaDiv.innerHTML = '';
+        btn.textContent = 'Ver ubicación';
+    } else {
+        mapaDiv.innerHTML = `
+            <iframe
+                width="100%"
+                height="250"
+                frameborder="0"
+                style="border:0; border-radius: 12px;"
+                src="https://maps.google.com/maps?q=${direccion}&t=&z=15&ie=UTF8&iwloc=&output=embed"
+                allowfullscreen>
+            </iframe>
+        `;
+        btn.textContent = 'Ocultar ubicación';
+    }
+}
@@ -0,0 +1,174 @@
+import os
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Ingesta de archivos subidos.
+#
+# 1. ManejadorSubidaLimitada (FILE_UPLOAD_HANDLERS) escribe cada archivo a disco
+#    por trozos, así la memoria por subida es constante. Si un archivo pasa del
+#    límite, el resto de sus bytes se descarta sin guardarse y el formulario
+#    recibe un ArchivoRechazado con el motivo.
+# 2. ImagenSubidaField y PdfSubidoField comprueban el tipo real por los primeros
+#    bytes (no por la extensión ni el Content-Type del navegador). Las imágenes
+#    más grandes que SUBIDAS_LADO_MAXIMO se reducen y todas pierden los metadatos
+#    EXIF (ubicación GPS, modelo de cámara…) antes de llegar al modelo. Las que no
+#    son JPEG y pasan de SUBIDAS_PIXELES_MAXIMOS se rechazan sin decodificarlas.
+TAMANO_MAXIMO = getattr(settings, 'SUBIDAS_TAMANO_MAXIMO', 10 * 1024 * 1024)
+TAMANO_MAXIMO_PDF = getattr(settings, 'SUBIDAS_TAMANO_MAXIMO_PDF', 5 * 1024 * 1024)
+LADO_MAXIMO = getattr(settings, 'SUBIDAS_LADO_MAXIMO', 2048)
+# Solo las JPEG se pueden decodificar ya reducidas (draft); PNG, GIF y WebP se decodifican
+# enteras antes de reducirse, así que la memoria crece con sus píxeles y no con el tamaño
+# del archivo (un PNG de 20000×20000 de un solo color pesa unos pocos KB).
+PIXELES_MAXIMOS = getattr(settings, 'SUBIDAS_PIXELES_MAXIMOS', 30_000_000)
+CALIDAD = {'JPEG': 85, 'WEBP': 85}
+
+# Firma (bytes iniciales) → formato de Pillow
+FIRMAS_IMAGEN = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+EXTENSIONES = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+
+
+class ArchivoRechazado(UploadedFile):
+    """Marcador de un archivo que el manejador no guardó; el campo del formulario
+    lo convierte en un error de validación con este motivo."""
+
+    def __init__(self, name, content_type, motivo):
+        super().__init__(file=None, name=name, content_type=content_type, size=0)
+        self.motivo = motivo
+
+    def open(self, mode=None):
+        return self
+
+    def close(self):
+        pass
+
+
+class ManejadorSubidaLimitada(TemporaryFileUploadHandler):
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.recibidos = 0
+        self.motivo = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.motivo:
+            return None
+        self.recibidos += len(raw_data)
+        if self.recibidos > TAMANO_MAXIMO:
+            self.motivo = f"El archivo supera el máximo de {filesizeformat(TAMANO_MAXIMO)}."
+            self.file.close()  # borra el temporal
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.motivo:
+            return ArchivoRechazado(self.file_name, self.content_type, self.motivo)
+        return super().file_complete(file_size)
+
+
+def _cabecera(archivo, tamano=16):
+    archivo.seek(0)
+    cabecera = archivo.read(tamano)
+    archivo.seek(0)
+    return cabecera
+
+
+def formato_imagen(archivo):
+    cabecera = _cabecera(archivo)
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'WEBP'
+    for firma, formato in FIRMAS_IMAGEN:
+        if cabecera.startswith(firma):
+            return formato
+    return None
+
+
+def es_pdf(archivo):
+    return _cabecera(archivo, 5) == b'%PDF-'
+
+
+def normalizar_imagen(archivo, formato, lado_maximo=LADO_MAXIMO):
+    """Reduce la imagen si hace falta y la vuelve a codificar sin metadatos.
+
+    Devuelve un archivo temporal nuevo, o el mismo si ya es pequeño y no trae
+    metadatos (así no se pierde calidad recodificando sin motivo).
+    """
+    archivo.seek(0)
+    with Image.open(archivo) as imagen:
+        # Image.open solo lee la cabecera: se comprueba antes de decodificar nada.
+        ancho, alto = imagen.size
+        if formato != 'JPEG' and ancho * alto > PIXELES_MAXIMOS:
+            raise Image.DecompressionBombError(f'{ancho}x{alto} píxeles, más de {PIXELES_MAXIMOS}')
+        if formato == 'GIF' and getattr(imagen, 'is_animated', False):
+            # Reducir un GIF animado rompería la animación; basta con el límite de tamaño.
+            return archivo
+        tiene_metadatos = bool(imagen.info.get('exif') or imagen.info.get('xmp') or imagen.getexif())
+        if max(imagen.size) <= lado_maximo and not tiene_metadatos:
+            return archivo
+        if formato == 'JPEG':
+            # Decodifica directamente a una escala reducida: no se llega a tener la foto entera en memoria.
+            imagen.draft('RGB', (lado_maximo, lado_maximo))
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.thumbnail((lado_maximo, lado_maximo), Image.LANCZOS)
+        if formato == 'JPEG' and imagen.mode not in ('RGB', 'L'):
+            imagen = imagen.convert('RGB')
+
+        base = os.path.splitext(os.path.basename(archivo.name or 'imagen'))[0]
+        salida = TemporaryUploadedFile(base + EXTENSIONES[formato], Image.MIME[formato], 0, None)
+        opciones = {'quality': CALIDAD[formato]} if formato in CALIDAD else {}
+        imagen.save(salida.file, format=formato, optimize=True, **opciones)
+        salida.size = salida.file.tell()
+        salida.seek(0)
+        return salida
+
+
+class ImagenSubidaField(forms.ImageField):
+    default_error_messages = {
+        'formato': "Solo se aceptan imágenes JPEG, PNG, GIF o WebP.",
+        'pixeles': "La imagen es demasiado grande: como máximo %(maximo)s megapíxeles (salvo las JPEG).",
+    }
+
+    def to_python(self, data):
+        if isinstance(data, ArchivoRechazado):
+            raise forms.ValidationError(data.motivo, code='tamano')
+        if data is not None and hasattr(data, 'read') and formato_imagen(data) is None:
+            raise forms.ValidationError(self.error_messages['formato'], code='formato')
+        archivo = super().to_python(data)
+        if archivo is None:
+            return None
+        try:
+            return normalizar_imagen(archivo, formato_imagen(archivo))
+        except Image.DecompressionBombError:
+            raise forms.ValidationError(self.error_messages['pixeles'], code='pixeles',
+                                        params={'maximo': PIXELES_MAXIMOS // 1_000_000})
+        except (OSError, UnidentifiedImageError):
+            raise forms.ValidationError(self.error_messages['invalid_image'], code='invalid_image')
+
+
+class PdfSubidoField(forms.FileField):
+    default_error_messages = {
+        'formato': "El documento debe ser un PDF.",
+        'tamano': "El PDF supera el máximo de %(maximo)s.",
+    }
+
+    def to_python(self, data):
+        if isinstance(data, ArchivoRechazado):
+            raise forms.ValidationError(data.motivo, code='tamano')
+        archivo = super().to_python(data)
+        if archivo is None:
+            return None
+        if archivo.size > TAMANO_MAXIMO_PDF:
+            raise forms.ValidationError(self.error_messages['tamano'], code='tamano',
+                                        params={'maximo': filesizeformat(TAMANO_MAXIMO_PDF)})
+        if not es_pdf(archivo):
+            raise forms.ValidationError(self.error_messages['formato'], code='formato')
+        return archivo
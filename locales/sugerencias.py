@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import almacenamiento, autocompletado, busqueda, duplicados, fragmentos, ranking
+from .departamentos import invalidar_lista as invalidar_lista_departamentos
+from .geocodificacion import asignar_coordenadas
+from .mapa import invalidar_mapa
+from .models import Negocio, SugerenciaNegocio
+
+# Aprobación en bloque de sugerencias de negocio (acciones del admin).
+#
+# Aprobar una sugerencia crea el negocio con ese nombre o, si ya existe, lo
+# actualiza con los datos sugeridos. Antes se hacía fila a fila (buscar por nombre,
+# guardar el negocio, guardar la sugerencia), unas diez consultas por sugerencia
+# contando las de las señales y sin transacción. Aquí todos los nombres se
+# resuelven con una consulta, las escrituras son bulk_create/bulk_update/update
+# dentro de un solo atomic() y lo que harían las señales (departamento,
+# coordenadas, puntuación inicial, índice de búsqueda, cachés) se hace una vez
+# para todo el lote. Las direcciones se geocodifican antes de abrir la
+# transacción: el proveedor puede tardar y no debe retener el bloqueo de escritura.
+#
+# El negocio de una sugerencia es el que tiene exactamente su nombre o, si no hay
+# ninguno, el posible duplicado que se le apuntó al recibirla (locales/duplicados.py).
+#
+# La foto aprobada pasa a ser la del negocio con almacenamiento.compartir(), que
+# suma su referencia: si no, borrar la sugerencia quitaría la foto del negocio.
+#
+# Cada sugerencia da un Resultado; las que no se pueden aprobar se saltan sin
+# impedir las demás. Si falla la escritura no se aprueba ninguna.
+LOTE = 200
+
+Resultado = namedtuple('Resultado', 'sugerencia estado negocio detalle')
+
+CREADO = 'creado'
+ACTUALIZADO = 'actualizado'
+VINCULADA = 'vinculada'  # foto aprobada y puesta como foto principal del negocio
+APROBADA = 'aprobada'  # foto aprobada, sin negocio con ese nombre todavía
+OMITIDA = 'omitida'
+ERROR = 'error'
+
+CAMPOS_ACTUALIZADOS = ['description', 'address_text', 'categoria_relacionada', 'foto_principal',
+                       'departamento', 'latitud', 'longitud', 'updated_at']
+
+
+def _negocios_de(sugerencias):
+    """({nombre: negocio}, {pk: negocio}) con los negocios a los que apuntan las sugerencias.
+
+    Por nombre, el más antiguo con ese nombre (como hacía .filter(name=...).first());
+    por pk, además, los posibles duplicados. Cada negocio es un único objeto.
+    """
+    por_nombre = {}
+    for negocio in Negocio.objects.filter(name__in={s.nombre_negocio for s in sugerencias}).order_by('pk'):
+        por_nombre.setdefault(negocio.name, negocio)
+    por_pk = {negocio.pk: negocio for negocio in por_nombre.values()}
+    por_pk.update(Negocio.objects.in_bulk({s.duplicado_de_id for s in sugerencias} - set(por_pk) - {None}))
+    return por_nombre, por_pk
+
+
+def aprobar_sugerencias(sugerencias, geocodificador=None):
+    """Aprueba las sugerencias creando o actualizando su negocio. Devuelve [Resultado]."""
+    sugerencias = list(sugerencias)
+    resultados = []
+    negocios, por_pk = _negocios_de(sugerencias)
+    direcciones = {pk: negocio.address_text for pk, negocio in por_pk.items()}
+    nuevos, cambiados, aprobadas = [], {}, []
+    fotos = {}  # id(negocio) -> (negocio, sugerencia con la foto que se queda)
+    puntuacion_inicial = ranking.puntuacion(0, 0)  # la de un negocio sin votos (señal puntuacion_inicial)
+
+    for sugerencia in sugerencias:
+        nombre = (sugerencia.nombre_negocio or '').strip()
+        if sugerencia.estado == 'approved':
+            resultados.append(Resultado(sugerencia, OMITIDA, None, "ya estaba aprobada"))
+            continue
+        if not nombre:
+            resultados.append(Resultado(sugerencia, ERROR, None, "la sugerencia no tiene nombre"))
+            continue
+        negocio = negocios.get(sugerencia.nombre_negocio) or por_pk.get(sugerencia.duplicado_de_id)
+        if negocio is None:
+            negocio = Negocio(
+                name=sugerencia.nombre_negocio,
+                description=sugerencia.comentarios or '',
+                address_text=sugerencia.ubicacion_texto,
+                departamento_id=sugerencia.departamento_id,
+                created_by_id=sugerencia.sugerido_por_id,
+                categoria_relacionada_id=sugerencia.categoria_relacionada_id,
+                puntuacion_ranking=puntuacion_inicial,
+            )
+            nuevos.append(negocio)
+            resultados.append(Resultado(sugerencia, CREADO, negocio, ''))
+        else:
+            negocio.description = sugerencia.comentarios or ''
+            if negocio.address_text != sugerencia.ubicacion_texto:
+                negocio.address_text = sugerencia.ubicacion_texto
+                negocio.departamento_id = sugerencia.departamento_id
+            if sugerencia.categoria_relacionada_id:
+                negocio.categoria_relacionada_id = sugerencia.categoria_relacionada_id
+            if negocio.pk:
+                cambiados[negocio.pk] = negocio
+            detalle = '' if negocio.name == sugerencia.nombre_negocio else f"posible duplicado de {negocio.name}"
+            resultados.append(Resultado(sugerencia, ACTUALIZADO, negocio, detalle))
+        if sugerencia.foto_aprobada and sugerencia.foto_referencia:
+            fotos[id(negocio)] = (negocio, sugerencia)
+        negocios[sugerencia.nombre_negocio] = negocio  # la siguiente con ese nombre va al mismo negocio
+        aprobadas.append(sugerencia.pk)
+
+    if not aprobadas:
+        return resultados
+
+    # Se geocodifica lo nuevo, lo que cambió de dirección y lo que nunca tuvo coordenadas.
+    por_geocodificar = nuevos + [n for n in cambiados.values()
+                                 if n.address_text != direcciones[n.pk] or n.latitud is None]
+    asignar_coordenadas(por_geocodificar, geocodificador)
+
+    ahora = timezone.now()
+    for negocio in cambiados.values():
+        negocio.updated_at = ahora
+    with transaction.atomic():
+        for negocio, sugerencia in fotos.values():
+            negocio.foto_principal = almacenamiento.compartir(sugerencia.foto_referencia)
+        Negocio.objects.bulk_create(nuevos, batch_size=LOTE)
+        Negocio.objects.bulk_update(list(cambiados.values()), CAMPOS_ACTUALIZADOS, batch_size=LOTE)
+        SugerenciaNegocio.objects.filter(pk__in=aprobadas).update(estado='approved')
+        busqueda.reindexar_queryset(Negocio.objects.filter(pk__in=[n.pk for n in nuevos] + list(cambiados)))
+
+    # bulk_create/bulk_update no disparan señales
+    fragmentos.invalidar(Negocio)
+    ranking.invalidar_top()
+    autocompletado.invalidar()
+    duplicados.invalidar()
+    invalidar_mapa()
+    invalidar_lista_departamentos()
+    return resultados
+
+
+def aprobar_fotos(sugerencias):
+    """Aprueba la foto de cada sugerencia y la pone como foto principal de su negocio."""
+    sugerencias = list(sugerencias)
+    resultados = []
+    negocios, por_pk = _negocios_de(sugerencias)
+    cambiados, aprobadas = {}, []
+
+    for sugerencia in sugerencias:
+        if not sugerencia.foto_referencia:
+            resultados.append(Resultado(sugerencia, OMITIDA, None, "no tiene foto"))
+            continue
+        if sugerencia.foto_aprobada:
+            resultados.append(Resultado(sugerencia, OMITIDA, None, "la foto ya estaba aprobada"))
+            continue
+        aprobadas.append(sugerencia.pk)
+        negocio = negocios.get(sugerencia.nombre_negocio) or por_pk.get(sugerencia.duplicado_de_id)
+        if negocio is None:
+            resultados.append(Resultado(sugerencia, APROBADA, None, "no hay negocio con ese nombre"))
+            continue
+        cambiados[negocio.pk] = (negocio, sugerencia)
+        resultados.append(Resultado(sugerencia, VINCULADA, negocio, ''))
+
+    if not aprobadas:
+        return resultados
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        for negocio, sugerencia in cambiados.values():
+            negocio.foto_principal = almacenamiento.compartir(sugerencia.foto_referencia)
+            negocio.updated_at = ahora
+        SugerenciaNegocio.objects.filter(pk__in=aprobadas).update(foto_aprobada=True)
+        Negocio.objects.bulk_update([negocio for negocio, _ in cambiados.values()], ['foto_principal', 'updated_at'],
+                                    batch_size=LOTE)
+    if cambiados:
+        fragmentos.invalidar(Negocio)
+    return resultados
+
+
+def resumen(resultados):
+    """{estado: cantidad} para el mensaje del admin."""
+    cuenta = {}
+    for resultado in resultados:
+        cuenta[resultado.estado] = cuenta.get(resultado.estado, 0) + 1
+    return cuenta
@@ -0,0 +1,14 @@
+from django import template
+
+from locales import avatares
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar_iniciales(nombre, fondo='B85C38', color='ffffff', tamano=120, formato='svg'):
+    """URL del avatar con iniciales, servido por el propio sitio.
+
+    Uso: <img src="{% avatar_iniciales perfil.usuario.username 'B85C38' 'ffffff' 120 %}">
+    """
+    return avatares.url(nombre, fondo, color, int(tamano), formato)
@@ -0,0 +1,22 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from locales import estaticos
+
+register = template.Library()
+
+
+@register.simple_tag
+def paquete(nombre):
+    """<link> o <script> de un paquete de locales/estaticos.py.
+
+    Uso: {% paquete 'base.css' %}
+    Con los paquetes construidos (collectstatic) enlaza el archivo unido y con
+    hash; en desarrollo, cada archivo fuente por separado.
+    """
+    if nombre.endswith('.css'):
+        plantilla = '<link rel="stylesheet" href="{}">'
+    else:
+        plantilla = '<script src="{}"></script>'
+    return format_html_join('\n', plantilla, ((static(ruta),) for ruta in estaticos.archivos_de(nombre)))
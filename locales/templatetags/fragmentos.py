@@ -0,0 +1,37 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from locales import fragmentos
+
+register = template.Library()
+
+
+class NodoFragmento(template.Node):
+    def __init__(self, nodelist, nombre, variaciones):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.variaciones = variaciones
+
+    def render(self, context):
+        nombre = self.nombre.resolve(context)
+        variaciones = [variacion.resolve(context) for variacion in self.variaciones]
+        return mark_safe(fragmentos.obtener(nombre, variaciones, lambda: self.nodelist.render(context)))
+
+
+@register.tag
+def fragmento(parser, token):
+    """Guarda en caché lo que hay hasta {% endfragmento %}.
+
+    Uso: {% fragmento 'lista_negocios' categoria_actual_slug departamento_actual %}
+    El nombre debe estar en locales.fragmentos.FRAGMENTOS, que dice de qué modelos
+    depende; el resto de argumentos distinguen variantes (filtros, página…).
+    A diferencia de {% cache %}, se invalida al cambiar esos modelos y cuenta
+    aciertos y fallos.
+    """
+    partes = token.split_contents()
+    if len(partes) < 2:
+        raise template.TemplateSyntaxError("'fragmento' necesita al menos el nombre del fragmento.")
+    nodelist = parser.parse(('endfragmento',))
+    parser.delete_first_token()
+    return NodoFragmento(nodelist, parser.compile_filter(partes[1]),
+                         [parser.compile_filter(parte) for parte in partes[2:]])
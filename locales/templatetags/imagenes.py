@@ -0,0 +1,35 @@
+from django import template
+from django.utils.html import format_html
+
+from locales import imagenes
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsiva(campo, tamano, alt='', clase=''):
+    """<picture> con srcset en WebP y JPEG para un ImageField.
+
+    Uso: {% imagen_responsiva negocio.foto_principal 'tarjeta' alt=negocio.name clase='foto' %}
+    Si no se pueden generar derivados, se muestra el original tal cual.
+    """
+    if not campo:
+        return ''
+    _, sizes = imagenes.TAMANOS[tamano]
+    srcset_webp, _ = imagenes.srcset(campo, tamano, 'webp')
+    srcset_jpeg, url_menor = imagenes.srcset(campo, tamano, 'jpeg')
+    if not srcset_jpeg:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', campo.url, alt, clase)
+    fuente_webp = ''
+    if srcset_webp:
+        fuente_webp = format_html('<source type="image/webp" srcset="{}" sizes="{}">', srcset_webp, sizes)
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        fuente_webp, url_menor, srcset_jpeg, sizes, alt, clase,
+    )
+
+
+@register.simple_tag
+def url_imagen(campo, ancho, formato='webp'):
+    """URL de una sola versión reducida, para usos sin srcset (p. ej. background-image)."""
+    return imagenes.url_derivado(campo, int(ancho), formato)
@@ -1,3 +1,1333 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageFile
+
+from eventos.models import EventoCultural
+from .models import (ArchivoContenido, Calificacion, Categoria, Comentario, Departamento, Negocio, PerfilUsuario,
+                     Receta, Relato, SaberPopular, SugerenciaNegocio, UbicacionGeocodificada)
+from .forms import ReclamoNegocioForm
+from .paginacion import pagina_por_cursor
+from . import (almacenamiento, autocompletado, avatares, basedatos, busqueda, consultas, departamentos, duplicados,
+               fragmentos, geocodificacion, imagenes, metricas, perfilado, ranking, subidas, sugerencias, versiones)
+from .planes import consultas_ejecutadas, explicar, tablas_recorridas
+
+
+class ArchivosTemporalesMixin:
+    # Lo que las pruebas guardan en MEDIA_ROOT y el registro de consultas van a una
+    # carpeta temporal, no a media/ ni a logs/ del proyecto.
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=os.path.join(directorio.name, 'media'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.registro = os.path.join(directorio.name, 'logs', 'consultas.log')
+        manejador = consultas.ArchivoRotativo(self.registro, delay=True, encoding='utf-8')
+        self.addCleanup(manejador.close)
+        parche = mock.patch.object(consultas.logger, 'handlers', [manejador])
+        parche.start()
+        self.addCleanup(parche.stop)
+
+
+class VersionesCompartidasMixin:
+    """La caché 'versiones' en archivos de una carpeta temporal, como en el servidor real.
+
+    `otro_proceso()` abre la misma carpeta por separado: lo que suba ahí es lo que
+    vería un worker de gunicorn que no hizo el cambio.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.carpeta_versiones = directorio.name
+        ajustes = override_settings(CACHES={**settings.CACHES, 'versiones': {
+            'BACKEND': 'locales.versiones.CacheArchivos', 'LOCATION': directorio.name}})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def otro_proceso(self):
+        return versiones.CacheArchivos(self.carpeta_versiones, {})
+
+
+class PlanesDeConsultaMixin:
+    """Falla si alguna consulta de una página recorre completa una de las tablas vigiladas."""
+
+    def assertSinRecorridos(self, url, tablas):
+        for alias in caches:
+            caches[alias].clear()  # sin fragmentos ni listas cacheadas: que se ejecuten las consultas
+        with consultas_ejecutadas() as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(consultas)
+        for sql, parametros in consultas:
+            plan = explicar(sql, parametros)
+            recorridas = set(tablas_recorridas(plan)) & set(tablas)
+            self.assertFalse(recorridas, f'{url}: recorrido completo de {recorridas}\n{sql}\n' + '\n'.join(plan))
+
+
+class PlanesDeConsultaTests(PlanesDeConsultaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('lectora', password='x')
+        cls.categoria, _ = Categoria.objects.get_or_create(slug='turismo', defaults={'nombre': 'Turismo'})
+        comida, _ = Categoria.objects.get_or_create(slug='comida', defaults={'nombre': 'Comida'})
+        cls.departamento, _ = Departamento.objects.get_or_create(slug='leon', defaults={'nombre': 'León'})
+        cls.negocio = Negocio.objects.create(name='Hostal', description='d', address_text='León',
+                                             categoria_relacionada=cls.categoria, departamento=cls.departamento,
+                                             is_turismo=True, paquetes_turismo='Volcán')
+        Negocio.objects.create(name='Fritanga', description='d', address_text='León', categoria_relacionada=comida)
+        for i in range(3):
+            Comentario.objects.create(negocio=cls.negocio, usuario=cls.usuario, texto=f'comentario {i}')
+            Relato.objects.create(title=f'Relato {i}', content='c', author=cls.usuario,
+                                  status='approved' if i else 'pending')
+            Receta.objects.create(titulo=f'Receta {i}', ingredientes='maíz', pasos='p', autor=cls.usuario,
+                                  estado='approved' if i else 'pending')
+            SaberPopular.objects.create(titulo=f'Saber {i}', contenido='c', autor=cls.usuario,
+                                        estado='approved' if i else 'pending')
+            SugerenciaNegocio.objects.create(nombre_negocio=f'Sugerencia {i}', ubicacion_texto='Masaya',
+                                             sugerido_por=cls.usuario, fecha_sugerencia=timezone.now())
+
+    def test_inicio_relatos_aprobados(self):
+        self.assertSinRecorridos(reverse('home_view'), ['locales_relato'])
+
+    def test_biblioteca(self):
+        url = reverse('biblioteca_view')
+        self.assertSinRecorridos(url, ['locales_receta', 'locales_saberpopular'])
+        self.assertSinRecorridos(url + '?page_recetas=2&page_saberes=2', ['locales_receta', 'locales_saberpopular'])
+
+    def test_lista_negocios_filtrada(self):
+        self.assertSinRecorridos(reverse('lista_negocios') + '?categoria=comida', ['locales_negocio'])
+        self.assertSinRecorridos(reverse('lista_negocios') + '?departamento=leon', ['locales_negocio'])
+
+    def test_plan_turismo(self):
+        self.assertSinRecorridos(reverse('plan_turismo'), ['locales_negocio'])
+
+    def test_detalle_y_comentarios_de_negocio(self):
+        self.assertSinRecorridos(reverse('detalle_negocio', args=[self.negocio.pk]),
+                                 ['locales_negocio', 'locales_comentario', 'locales_calificacion'])
+        self.assertSinRecorridos(reverse('comentarios_negocio', args=[self.negocio.pk]),
+                                 ['locales_comentario', 'locales_calificacion'])
+        self.assertSinRecorridos(reverse('detalle_paquetes_turismo', args=[self.negocio.pk]), ['locales_negocio'])
+
+    def test_sugerencias_pendientes_en_admin(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.assertSinRecorridos(reverse('admin:locales_sugerencianegocio_changelist') + '?estado__exact=pending',
+                                 ['locales_sugerencianegocio'])
+
+
+class MedirConsultasTests(ArchivosTemporalesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [User.objects.create_user(f'usuario{i}') for i in range(4)]
+
+    def setUp(self):
+        super().setUp()
+        consultas.reiniciar()
+
+    def test_detecta_consultas_repetidas(self):
+        medicion = consultas.Medicion()
+        with connection.execute_wrapper(medicion):
+            for usuario in User.objects.filter(pk__in=[u.pk for u in self.usuarios]):
+                User.objects.get(pk=usuario.pk)  # una consulta por fila: N+1
+        self.assertEqual(medicion.consultas, 1 + len(self.usuarios))
+        (sql, veces), = medicion.repetidas().items()
+        self.assertEqual(veces, len(self.usuarios))
+        self.assertIn('"auth_user"."id" = %s', sql)
+
+    def test_listas_in_de_distinto_largo_tienen_la_misma_huella(self):
+        self.assertEqual(consultas.huella('SELECT 1 WHERE id IN (%s, %s)'), consultas.huella('SELECT 1 WHERE id IN (%s)'))
+
+    @mock.patch.object(consultas, 'MEDIR', True)
+    def test_cabeceras_y_resumen_por_url(self):
+        respuesta = self.client.get(reverse('biblioteca_view'))
+        self.assertGreater(int(respuesta['X-Consultas']), 0)
+        self.assertEqual(respuesta['X-Consultas-Repetidas'], '0')
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        self.assertEqual([fila['url'] for fila in consultas.resumen()], ['biblioteca_view'])
+        with open(self.registro, encoding='utf-8') as registro:
+            self.assertIn('GET /biblioteca/', registro.read())
+
+    def test_resumen_solo_para_administradores(self):
+        self.client.force_login(self.usuarios[0])
+        self.assertEqual(self.client.get(reverse('resumen_consultas')).status_code, 302)
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        self.assertEqual(self.client.get(reverse('resumen_consultas')).status_code, 200)
+
+
+class PerfiladoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('curiosa', password='x')
+        cls.staff = User.objects.create_superuser('admin', password='x')
+        Receta.objects.create(titulo='Vigorón', ingredientes='yuca', pasos='Servir', autor=cls.usuario,
+                              estado='approved')
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        parche = mock.patch.object(perfilado, 'DIRECTORIO', directorio.name)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_sin_pedirlo_no_se_perfila(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('biblioteca_view'))
+        self.assertNotIn('X-Perfil', respuesta)
+        self.assertEqual(perfilado.listar(), [])
+
+    def test_solo_staff_puede_perfilar(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('biblioteca_view') + '?perfilar=1')
+        self.assertNotIn('X-Perfil', respuesta)
+        self.assertEqual(perfilado.listar(), [])
+
+    def test_perfil_de_una_peticion(self):
+        self.client.force_login(self.staff)
+        respuesta = self.client.get(reverse('biblioteca_view'), HTTP_X_PERFILAR='1')
+        self.assertEqual(respuesta.status_code, 200)
+        (perfil,) = perfilado.listar()
+        self.assertEqual(respuesta['X-Perfil'], perfil['nombre'])
+        self.assertIn('plantillas;dur=', respuesta['Server-Timing'])
+        self.assertEqual(perfil['url'], 'biblioteca_view')
+        self.assertGreater(perfil['consultas'], 0)
+        self.assertGreater(perfil['plantillas_ms'], 0)
+        self.assertIn('biblioteca_view', perfil['funciones'])
+
+        lista = self.client.get(reverse('lista_perfiles'))
+        self.assertContains(lista, perfil['nombre'])
+        descarga = self.client.get(reverse('lista_perfiles'), {'descargar': perfil['nombre'], 'formato': 'json'})
+        self.assertEqual(json.loads(b''.join(descarga.streaming_content))['nombre'], perfil['nombre'])
+        descarga.close()
+        fuera = self.client.get(reverse('lista_perfiles'), {'descargar': '../db', 'formato': 'sqlite3'})
+        self.assertEqual(fuera.status_code, 404)
+
+    def test_muestreador_pliega_pilas(self):
+        muestreador = perfilado.Muestreador(threading.get_ident(), 0.001)
+        muestreador.start()
+        fin = time.perf_counter() + 0.05
+        while time.perf_counter() < fin:
+            pass
+        muestreador.parar()
+        pila, veces = muestreador.plegado().splitlines()[0].rsplit(' ', 1)
+        self.assertIn('test_muestreador_pliega_pilas', pila)
+        self.assertGreater(int(veces), 0)
+
+    @mock.patch.object(perfilado, 'MAXIMO', 2)
+    def test_se_conservan_los_mas_recientes(self):
+        self.client.force_login(self.staff)
+        nombres = [self.client.get(reverse('juego_view') + '?perfilar=1')['X-Perfil'] for _ in range(3)]
+        self.assertEqual(len(set(nombres)), 3)
+        self.assertEqual(len(os.listdir(perfilado.DIRECTORIO)), 2 * len(perfilado.FORMATOS))
+        self.assertNotIn(nombres[0], [perfil['nombre'] for perfil in perfilado.listar()])
+
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = User.objects.create_user('cocinera', password='x')
+        Receta.objects.create(titulo='Vigorón', ingredientes='yuca', pasos='Servir', autor=autor, estado='approved')
+
+    def setUp(self):
+        metricas.reiniciar()
+        for alias in caches:
+            caches[alias].clear()
+
+    def _lineas(self):
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return respuesta.content.decode().splitlines()
+
+    def test_peticiones_e_histogramas_por_url(self):
+        for _ in range(2):
+            self.client.get(reverse('biblioteca_view'))
+        self.client.get('/no-existe/')
+        lineas = self._lineas()
+        self.assertIn('memoria_peticiones_total{url="biblioteca_view",metodo="GET",estado="200"} 2', lineas)
+        self.assertIn('memoria_peticiones_total{url="sin_ruta",metodo="GET",estado="404"} 1', lineas)
+        self.assertIn('# TYPE memoria_peticion_segundos histogram', lineas)
+        self.assertIn('memoria_peticion_segundos_bucket{url="biblioteca_view",le="+Inf"} 2', lineas)
+        self.assertIn('memoria_peticion_segundos_count{url="biblioteca_view"} 2', lineas)
+        cubetas = [int(linea.rsplit(' ', 1)[1]) for linea in lineas
+                   if linea.startswith('memoria_plantillas_segundos_bucket{url="biblioteca_view"')]
+        self.assertEqual(len(cubetas), len(metricas.CUBETAS) + 1)
+        self.assertEqual(cubetas, sorted(cubetas))
+        suma = next(linea for linea in lineas if linea.startswith('memoria_plantillas_segundos_sum{url="biblioteca_view"}'))
+        self.assertGreater(float(suma.rsplit(' ', 1)[1]), 0)
+        self.assertTrue(any(linea.startswith('memoria_bd_consultas_total{url="biblioteca_view"}') for linea in lineas))
+
+    def test_aciertos_y_fallos_de_cache(self):
+        for _ in range(3):
+            self.client.get(reverse('biblioteca_view'))
+        lineas = self._lineas()
+        self.assertIn('memoria_cache_total{cache="fragmentos:biblioteca_recetas",resultado="fallo"} 1', lineas)
+        self.assertIn('memoria_cache_total{cache="fragmentos:biblioteca_recetas",resultado="acierto"} 2', lineas)
+
+    def test_solo_ips_permitidas(self):
+        self.assertEqual(self.client.get(reverse('metricas'), REMOTE_ADDR='10.1.2.3').status_code, 403)
+
+    def test_suma_los_archivos_de_varios_procesos(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        with mock.patch.object(metricas, 'DIRECTORIO', directorio.name):
+            otro = metricas._a_json({('peticiones_total', (('url', 'home_view'), ('metodo', 'GET'),
+                                                           ('estado', '200'))): 5}, {})
+            with open(os.path.join(directorio.name, 'metricas-1.json'), 'w') as archivo:
+                json.dump(otro, archivo)
+            self.client.get(reverse('home_view'))
+            lineas = self._lineas()
+            self.assertIn(f'metricas-{os.getpid()}.json', os.listdir(directorio.name))
+        self.assertIn('memoria_peticiones_total{url="home_view",metodo="GET",estado="200"} 6', lineas)
+
+    def test_sin_cerrojos_cada_hilo_suma_en_su_fragmento(self):
+        def sumar():
+            for _ in range(1000):
+                metricas.sumar('cache_total', (('cache', 'prueba'), ('resultado', 'acierto')))
+        hilos = [threading.Thread(target=sumar) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        contadores, _ = metricas.instantanea()
+        self.assertEqual(contadores[('cache_total', (('cache', 'prueba'), ('resultado', 'acierto')))], 4000)
+
+
+class AprobacionSugerenciasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('sugiere', password='x')
+        cls.staff = User.objects.create_superuser('admin', password='x')
+        cls.categoria, _ = Categoria.objects.get_or_create(slug='comida', defaults={'nombre': 'Comida'})
+        cls.existente = Negocio.objects.create(name='Fritanga Doña Tere', description='Vieja', address_text='Granada',
+                                               created_by=cls.usuario)
+
+    def _sugerir(self, nombre, **campos):
+        campos.setdefault('ubicacion_texto', 'Calle Real, León')
+        return SugerenciaNegocio.objects.create(nombre_negocio=nombre, sugerido_por=self.usuario, **campos)
+
+    def _consultas(self, cantidad):
+        pendientes = [self._sugerir(f'Comedor {cantidad}-{i}', comentarios='Sopa') for i in range(cantidad)]
+        medicion = consultas.Medicion()
+        with connection.execute_wrapper(medicion):
+            resultados = sugerencias.aprobar_sugerencias(SugerenciaNegocio.objects.filter(pk__in=[s.pk for s in pendientes]))
+        self.assertEqual({r.estado for r in resultados}, {sugerencias.CREADO})
+        return medicion.consultas
+
+    def test_resultado_por_fila(self):
+        nueva = self._sugerir('Cafetería El Sol', comentarios='Café de Jinotega', categoria_relacionada=self.categoria)
+        repetida = self._sugerir('Cafetería El Sol', comentarios='Abre temprano')
+        actualiza = self._sugerir('Fritanga Doña Tere', ubicacion_texto='Masaya', categoria_relacionada=self.categoria)
+        aprobada = self._sugerir('Ya aprobada', estado='approved')
+        sin_nombre = self._sugerir('  ')
+        resultados = sugerencias.aprobar_sugerencias(SugerenciaNegocio.objects.order_by('pk'))
+        estados = {r.sugerencia.pk: r.estado for r in resultados}
+        self.assertEqual(estados, {nueva.pk: sugerencias.CREADO, repetida.pk: sugerencias.ACTUALIZADO,
+                                   actualiza.pk: sugerencias.ACTUALIZADO, aprobada.pk: sugerencias.OMITIDA,
+                                   sin_nombre.pk: sugerencias.ERROR})
+
+        creado = Negocio.objects.get(name='Cafetería El Sol')
+        self.assertEqual(creado.description, 'Abre temprano')  # la última sugerencia con ese nombre manda
+        self.assertEqual(creado.categoria_relacionada, self.categoria)
+        self.assertEqual(creado.departamento.nombre, 'León')
+        self.assertIsNotNone(creado.latitud)
+        self.assertGreater(creado.puntuacion_ranking, 0)
+        self.assertEqual(busqueda.buscar('cafetería').count(), 1)
+
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.address_text, self.existente.description), ('Masaya', ''))
+        self.assertEqual(self.existente.departamento.nombre, 'Masaya')
+        self.assertEqual(self.existente.categoria_relacionada, self.categoria)
+        self.assertEqual(SugerenciaNegocio.objects.filter(estado='approved').count(), 4)
+        self.assertEqual(SugerenciaNegocio.objects.get(pk=sin_nombre.pk).estado, 'pending')
+
+    def test_consultas_no_dependen_del_numero_de_sugerencias(self):
+        self._consultas(1)  # guarda la dirección en la caché del geocodificador
+        self.assertEqual(self._consultas(3), self._consultas(30))
+
+    def test_aprobar_fotos(self):
+        con_negocio = self._sugerir('Fritanga Doña Tere', foto_referencia='sugerencias_fotos/tere.jpg')
+        sin_negocio = self._sugerir('Nuevo', foto_referencia='sugerencias_fotos/nuevo.jpg')
+        sin_foto = self._sugerir('Sin foto')
+        resultados = sugerencias.aprobar_fotos([con_negocio, sin_negocio, sin_foto])
+        self.assertEqual([r.estado for r in resultados],
+                         [sugerencias.VINCULADA, sugerencias.APROBADA, sugerencias.OMITIDA])
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.foto_principal.name, 'sugerencias_fotos/tere.jpg')
+        self.assertEqual(set(SugerenciaNegocio.objects.filter(foto_aprobada=True).values_list('pk', flat=True)),
+                         {con_negocio.pk, sin_negocio.pk})
+
+    def test_accion_del_admin(self):
+        pendientes = [self._sugerir(f'Puesto {i}') for i in range(3)] + [self._sugerir('', estado='pending')]
+        self.client.force_login(self.staff)
+        respuesta = self.client.post(reverse('admin:locales_sugerencianegocio_changelist'), {
+            'action': 'aprobar_sugerencia_y_crear_negocio',
+            '_selected_action': [s.pk for s in pendientes],
+        }, follow=True)
+        mensajes = [str(m) for m in respuesta.context['messages']]
+        self.assertIn('3 negocio(s) creados, 1 con error.', mensajes)
+        self.assertIn('La sugerencia no tiene nombre: #%d.' % pendientes[-1].pk, mensajes)
+        self.assertEqual(Negocio.objects.filter(name__startswith='Puesto').count(), 3)
+
+
+class DuplicadosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('sugiere', password='x')
+        cls.staff = User.objects.create_superuser('admin', password='x')
+        cls.categoria, _ = Categoria.objects.get_or_create(slug='comida', defaults={'nombre': 'Comida'})
+        cls.tita = Negocio.objects.create(name='Fritanga Doña Tita', address_text='Calle Real, León',
+                                          created_by=cls.usuario)
+        # Un directorio con muchas palabras repetidas: "Fritanga Doña Rosa", "Hotel Doña Rosa"...
+        tipos = ('Fritanga', 'Comedor', 'Hotel', 'Cafetería', 'Pulpería', 'Taller', 'Farmacia', 'Panadería',
+                 'Ferretería', 'Hostal', 'Bar', 'Restaurante', 'Tienda', 'Sorbetería', 'Asadero')
+        nombres = ('La Esquina', 'El Buen Sabor', 'Don Pepe', 'Mi Tierra', 'La Económica', 'Doña Rosa',
+                   'El Güegüense', 'Las Brisas', 'Doña Carmen', 'El Sol', 'Los Pinos', 'Doña Juana')
+        Negocio.objects.bulk_create(Negocio(name=f'{tipo} {nombre}', address_text='Managua', created_by=cls.usuario)
+                                    for tipo in tipos for nombre in nombres)
+
+    def setUp(self):
+        duplicados.invalidar()
+
+    def test_encuentra_nombres_escritos_distinto(self):
+        encontrados = duplicados.candidatos('Fritanga Dona Tita, León')
+        self.assertEqual([c.negocio_id for c in encontrados], [self.tita.pk])
+        self.assertGreater(encontrados[0].similitud, 0.8)
+
+    def test_palabras_comunes_no_bastan(self):
+        # "Fritanga" y "Doña" están en muchos negocios; "Tere" y "Tita" no se parecen
+        self.assertEqual(duplicados.candidatos('Fritanga Doña Tere'), [])
+        self.assertEqual(duplicados.candidatos('Hotel Doña Tita'), [])
+
+    def test_senales_mantienen_el_indice(self):
+        duplicados.obtener_indice()
+        self.tita.name = 'Comedor Los Almendros'
+        self.tita.save()
+        self.assertEqual(duplicados.candidatos('Fritanga Doña Tita'), [])
+        self.assertEqual([c.negocio_id for c in duplicados.candidatos('Comedor Almendros')], [self.tita.pk])
+        self.tita.delete()
+        self.assertEqual(duplicados.candidatos('Comedor Los Almendros'), [])
+
+    def test_sugerir_marca_el_duplicado(self):
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(reverse('sugerir_negocio_view'), {
+            'nombre_negocio': 'Fritanga Dona Tita', 'ubicacion_texto': 'León',
+            'categoria_relacionada': self.categoria.pk,
+        }, follow=True)
+        sugerencia = SugerenciaNegocio.objects.get()
+        self.assertEqual(sugerencia.duplicado_de, self.tita)
+        self.assertGreater(sugerencia.similitud_duplicado, 0.6)
+        self.assertIn('Ya tenemos un negocio parecido: Fritanga Doña Tita',
+                      ' '.join(str(m) for m in respuesta.context['messages']))
+
+    def test_aprobar_actualiza_el_duplicado(self):
+        sugerencia = SugerenciaNegocio(nombre_negocio='Fritanga Dona Tita', ubicacion_texto='Calle Real, León',
+                                       comentarios='Abre de noche', sugerido_por=self.usuario)
+        duplicados.marcar(sugerencia)
+        sugerencia.save()
+        [resultado] = sugerencias.aprobar_sugerencias([sugerencia])
+        self.assertEqual((resultado.estado, resultado.negocio), (sugerencias.ACTUALIZADO, self.tita))
+        self.assertEqual(resultado.detalle, 'posible duplicado de Fritanga Doña Tita')
+        self.assertFalse(Negocio.objects.filter(name='Fritanga Dona Tita').exists())
+        self.tita.refresh_from_db()
+        self.assertEqual(self.tita.description, 'Abre de noche')
+
+    def test_admin_muestra_duplicado_y_parecidos(self):
+        sugerencia = SugerenciaNegocio(nombre_negocio='Fritanga Dona Tita', ubicacion_texto='León',
+                                       sugerido_por=self.usuario)
+        duplicados.marcar(sugerencia)
+        sugerencia.save()
+        self.client.force_login(self.staff)
+        enlace = reverse('admin:locales_negocio_change', args=[self.tita.pk])
+        lista = self.client.get(reverse('admin:locales_sugerencianegocio_changelist'), {'duplicado_de__isempty': '0'})
+        self.assertContains(lista, enlace)
+        detalle = self.client.get(reverse('admin:locales_sugerencianegocio_change', args=[sugerencia.pk]))
+        self.assertContains(detalle, 'Negocios parecidos')
+        self.assertContains(detalle, enlace)
+
+
+class DuplicadosVersionCompartidaTests(VersionesCompartidasMixin, TestCase):
+    def test_cambios_de_otro_proceso(self):
+        tita = Negocio.objects.create(name='Fritanga Doña Tita', description='', address_text='León')
+        sugerencia = SugerenciaNegocio(nombre_negocio='Fritanga Dona Tita', ubicacion_texto='León')
+        duplicados.marcar(sugerencia)
+        self.assertEqual(sugerencia.duplicado_de, tita)
+        # Otro worker renombra el negocio y da de alta otro: aquí solo llega la versión.
+        Negocio.objects.filter(pk=tita.pk).update(name='Comedor Los Almendros')
+        [nuevo] = Negocio.objects.bulk_create([Negocio(name='Fritanga Doña Tita', description='',
+                                                       address_text='León')])
+        self.otro_proceso().incr('versiones:duplicados')
+        duplicados.marcar(sugerencia)
+        self.assertEqual(sugerencia.duplicado_de, nuevo)
+
+
+class DepartamentosVersionCompartidaTests(VersionesCompartidasMixin, TestCase):
+    def test_lista_tras_cambio_en_otro_proceso(self):
+        Negocio.objects.create(name='Fritanga', description='', address_text='Calle Real, León')
+        self.assertEqual([nombre for _, nombre in departamentos.departamentos_con_negocios()], ['León'])
+        granada = Departamento.objects.get(nombre='Granada')
+        Negocio.objects.bulk_create([Negocio(name='Hostal', description='', address_text='Granada',
+                                             departamento=granada)])
+        self.assertEqual(len(departamentos.departamentos_con_negocios()), 1)  # sigue cacheada aquí
+        self.otro_proceso().incr('versiones:departamentos')
+        self.assertEqual([nombre for _, nombre in departamentos.departamentos_con_negocios()], ['Granada', 'León'])
+
+
+class RankingVersionCompartidaTests(VersionesCompartidasMixin, TestCase):
+    def test_top_y_media_tras_cambios_de_otro_proceso(self):
+        primero, segundo = Negocio.objects.bulk_create([
+            Negocio(name='Fritanga', description='', address_text='León', puntuacion_ranking=4.5,
+                    calificacion_suma=9, calificacion_conteo=2),
+            Negocio(name='Comedor', description='', address_text='León', puntuacion_ranking=3.0,
+                    calificacion_suma=3, calificacion_conteo=1),
+        ])
+        self.assertEqual(ranking.top_negocios(), [primero, segundo])
+        self.assertEqual(ranking.media_global(), 4.0)
+        # Otro worker registra votos (o `recalcular_ranking` corre desde cron).
+        Negocio.objects.filter(pk=segundo.pk).update(puntuacion_ranking=5.0, calificacion_suma=15,
+                                                     calificacion_conteo=3)
+        self.otro_proceso().incr('versiones:ranking_top')
+        self.otro_proceso().incr('versiones:ranking_media')
+        self.assertEqual(ranking.top_negocios(), [segundo, primero])
+        self.assertEqual(ranking.media_global(), 4.8)
+
+
+class AvataresTests(ArchivosTemporalesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('maria_lopez', password='x')
+
+    def _url(self, nombre='maria_lopez', fondo='B85C38', color='ffffff', tamano=150, formato='svg'):
+        return reverse('avatar_iniciales', args=[fondo, color, tamano, f'{nombre}.{formato}'])
+
+    def test_se_guarda_una_vez_y_luego_se_lee_del_disco(self):
+        respuesta = self.client.get(self._url())
+        self.assertEqual(respuesta['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'>ML</text>', respuesta.content)
+        ruta = os.path.join(settings.MEDIA_ROOT, avatares.nombre_archivo('maria_lopez', 'B85C38', 'ffffff', 150, 'svg'))
+        self.assertTrue(os.path.exists(ruta))
+        with self.assertNumQueries(0):
+            otra = self.client.get(self._url())
+        self.assertEqual(otra.content, respuesta.content)
+
+    def test_304_con_el_mismo_etag(self):
+        etag = self.client.get(self._url(formato='png'))['ETag']
+        respuesta = self.client.get(self._url(formato='png'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(self.client.get(self._url(tamano=120), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_claves_rechazadas_no_se_guardan(self):
+        for url in (self._url(nombre='nadie'),  # no es un usuario
+                    self._url(tamano=512),  # tamaño que no usan las plantillas
+                    self._url(fondo='000000'),
+                    self._url(formato='gif')):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, avatares.CARPETA)))
+
+
+class AlmacenamientoTests(ArchivosTemporalesMixin, TestCase):
+    def _cuenta(self, nombre):
+        return ArchivoContenido.objects.get(nombre=nombre).referencias
+
+    def test_mismo_contenido_un_solo_archivo(self):
+        primero = default_storage.save('avatars/a.jpg', ContentFile(b'foto'))
+        segundo = default_storage.save('negocios_fotos/b.JPG', ContentFile(b'foto'))
+        otro = default_storage.save('avatars/c.jpg', ContentFile(b'otra foto'))
+        self.assertEqual(primero, segundo)
+        self.assertTrue(almacenamiento.es_nombre_de_contenido(primero))
+        self.assertNotEqual(primero, otro)
+        self.assertEqual(self._cuenta(primero), 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(default_storage.path(primero)))), 1)
+
+    def test_borrar_descuenta_y_quita_el_ultimo(self):
+        nombre = default_storage.save('avatars/a.jpg', ContentFile(b'foto'))
+        default_storage.save('avatars/b.jpg', ContentFile(b'foto'))
+        default_storage.delete(nombre)
+        self.assertEqual(self._cuenta(nombre), 1)
+        self.assertTrue(default_storage.exists(nombre))
+        default_storage.delete(nombre)
+        self.assertFalse(ArchivoContenido.objects.filter(nombre=nombre).exists())
+        self.assertFalse(default_storage.exists(nombre))
+        # Volver a subirlo lo pone otra vez en disco
+        self.assertEqual(default_storage.save('avatars/c.jpg', ContentFile(b'foto')), nombre)
+        self.assertTrue(default_storage.exists(nombre))
+
+    def test_foto_aprobada_se_comparte_con_el_negocio(self):
+        usuario = User.objects.create_user('fotografa', password='x')
+        sugerencia = SugerenciaNegocio(nombre_negocio='Quesillos El Pipe', ubicacion_texto='Nagarote',
+                                       sugerido_por=usuario, foto_aprobada=True)
+        sugerencia.foto_referencia.save('quesillo.jpg', ContentFile(b'quesillo'))
+        [resultado] = sugerencias.aprobar_sugerencias([sugerencia])
+        nombre = sugerencia.foto_referencia.name
+        self.assertEqual(Negocio.objects.get(pk=resultado.negocio.pk).foto_principal.name, nombre)
+        self.assertEqual(self._cuenta(nombre), 2)
+        sugerencia.foto_referencia.delete()
+        self.assertTrue(default_storage.exists(nombre))  # el negocio aún la usa
+        self.assertEqual(self._cuenta(nombre), 1)
+
+    def test_misma_huella_con_otra_extension(self):
+        jpg = default_storage.save('avatars/a.jpg', ContentFile(b'foto'))
+        jpeg = default_storage.save('avatars/a.jpeg', ContentFile(b'foto'))
+        self.assertNotEqual(jpg, jpeg)
+        self.assertEqual((self._cuenta(jpg), self._cuenta(jpeg)), (1, 1))
+        default_storage.delete(jpeg)
+        self.assertFalse(default_storage.exists(jpeg))
+        self.assertTrue(default_storage.exists(jpg))
+        self.assertEqual(self._cuenta(jpg), 1)
+        default_storage.delete(jpg)
+        self.assertFalse(default_storage.exists(jpg))
+        self.assertFalse(ArchivoContenido.objects.exists())
+
+    def _negocio_con_foto(self, contenido):
+        negocio = Negocio(name='Fritanga', description='', address_text='León')
+        negocio.foto_principal.save('foto.jpg', ContentFile(contenido))
+        return negocio
+
+    def test_borrar_la_fila_suelta_su_archivo(self):
+        negocio = self._negocio_con_foto(b'foto')
+        nombre = negocio.foto_principal.name
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.delete()
+        self.assertFalse(default_storage.exists(nombre))
+        self.assertFalse(ArchivoContenido.objects.exists())
+
+    def test_cambiar_el_archivo_suelta_el_anterior(self):
+        negocio = self._negocio_con_foto(b'foto')
+        anterior = negocio.foto_principal.name
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.foto_principal = SimpleUploadedFile('nueva.jpg', b'foto nueva')
+            negocio.save()
+        self.assertFalse(default_storage.exists(anterior))
+        self.assertEqual(self._cuenta(negocio.foto_principal.name), 1)
+        # Subir otra vez el mismo contenido al mismo campo no suma referencias.
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.foto_principal = SimpleUploadedFile('otra.jpg', b'foto nueva')
+            negocio.save()
+        self.assertEqual(self._cuenta(negocio.foto_principal.name), 1)
+        # Vaciar el campo (el "borrar" de un formulario) también lo suelta.
+        nombre = negocio.foto_principal.name
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.foto_principal = ''
+            negocio.save()
+        self.assertFalse(default_storage.exists(nombre))
+
+    def test_fieldfile_delete_descuenta_una_vez(self):
+        primero = self._negocio_con_foto(b'foto')
+        segundo = self._negocio_con_foto(b'foto')
+        nombre = primero.foto_principal.name
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.foto_principal.delete()
+        self.assertEqual(self._cuenta(nombre), 1)
+        self.assertEqual(segundo.foto_principal.name, nombre)
+        self.assertTrue(default_storage.exists(nombre))
+
+    def test_sin_commit_no_se_suelta(self):
+        negocio = self._negocio_con_foto(b'foto')
+        nombre = negocio.foto_principal.name
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                negocio.delete()
+                raise RuntimeError
+        self.assertEqual(self._cuenta(nombre), 1)
+        self.assertTrue(default_storage.exists(nombre))
+
+    def test_nombres_antiguos_se_quedan(self):
+        antiguo = FileSystemStorage().save('avatares/default_avatar.png', ContentFile(b'avatar'))
+        usuario = User.objects.create_user('visitante', password='x')
+        self.assertEqual(usuario.perfilusuario.avatar.name, antiguo)
+        with self.captureOnCommitCallbacks(execute=True):
+            usuario.delete()
+        self.assertTrue(default_storage.exists(antiguo))
+
+    def test_compartir_nombre_antiguo(self):
+        antiguo = FileSystemStorage().save('sugerencias_fotos/vieja.jpg', ContentFile(b'vieja'))
+        nombre = default_storage.compartir(antiguo)
+        self.assertTrue(almacenamiento.es_nombre_de_contenido(nombre))
+        self.assertEqual(self._cuenta(nombre), 1)
+        self.assertTrue(default_storage.exists(antiguo))
+
+
+class CalificacionesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuarios = [User.objects.create_user(f'votante{i}', password='x') for i in range(4)]
+        cls.negocio = Negocio.objects.create(name='Fritanga Doña Tere', address_text='Granada')
+        cls.otro = Negocio.objects.create(name='Comedor La Ceiba', address_text='Granada')
+
+    def _comprobar(self, *negocios):
+        # Los agregados guardados deben ser los que da una consulta desde cero.
+        for negocio in negocios or (self.negocio, self.otro):
+            negocio.refresh_from_db()
+            votos = Calificacion.objects.filter(negocio=negocio)
+            real = votos.aggregate(promedio=Avg('puntuacion'), conteo=Count('id'), suma=Sum('puntuacion'))
+            self.assertEqual(negocio.calificacion_conteo, real['conteo'])
+            self.assertEqual(negocio.calificacion_suma, real['suma'] or 0)
+            self.assertAlmostEqual(float(negocio.calificacion_promedio), round(real['promedio'] or 0, 2))
+            self.assertEqual(dict(negocio.histograma_votos()),
+                             {p: votos.filter(puntuacion=p).count() for p in range(1, 6)})
+
+    def _votar(self, usuario, puntuacion, negocio=None):
+        return Calificacion.objects.create(negocio=negocio or self.negocio, usuario=usuario, puntuacion=puntuacion)
+
+    def test_alta_cambio_y_borrado(self):
+        votos = [self._votar(usuario, p) for usuario, p in zip(self.usuarios, (5, 4, 4, 1))]
+        self._comprobar()
+        votos[3].puntuacion = 3  # vuelve a votar
+        votos[3].save()
+        self._comprobar()
+        votos[3].save()  # sin cambios: no cuenta dos veces
+        self._comprobar()
+        votos[2].negocio = self.otro
+        votos[2].save()
+        self._comprobar()
+        votos[0].delete()
+        self._comprobar()
+        Calificacion.objects.filter(puntuacion=3).delete()
+        self._comprobar()
+        self.usuarios[1].delete()  # en cascada
+        self._comprobar()
+        self.negocio.refresh_from_db()
+        self.assertEqual((self.negocio.calificacion_conteo, self.negocio.calificacion_promedio), (0, 0))
+
+    def test_comando_corrige_desviaciones(self):
+        for usuario, p in zip(self.usuarios, (5, 2, 3)):
+            self._votar(usuario, p)
+        self._votar(self.usuarios[0], 4, self.otro)
+        Negocio.objects.update(calificacion_suma=99, calificacion_conteo=1, calificacion_promedio=1, votos_5=7,
+                               votos_1=3)
+        salida = StringIO()
+        call_command('recalcular_calificaciones', stdout=salida)
+        self.assertIn('2 negocio(s)', salida.getvalue())
+        self._comprobar()
+
+
+def imagen(formato='JPEG', tamano=(40, 30), **opciones):
+    salida = BytesIO()
+    Image.new('RGB', tamano, '#B85C38').save(salida, format=formato, **opciones)
+    return salida.getvalue()
+
+
+class SubidasTests(ArchivosTemporalesMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('subidora', password='x')
+        cls.categoria, _ = Categoria.objects.get_or_create(slug='comida', defaults={'nombre': 'Comida'})
+        cls.negocio = Negocio.objects.create(name='Hostal La Calzada', address_text='Granada')
+
+    def test_archivo_demasiado_grande_se_descarta(self):
+        manejador = subidas.ManejadorSubidaLimitada()
+        manejador.new_file('foto_referencia', 'grande.jpg', 'image/jpeg', 1600)
+        temporal = manejador.file.temporary_file_path()
+        with mock.patch.object(subidas, 'TAMANO_MAXIMO', 1000):
+            manejador.receive_data_chunk(b'x' * 800, 0)
+            manejador.receive_data_chunk(b'x' * 800, 800)
+        self.assertFalse(os.path.exists(temporal))
+        rechazado = manejador.file_complete(1600)
+        self.assertIsInstance(rechazado, subidas.ArchivoRechazado)
+        with self.assertRaisesMessage(ValidationError, 'supera el máximo'):
+            subidas.ImagenSubidaField().clean(rechazado)
+
+    @mock.patch.object(subidas, 'TAMANO_MAXIMO', 1024)
+    def test_archivo_demasiado_grande_en_el_formulario(self):
+        self.client.force_login(self.usuario)
+        with mock.patch('builtins.print'):
+            respuesta = self.client.post(reverse('sugerir_negocio_view'), {
+                'nombre_negocio': 'Asadero El Chino', 'ubicacion_texto': 'León',
+                'categoria_relacionada': self.categoria.pk,
+                'foto_referencia': SimpleUploadedFile('foto.jpg', imagen() + b'\0' * 4096, 'image/jpeg'),
+            })
+        self.assertIn('supera el máximo', str(respuesta.context['form'].errors['foto_referencia']))
+        self.assertFalse(SugerenciaNegocio.objects.exists())
+
+    def test_extension_y_tipo_falsos(self):
+        campo = subidas.ImagenSubidaField()
+        for archivo in (SimpleUploadedFile('foto.jpg', b'<html><script>alert(1)</script>', 'image/jpeg'),
+                        SimpleUploadedFile('foto.png', b'<svg xmlns="http://www.w3.org/2000/svg"/>', 'image/png'),
+                        SimpleUploadedFile('foto.gif', b'%PDF-1.4 ...', 'image/gif')):
+            with self.subTest(archivo=archivo.name), self.assertRaises(ValidationError) as error:
+                campo.clean(archivo)
+            self.assertEqual(error.exception.code, 'formato')
+        # Al revés: un PNG con nombre y tipo de JPEG se acepta como lo que es
+        self.assertEqual(subidas.formato_imagen(campo.clean(SimpleUploadedFile('foto.jpg', imagen('PNG'),
+                                                                                'image/jpeg'))), 'PNG')
+
+    def test_contrato_que_no_es_pdf(self):
+        formulario = ReclamoNegocioForm({'negocio': self.negocio.pk, 'mensaje': 'Soy la dueña'}, {
+            'contrato_pdf': SimpleUploadedFile('contrato.pdf', b'MZ\x90\x00 ejecutable', 'application/pdf')})
+        self.assertFalse(formulario.is_valid())
+        self.assertEqual(formulario.errors['contrato_pdf'], ['El documento debe ser un PDF.'])
+        formulario = ReclamoNegocioForm({'negocio': self.negocio.pk, 'mensaje': 'Soy la dueña'}, {
+            'contrato_pdf': SimpleUploadedFile('contrato.pdf', b'%PDF-1.7\n...', 'application/pdf')})
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+
+    def test_se_quitan_exif_y_gps(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Model] = 'Camara'
+        exif[ExifTags.IFD.GPSInfo] = {ExifTags.GPS.GPSLatitudeRef: 'N', ExifTags.GPS.GPSLatitude: (12.0, 26.0, 0.0)}
+        original = imagen(exif=exif.tobytes())
+        self.assertIn(ExifTags.IFD.GPSInfo, Image.open(BytesIO(original)).getexif())
+        limpia = subidas.ImagenSubidaField().clean(SimpleUploadedFile('foto.jpg', original, 'image/jpeg'))
+        limpia.seek(0)
+        with Image.open(limpia) as resultado:
+            self.assertEqual(resultado.format, 'JPEG')
+            self.assertFalse(resultado.getexif())
+            self.assertNotIn('exif', resultado.info)
+
+    def test_se_reducen_las_grandes(self):
+        grande = imagen('PNG', (subidas.LADO_MAXIMO + 500, 60))
+        reducida = subidas.ImagenSubidaField().clean(SimpleUploadedFile('ancha.png', grande, 'image/png'))
+        reducida.seek(0)
+        with Image.open(reducida) as resultado:
+            self.assertEqual(resultado.size[0], subidas.LADO_MAXIMO)
+            self.assertLess(resultado.size[1], 60)
+        pequena = SimpleUploadedFile('pequena.png', imagen('PNG'), 'image/png')
+        self.assertIs(subidas.ImagenSubidaField().clean(pequena), pequena)  # sin recodificar
+
+    def test_demasiados_pixeles_sin_decodificar(self):
+        campo = subidas.ImagenSubidaField()
+        with mock.patch.object(subidas, 'PIXELES_MAXIMOS', 1000), \
+                mock.patch.object(ImageFile.ImageFile, 'load', side_effect=AssertionError('decodificada')):
+            for formato in ('PNG', 'WEBP', 'GIF'):
+                archivo = SimpleUploadedFile(f'enorme.{formato.lower()}', imagen(formato, (40, 30)))
+                with self.subTest(formato=formato), self.assertRaises(ValidationError) as error:
+                    campo.clean(archivo)
+                self.assertEqual(error.exception.code, 'pixeles')
+        with mock.patch.object(subidas, 'PIXELES_MAXIMOS', 1000):
+            # Las JPEG se decodifican ya reducidas: se aceptan y se reducen.
+            grande = imagen('JPEG', (subidas.LADO_MAXIMO + 500, 60))
+            reducida = campo.clean(SimpleUploadedFile('grande.jpg', grande))
+        reducida.seek(0)
+        with Image.open(reducida) as resultado:
+            self.assertEqual(resultado.size[0], subidas.LADO_MAXIMO)
+
+
+class IndiceBusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = User.objects.create_user('cocinero', password='x')
+        cls.staff = User.objects.create_superuser('admin', password='x')
+
+    def _encontrados(self, consulta):
+        return [objeto.pk for objeto in busqueda.buscar(consulta, ['receta'])[:10]]
+
+    def _accion(self, accion, *recetas):
+        self.client.force_login(self.staff)
+        self.client.post(reverse('admin:locales_receta_changelist'),
+                         {'action': accion, '_selected_action': [r.pk for r in recetas]})
+
+    def test_el_indice_sigue_aprobar_editar_rechazar_y_borrar(self):
+        receta = Receta.objects.create(titulo='Nacatamal de cerdo', ingredientes='masa, achiote', pasos='Envolver',
+                                       autor=self.autor)
+        self.assertEqual(self._encontrados('nacatamal'), [])  # pendiente
+        self._accion('aprobar_recetas', receta)
+        self.assertEqual(self._encontrados('nacatamal'), [receta.pk])
+
+        receta.refresh_from_db()
+        receta.titulo = 'Vigorón de Granada'
+        receta.save()
+        self.assertEqual(self._encontrados('nacatamal'), [])
+        self.assertEqual(self._encontrados('vigoron'), [receta.pk])
+
+        self._accion('rechazar_recetas', receta)
+        self.assertEqual(self._encontrados('vigoron'), [])
+        receta.refresh_from_db()
+        receta.estado = 'approved'
+        receta.save()
+        self.assertEqual(self._encontrados('vigoron'), [receta.pk])
+        receta.delete()
+        self.assertEqual(self._encontrados('vigoron'), [])
+
+    def test_benchmark_mide_la_consulta_y_no_la_cache(self):
+        from .management.commands.benchmark_biblioteca import Command
+
+        Receta.objects.create(titulo='Pinol', ingredientes='maíz', pasos='Tostar', autor=self.autor,
+                              estado='approved')
+        comando = Command()
+        with CaptureQueriesContext(connection) as consultas_hechas:
+            comando._medir(lambda: comando._fts('pinol'), 3, antes=busqueda.invalidar_resultados)
+        match = [c for c in consultas_hechas.captured_queries if 'MATCH' in c['sql']]
+        self.assertEqual(len(match), 3 * 2 * 2)  # recuento y página de recetas y de saberes, cada vez
+
+
+class PragmasSqliteTests(TestCase):
+    def _modo_diario(self, wal):
+        with tempfile.TemporaryDirectory() as carpeta:
+            conexion = sqlite3.connect(os.path.join(carpeta, 'prueba.sqlite3'))
+            try:
+                basedatos.aplicar_pragmas(conexion, basedatos.pragmas_de_conexion(wal=wal))
+                return conexion.execute('PRAGMA journal_mode').fetchone()[0]
+            finally:
+                conexion.close()
+
+    def test_wal_solo_si_se_pide(self):
+        self.assertEqual(self._modo_diario(wal=False), 'delete')
+        self.assertEqual(self._modo_diario(wal=True), 'wal')
+        self.assertFalse(basedatos.WAL)  # settings.DEBUG: manage.py y las pruebas no convierten db.sqlite3
+
+
+class PaginacionCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('opinadora', password='x')
+        cls.negocio = Negocio.objects.create(name='Comedor La Ceiba', address_text='Granada')
+        ahora = timezone.now()
+        # 25 comentarios y solo tres fechas distintas: las páginas cortan en medio de fechas iguales
+        Comentario.objects.bulk_create(
+            Comentario(negocio=cls.negocio, usuario=cls.usuario, texto=f'Comentario {i}',
+                       fecha=ahora - timedelta(minutes=i % 3)) for i in range(25))
+        cls.orden = list(Comentario.objects.order_by('-fecha', '-id').values_list('pk', flat=True))
+
+    def _recorrer(self, tamano):
+        vistos, paginas, cursor = [], 0, None
+        while True:
+            elementos, cursor = pagina_por_cursor(Comentario.objects.filter(negocio=self.negocio), cursor, tamano)
+            vistos += [c.pk for c in elementos]
+            paginas += 1
+            if cursor is None:
+                return vistos, paginas
+
+    def test_fechas_iguales_entre_paginas(self):
+        self.assertEqual(self._recorrer(10), (self.orden, 3))
+        self.assertEqual(self._recorrer(4), (self.orden, 7))
+
+    def test_ultima_pagina_exacta_no_deja_pagina_vacia(self):
+        self.assertEqual(self._recorrer(5), (self.orden, 5))
+        self.assertEqual(self._recorrer(25), (self.orden, 1))
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        def cifrar(texto):
+            return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+        url = reverse('comentarios_negocio', args=[self.negocio.pk])
+        primera = self.client.get(url)
+        for cursor in ('no-es-base64!', cifrar('sin separador'), cifrar('ayer|3'), cifrar('2024-01-01|tres'),
+                       cifrar('2024-01-01T00:00:00+00:00|99999999999999999999999'),
+                       cifrar('2024-01-01T00:00:00|3'), cifrar('2024-01-01T00:00:00+00:00|-1'), '%FF%FE'):
+            with self.subTest(cursor=cursor):
+                respuesta = self.client.get(f'{url}?cursor={cursor}')  # '%FF%FE': bytes que no son UTF-8
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(respuesta.content, primera.content)
+
+
+class PaginaCondicionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('visitante', password='x')
+        cls.otra = User.objects.create_user('vecina', password='x')
+        cls.negocio = Negocio.objects.create(name='Comedor La Ceiba', description='Sopa de res', address_text='Granada')
+
+    def _detalle(self, **cabeceras):
+        return self.client.get(reverse('detalle_negocio', args=[self.negocio.pk]), **cabeceras)
+
+    def test_304_con_el_mismo_etag_o_fecha(self):
+        respuesta = self._detalle()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        self.assertEqual(self._detalle(HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        self.assertEqual(self._detalle(HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code, 304)
+
+    def test_etag_cambia_al_editar_votar_o_comentar(self):
+        etags = [self._detalle()['ETag']]
+        self.negocio.description = 'Sopa de res los domingos'
+        self.negocio.save()
+        etags.append(self._detalle()['ETag'])
+        Calificacion.objects.create(negocio=self.negocio, usuario=self.usuario, puntuacion=5)
+        etags.append(self._detalle()['ETag'])
+        Comentario.objects.create(negocio=self.negocio, usuario=self.usuario, texto='¡Buenísima!')
+        etags.append(self._detalle()['ETag'])
+        self.assertEqual(len(set(etags)), len(etags))
+        Comentario.objects.filter(negocio=self.negocio).delete()
+        self.assertNotEqual(self._detalle()['ETag'], etags[-1])
+        respuesta = self._detalle(HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Sopa de res los domingos')
+
+    def test_etag_distinto_para_cada_visitante(self):
+        url = reverse('perfil_publico', args=[self.usuario.username])
+        anonimo = self.client.get(url)['ETag']
+        self.client.force_login(self.usuario)
+        propio = self.client.get(url)
+        self.assertNotEqual(propio['ETag'], anonimo)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=anonimo).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=propio['ETag']).status_code, 304)
+        self.client.force_login(self.otra)
+        self.assertNotIn(self.client.get(url)['ETag'], (anonimo, propio['ETag']))
+        self.assertIn('Cookie', propio['Vary'])
+
+    def test_perfil_editado_y_mensajes_pendientes(self):
+        url = reverse('perfil_publico', args=[self.usuario.username])
+        etag = self.client.get(url)['ETag']
+        perfil = PerfilUsuario.objects.get(usuario=self.usuario)
+        perfil.biografia = 'Cocinera de Masaya'
+        perfil.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Con un mensaje por mostrar la página se renderiza aunque no haya cambiado
+        self.client.force_login(self.otra)
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('comentar_y_calificar', args=[self.negocio.pk]), {'texto': 'Rico', 'puntuacion': 4})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_paquetes_de_turismo(self):
+        self.negocio.is_turismo, self.negocio.paquetes_turismo = True, 'Isletas de Granada'
+        self.negocio.save()
+        url = reverse('detalle_paquetes_turismo', args=[self.negocio.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.negocio.paquetes_turismo = 'Isletas y volcán Mombacho'
+        self.negocio.save()
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Mombacho')
+
+class GeocodificadorRemotoFalso(geocodificacion.Geocodificador):
+    """Hace de Nominatim sin red: cuenta las consultas y puede simular una caída."""
+    nombre = 'remoto-falso'
+    remoto = True
+    consultas = []
+    caido = False
+
+    def geocodificar(self, direccion):
+        self.consultas.append(direccion)
+        if self.caido:
+            raise OSError('sin conexión')
+        return geocodificacion.GeocodificadorGazetteer().geocodificar(direccion)
+
+
+class GeocodificacionTests(TestCase):
+    def setUp(self):
+        GeocodificadorRemotoFalso.consultas = []
+        GeocodificadorRemotoFalso.caido = False
+
+    def _negocio(self, direccion):
+        return Negocio.objects.create(name='Fritanga', description='', address_text=direccion)
+
+    def test_gazetteer_asigna_al_guardar(self):
+        negocio = self._negocio('Calle Real, Granada')
+        self.assertIsNotNone(negocio.latitud)
+        self.assertEqual(UbicacionGeocodificada.objects.get().proveedor, 'gazetteer')
+
+    def test_direccion_desconocida_se_consulta_una_vez(self):
+        with mock.patch.object(geocodificacion.GeocodificadorGazetteer, 'geocodificar', return_value=None) as consulta:
+            negocio = self._negocio('Kilómetro 40, carretera vieja')
+            negocio.save()
+            negocio.save()
+        self.assertIsNone(negocio.latitud)
+        self.assertEqual(consulta.call_count, 1)
+        self.assertIsNone(UbicacionGeocodificada.objects.get().reintentar_despues)
+
+    @override_settings(GEOCODIFICADOR_BACKEND='locales.tests.GeocodificadorRemotoFalso')
+    def test_proveedor_remoto_se_consulta_despues_del_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio = self._negocio('Calle Real, Granada')
+            self.assertIsNone(negocio.latitud)
+            self.assertEqual(GeocodificadorRemotoFalso.consultas, [])
+        self.assertEqual(GeocodificadorRemotoFalso.consultas, ['Calle Real, Granada'])
+        negocio.refresh_from_db()
+        self.assertIsNotNone(negocio.latitud)
+
+        # La siguiente con la misma dirección sale de la caché, ya en el guardado.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNotNone(self._negocio('Calle Real, Granada').latitud)
+        self.assertEqual(len(GeocodificadorRemotoFalso.consultas), 1)
+
+    @override_settings(GEOCODIFICADOR_BACKEND='locales.tests.GeocodificadorRemotoFalso')
+    def test_fallo_del_proveedor_se_guarda_hasta_el_reintento(self):
+        GeocodificadorRemotoFalso.caido = True
+        with self.assertLogs('locales.geocodificacion', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            negocio = self._negocio('Calle Real, Granada')
+        entrada = UbicacionGeocodificada.objects.get()
+        self.assertIsNone(entrada.latitud)
+        self.assertGreater(entrada.reintentar_despues, timezone.now())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.save()
+        self.assertEqual(len(GeocodificadorRemotoFalso.consultas), 1)
+
+        GeocodificadorRemotoFalso.caido = False
+        UbicacionGeocodificada.objects.update(reintentar_despues=timezone.now() - timedelta(seconds=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            negocio.save()
+        negocio.refresh_from_db()
+        self.assertIsNotNone(negocio.latitud)
+        self.assertIsNone(UbicacionGeocodificada.objects.get().reintentar_despues)
+
+    @override_settings(GEOCODIFICADOR_BACKEND='locales.tests.GeocodificadorRemotoFalso')
+    def test_sin_geocodificar_al_guardar_lo_hace_el_comando(self):
+        with mock.patch.object(geocodificacion, 'GEOCODIFICAR_AL_GUARDAR', False):
+            with self.captureOnCommitCallbacks(execute=True):
+                negocio = self._negocio('Barrio San Felipe, León')
+        self.assertEqual(GeocodificadorRemotoFalso.consultas, [])
+        call_command('geocodificar_negocios', stdout=StringIO())
+        negocio.refresh_from_db()
+        self.assertIsNotNone(negocio.latitud)
+
+    def test_comando_no_reintenta_fallos_recientes(self):
+        negocio = self._negocio('Kilómetro 40, carretera vieja')
+        UbicacionGeocodificada.objects.update(reintentar_despues=timezone.now() + timedelta(hours=1))
+        with mock.patch.object(geocodificacion.GeocodificadorGazetteer, 'geocodificar') as consulta:
+            call_command('geocodificar_negocios', stdout=StringIO())
+        consulta.assert_not_called()
+        negocio.refresh_from_db()
+        self.assertIsNone(negocio.latitud)
+
+
+class MapaMarcadoresTests(TestCase):
+    def test_bbox_no_finito(self):
+        url = reverse('mapa_marcadores')
+        for bbox in ('nan,0,1,1', '-88,nan,-82,16', '-inf,10,-82,16', '-88,10,inf,16'):
+            respuesta = self.client.get(url, {'bbox': bbox, 'zoom': 5})
+            self.assertEqual(respuesta.status_code, 400, bbox)
+            self.assertIn('error', respuesta.json())
+
+    def test_bbox_valido(self):
+        Negocio.objects.create(name='Fritanga', description='', address_text='Granada')
+        respuesta = self.client.get(reverse('mapa_marcadores'), {'bbox': '-88,10,-82,16', 'zoom': 7})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['features']), 1)
+
+
+class MapaVersionCompartidaTests(VersionesCompartidasMixin, TestCase):
+    def test_marcadores_de_otro_proceso(self):
+        url = reverse('mapa_marcadores')
+        parametros = {'bbox': '-88,10,-82,16', 'zoom': 15}
+        self.assertEqual(self.client.get(url, parametros).json()['features'], [])
+        Negocio.objects.bulk_create([Negocio(name='Fritanga', description='', address_text='Granada',
+                                             latitud=11.9344, longitud=-85.956)])
+        self.otro_proceso().incr('versiones:mapa')
+        self.assertEqual(len(self.client.get(url, parametros).json()['features']), 1)
+
+
+class VersionesTests(VersionesCompartidasMixin, TestCase):
+    def test_incr_no_pierde_subidas_entre_procesos(self):
+        versiones.actual('prueba')
+
+        def subir():
+            cache = self.otro_proceso()
+            for _ in range(25):
+                cache.incr('versiones:prueba')
+
+        hilos = [threading.Thread(target=subir) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(versiones.actual('prueba'), 201)
+
+    def test_autocompletado_ve_los_cambios_de_otro_proceso(self):
+        self.assertEqual(autocompletado.sugerir('pinol'), [])
+        # Otro worker guarda un negocio: aquí no llega la señal, solo la versión.
+        Negocio.objects.bulk_create([Negocio(name='Pinolería Doña Tita', description='', address_text='León')])
+        self.assertEqual(autocompletado.sugerir('pinol'), [])
+        self.otro_proceso().incr('versiones:autocompletado')
+        self.assertEqual([s['texto'] for s in autocompletado.sugerir('pinol')], ['Pinolería Doña Tita'])
+
+
+class CachesCompartidasTests(ArchivosTemporalesMixin, VersionesCompartidasMixin, TestCase):
+    def test_fragmentos_y_busqueda(self):
+        clave = fragmentos.clave('eventos')
+        version = busqueda.version_actual()
+        self.otro_proceso().incr('versiones:fragmentos:eventos.eventocultural')
+        self.otro_proceso().incr('versiones:busqueda')
+        self.assertNotEqual(fragmentos.clave('eventos'), clave)
+        self.assertEqual(busqueda.version_actual(), version + 1)
+
+    def test_derivados_borrados_en_otro_proceso(self):
+        nombre = default_storage.save('negocios_fotos/tostones.jpg', ContentFile(imagen(tamano=(400, 300))))
+        campo = Negocio(foto_principal=nombre).foto_principal
+        destino = imagenes.nombre_derivado(nombre, 100, 'webp')
+        self.assertEqual(imagenes.generar(campo, (100,), ('webp',)), {(100, 'webp'): 100})
+        # Otro worker borra los derivados (deduplicar_media) y sube la versión.
+        imagenes._almacen().delete(destino)
+        self.otro_proceso().incr('versiones:imagenes')
+        self.assertEqual(imagenes.generar(campo, (100,), ('webp',)), {(100, 'webp'): 100})
+        self.assertTrue(imagenes._almacen().exists(destino))
+
+
+# Presupuestos de rendimiento de cada ruta con nombre.
+#
+# `consultas` es el máximo de consultas SQL de una petición con las cachés vacías
+# (los índices en memoria del mapa y del autocompletado ya construidos). Además, el
+# número de consultas no puede cambiar al multiplicar los datos: una vista que hace
+# una consulta por fila (un N+1) pasa el presupuesto con pocos datos pero no esta
+# segunda prueba. El tiempo depende de la máquina, así que `ms` (tiempo de respuesta
+# máximo) es opcional: solo para rutas que lo necesiten y con mucho margen (todas
+# responden en menos de 20 ms en un portátil con estos datos).
+# `usuario` es None (anónimo), 'usuario', 'propietario' (dueño de datos.negocio) o
+# 'staff'; `kwargs` y `datos` reciben el objeto con lo sembrado por sembrar().
+Ruta = namedtuple('Ruta', 'consultas ms kwargs usuario metodo datos query', defaults=(
+    None, None, None, 'get', None, ''))
+
+FACTOR_TIEMPO = 1  # subirlo en máquinas lentas: multiplica todos los `ms`
+
+PRESUPUESTOS_LOCALES = {
+    'home_view': Ruta(3),
+    'register_view': Ruta(0),
+    'login_view': Ruta(0),
+    'logout_view': Ruta(4, usuario='usuario'),
+    'create_relato_view': Ruta(3, usuario='usuario'),
+    'sugerir_negocio_view': Ruta(4, usuario='usuario'),
+    'mostrar_mapa': Ruta(0, query='?ubicacion=Granada'),
+    'mapa_marcadores': Ruta(0, query='?bbox=-88,10,-82,16&zoom=7'),  # índice en memoria
+    'create_receta_view': Ruta(3, usuario='usuario'),
+    'perfil_view': Ruta(8, usuario='usuario'),
+    'eliminar_avatar': Ruta(5, usuario='usuario'),  # incluye leer el avatar anterior para soltar su referencia
+    'biblioteca_view': Ruta(4),
+    'buscar_view': Ruta(3, query='?q=nacatamal&tipo=receta'),
+    'autocompletar': Ruta(0, query='?q=fri'),  # índice en memoria
+    'lista_usuarios': Ruta(4, usuario='usuario'),
+    'avatar_iniciales': Ruta(0, kwargs=lambda d: {'fondo': 'DCC7A1', 'color': '6B4226', 'tamano': 80,
+                                                  'archivo': f'{d.usuario.username}.png'}),  # ya en disco
+    'perfil_publico': Ruta(3, kwargs=lambda d: {'username': d.usuario.username}),
+    'estadisticas_fragmentos': Ruta(2, usuario='staff'),
+    'resumen_consultas': Ruta(3, usuario='staff'),
+    'lista_perfiles': Ruta(3, usuario='staff'),
+    'metricas': Ruta(0),
+    'juego_view': Ruta(0),
+    'lista_negocios': Ruta(3),
+    'lista_negocios_por_categoria': Ruta(3, kwargs=lambda d: {'categoria_slug': d.categoria.slug}),
+    'detalle_negocio': Ruta(3, kwargs=lambda d: {'negocio_id': d.negocio.pk}),
+    'comentarios_negocio': Ruta(2, kwargs=lambda d: {'negocio_id': d.negocio.pk}),
+    'reclamar_negocio': Ruta(4, usuario='usuario'),
+    'plan_turismo': Ruta(1),
+    'detalle_paquetes_turismo': Ruta(2, kwargs=lambda d: {'negocio_id': d.negocio.pk}),
+    'editar_paquetes_turismo': Ruta(4, usuario='propietario', kwargs=lambda d: {'negocio_id': d.negocio.pk}),
+    'reportar_comentario': Ruta(5, usuario='usuario', kwargs=lambda d: {'comentario_id': d.comentario.pk}),
+    'comentar_y_calificar': Ruta(11, usuario='usuario', metodo='post', kwargs=lambda d: {'negocio_id': d.negocio.pk},
+                                 datos=lambda d: {'texto': 'Muy rico', 'puntuacion': 5}),
+    'editar_negocio': Ruta(5, usuario='propietario', kwargs=lambda d: {'pk': d.negocio.pk}),
+    'enviar_mensaje_admin': Ruta(3, usuario='usuario'),
+}
+
+
+class Sembrado:
+    pass
+
+
+def sembrar(cantidad, datos=None):
+    """Crea `cantidad` filas más de cada modelo visible en el sitio; devuelve (o amplía) `datos`."""
+    if datos is None:
+        datos = Sembrado()
+        datos.usuario = User.objects.create_user('visitante', password='x')
+        datos.propietario = User.objects.create_user('propietaria', password='x')
+        datos.staff = User.objects.create_superuser('moderadora', password='x')
+        datos.categoria, _ = Categoria.objects.get_or_create(slug='comida', defaults={'nombre': 'Comida'})
+        datos.turismo, _ = Categoria.objects.get_or_create(slug='turismo', defaults={'nombre': 'Turismo'})
+        datos.departamento = Departamento.objects.order_by('pk').first()
+        datos.negocio = Negocio.objects.create(
+            name='Hostal La Calzada', description='Hostal con tours', address_text='Granada',
+            categoria_relacionada=datos.turismo, departamento=datos.departamento, propietario=datos.propietario,
+            is_turismo=True, paquetes_turismo='Isletas', latitud=11.93, longitud=-85.95)
+        datos.creados = 0
+    inicio = timezone.now()
+    for i in range(datos.creados, datos.creados + cantidad):
+        autor = User.objects.create_user(f'autor{i}')
+        negocio = Negocio.objects.create(
+            name=f'Fritanga {i}', description='Nacatamal y vigorón', address_text='León',
+            categoria_relacionada=datos.categoria, departamento=datos.departamento, propietario=autor,
+            latitud=12.43 + i / 1000, longitud=-86.88)
+        for destino in (negocio, datos.negocio):
+            comentario = Comentario.objects.create(negocio=destino, usuario=autor, texto=f'Comentario {i}')
+            Calificacion.objects.create(negocio=destino, usuario=autor, puntuacion=i % 5 + 1, comentario=comentario)
+        # El visitante también acumula contenido propio (su perfil lo lista)
+        Comentario.objects.create(negocio=negocio, usuario=datos.usuario, texto=f'Opinión {i}')
+        Relato.objects.create(title=f'Mi relato {i}', content='...', author=datos.usuario)
+        Relato.objects.create(title=f'Relato {i}', content='Cuentan que...', author=autor, status='approved',
+                              latitud=12.1, longitud=-86.2)
+        Receta.objects.create(titulo=f'Nacatamal {i}', ingredientes='masa, cerdo', pasos='Envolver', autor=autor,
+                              estado='approved')
+        SaberPopular.objects.create(titulo=f'Saber {i}', contenido='Remedio', autor=autor, estado='approved')
+        SugerenciaNegocio.objects.create(nombre_negocio=f'Sugerido {i}', ubicacion_texto='Masaya', sugerido_por=autor)
+        EventoCultural.objects.create(nombre=f'Fiesta {i}', descripcion='Patronales', ubicacion_texto='Masaya',
+                                      fecha_inicio=inicio + timedelta(days=i), fecha_fin=inicio + timedelta(days=i + 1),
+                                      publicado=True, publicado_por=autor)
+    datos.comentario = Comentario.objects.filter(negocio=datos.negocio).first()
+    datos.creados += cantidad
+    return datos
+
+
+def rutas_con_nombre(urlpatterns):
+    # Solo las rutas declaradas en el módulo, sin entrar en los include()
+    return {patron.name for patron in urlpatterns if isinstance(patron, URLPattern) and patron.name}
+
+
+class PresupuestosMixin(ArchivosTemporalesMixin):
+    """Comprueba PRESUPUESTOS (nombre de ruta -> Ruta) contra los datos de sembrar()."""
+
+    PRESUPUESTOS = {}
+    POCOS, MUCHOS = 3, 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.datos = sembrar(cls.POCOS)
+
+    def _medir(self, nombre, ruta):
+        self.client.logout()
+        if ruta.usuario:
+            self.client.force_login(getattr(self.datos, ruta.usuario))
+        url = reverse(nombre, kwargs=ruta.kwargs(self.datos) if ruta.kwargs else None) + ruta.query
+        peticion = getattr(self.client, ruta.metodo)
+        argumentos = (url, ruta.datos(self.datos)) if ruta.datos else (url,)
+        peticion(*argumentos)  # la primera vez también compila plantillas y construye los índices en memoria
+        for alias in caches:
+            caches[alias].clear()
+        if ruta.usuario:
+            self.client.force_login(getattr(self.datos, ruta.usuario))  # logout_view cerró la sesión
+        medicion = consultas.Medicion()
+        with connection.execute_wrapper(medicion):
+            inicio = time.perf_counter()
+            respuesta = peticion(*argumentos)
+            ms = (time.perf_counter() - inicio) * 1000
+        self.assertLess(respuesta.status_code, 400, f'{nombre}: {url} respondió {respuesta.status_code}')
+        return medicion, ms
+
+    def test_presupuestos(self):
+        for nombre, ruta in self.PRESUPUESTOS.items():
+            with self.subTest(ruta=nombre):
+                medicion, ms = self._medir(nombre, ruta)
+                self.assertLessEqual(medicion.consultas, ruta.consultas, f'{nombre}: {dict(medicion.huellas)}')
+                if ruta.ms is not None:
+                    self.assertLessEqual(ms, ruta.ms * FACTOR_TIEMPO, f'{nombre}: {ms:.0f} ms')
+
+    def test_consultas_no_dependen_de_los_datos(self):
+        antes = {nombre: self._medir(nombre, ruta)[0].consultas for nombre, ruta in self.PRESUPUESTOS.items()}
+        sembrar(self.MUCHOS - self.POCOS, self.datos)
+        for nombre, ruta in self.PRESUPUESTOS.items():
+            with self.subTest(ruta=nombre):
+                medicion, _ = self._medir(nombre, ruta)
+                self.assertEqual(medicion.consultas, antes[nombre],
+                                 f'{nombre}: {antes[nombre]} consultas con {self.POCOS} filas y {medicion.consultas} '
+                                 f'con {self.MUCHOS}; repetidas: {medicion.repetidas()}')
+
+
+class PresupuestosLocalesTests(PresupuestosMixin, TestCase):
+    PRESUPUESTOS = PRESUPUESTOS_LOCALES
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        from . import urls
+        self.assertEqual(rutas_con_nombre(urls.urlpatterns) - {'estatico'}, set(self.PRESUPUESTOS))
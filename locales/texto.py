@@ -0,0 +1,17 @@
+import re
+import unicodedata
+
+_ESPACIOS = re.compile(r'\s+')
+
+
+def quitar_acentos(texto):
+    # "León" -> "Leon", "Doña" -> "Dona"
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def normalizar_texto(texto):
+    # Minúsculas, sin acentos y con los espacios colapsados.
+    if not texto:
+        return ''
+    return _ESPACIOS.sub(' ', quitar_acentos(texto).lower()).strip()
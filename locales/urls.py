@@ -1,5 +1,5 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from locales import views as locales_views
 from django.conf import settings
 from django.conf.urls.static import static
@@ -13,17 +13,27 @@ urlpatterns = [
     path('relatos/crear/', locales_views.create_relato_view, name='create_relato_view'),
     path('directorio/sugerir/', locales_views.sugerir_negocio_view, name='sugerir_negocio_view'),
     path('mostrar_mapa/', locales_views.mostrar_mapa, name='mostrar_mapa'),
+    path('mapa/marcadores/', locales_views.mapa_marcadores, name='mapa_marcadores'),
     path('create_receta/', locales_views.create_receta_view, name='create_receta_view'),
     path('perfil/', locales_views.editar_perfil, name='perfil_view'),
     path('perfil/eliminar-avatar/', locales_views.eliminar_avatar, name='eliminar_avatar'),
     path('biblioteca/', locales_views.biblioteca_view, name='biblioteca_view'),
+    path('buscar/', locales_views.buscar_view, name='buscar_view'),
+    path('autocompletar/', locales_views.autocompletar, name='autocompletar'),
     path('eventos/', include('eventos.urls')),
     path('usuarios/', locales_views.lista_usuarios, name='lista_usuarios'),
+    path('avatar/<str:fondo>/<str:color>/<int:tamano>/<str:archivo>', locales_views.avatar_iniciales,
+         name='avatar_iniciales'),
     path('usuarios/<str:username>/', locales_views.perfil_publico, name='perfil_publico'),
+    path('cache/fragmentos/', locales_views.estadisticas_fragmentos, name='estadisticas_fragmentos'),
+    path('consultas/', locales_views.resumen_consultas, name='resumen_consultas'),
+    path('perfiles/', locales_views.lista_perfiles, name='lista_perfiles'),
+    path('metrics', locales_views.metricas_view, name='metricas'),
     path('juego/', locales_views.juego_view, name='juego_view'),
     path('negocios/', locales_views.lista_negocios, name='lista_negocios'),
     path('negocios/<slug:categoria_slug>/', locales_views.lista_negocios, name='lista_negocios_por_categoria'),
     path('local/<int:negocio_id>/', locales_views.detalle_negocio, name='detalle_negocio'),
+    path('local/<int:negocio_id>/comentarios/', locales_views.comentarios_negocio, name='comentarios_negocio'),
     path('reclamar-negocio/', locales_views.reclamar_negocio, name='reclamar_negocio'),
     path('plan-turismo/', locales_views.plan_turismo, name='plan_turismo'),
     path('negocios/<int:negocio_id>/paquetes/', locales_views.detalle_paquetes_turismo,
@@ -38,4 +48,10 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if getattr(settings, 'ESTATICOS_SERVIR', not settings.DEBUG):
+    # Paquetes precomprimidos con caché de un año (locales/estaticos.py).
+    urlpatterns += [
+        re_path(r'^%s(?P<ruta>.+)$' % settings.STATIC_URL.lstrip('/'), locales_views.estatico, name='estatico'),
+    ]
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+from contextlib import contextmanager
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+# Versiones de los datos que cada proceso guarda por su cuenta: los índices en memoria
+# (mapa, autocompletado, duplicados) y las entradas de la caché 'default' cuya clave
+# lleva la versión (búsqueda, ranking, departamentos, imágenes). Quien cambia los datos
+# sube la versión; cada proceso, al ver otra distinta, rehace lo suyo.
+#
+# Para que eso funcione con varios procesos (gunicorn), todos tienen que leer las
+# versiones del mismo sitio: la caché 'versiones' (settings.CACHE_VERSIONES). En memoria
+# solo sirve con un proceso; con varios, 'archivos' (CacheArchivos, abajo), memcached
+# o redis, cuyo incr es atómico entre procesos.
+
+
+def _cache():
+    try:
+        return caches['versiones']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _clave(nombre):
+    return f'versiones:{nombre}'
+
+
+def actual(nombre):
+    cache = _cache()
+    clave = _clave(nombre)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, 1, None)
+        version = cache.get(clave, 1)
+    return version
+
+
+def varias(nombres):
+    """Las versiones de varios nombres, en el mismo orden, con una sola lectura."""
+    cache = _cache()
+    claves = [_clave(nombre) for nombre in nombres]
+    encontradas = cache.get_many(claves)
+    for clave in claves:
+        if clave not in encontradas:
+            cache.add(clave, 1, None)
+            encontradas[clave] = cache.get(clave, 1)
+    return [encontradas[clave] for clave in claves]
+
+
+def subir(nombre):
+    """Sube la versión de `nombre` para todos los procesos y devuelve la nueva."""
+    cache = _cache()
+    clave = _clave(nombre)
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        cache.add(clave, 1, None)
+        return cache.incr(clave)
+
+
+class CacheArchivos(FileBasedCache):
+    """FileBasedCache cuyo add e incr no pierden subidas entre procesos.
+
+    El incr de Django lee el archivo y lo reescribe por separado: dos procesos que
+    suben a la vez dejarían la misma versión y uno de los cambios no se vería. Aquí
+    add e incr se hacen con un bloqueo exclusivo sobre un archivo del directorio.
+    """
+
+    @contextmanager
+    def _bloqueo(self):
+        self._createdir()
+        with open(os.path.join(self._dir, 'bloqueo'), 'ab') as archivo:
+            locks.lock(archivo, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(archivo)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._bloqueo():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._bloqueo():
+            return super().incr(key, delta, version)
@@ -1,20 +1,25 @@
+import math
+import mimetypes
+import posixpath
+
 from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.template.loader import render_to_string
-from django.db.models import Q
+from django.db.models import Q, F, Count, Max
 from django.core.paginator import Paginator
 from django.forms import ModelForm
-from django.db.models import Avg
 from django.db import IntegrityError
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 
 # Importaciones necesarias para el filtro de categorías
-from .models import Negocio, Categoria, PerfilUsuario, Relato, SaberPopular, Comentario, Calificacion, \
+from .models import Negocio, Categoria, PerfilUsuario, Relato, SaberPopular, Comentario, \
     ReporteComentario, ReclamoNegocio, SugerenciaNegocio, Receta, MensajePropietario
 from .forms import (
     RecetaForm,
@@ -32,6 +37,13 @@ from .forms import (
 )
 from eventos.models import EventoCultural
 from django.utils.http import urlencode
+from .mapa import obtener_indice
+from .ranking import top_negocios
+from .paginacion import pagina_por_cursor
+from .departamentos import departamentos_con_negocios
+from .condicional import pagina_condicional
+from . import (busqueda, autocompletado, avatares, consultas, duplicados, estaticos, fragmentos, metricas, perfilado,
+               sugerencias)
 
 
 def register_view(request):
@@ -75,17 +87,15 @@ def logout_view(request):
 
 
 def home_view(request):
-    relatos = Relato.objects.filter(status='approved')
-    # Obtener negocios, calcular la calificación promedio y ordenarlos de mayor a menor
-    negocios = Negocio.objects.annotate(
-        avg_rating=Avg('calificacion__puntuacion')
-    ).order_by('-avg_rating')
+    relatos = Relato.objects.filter(status='approved').select_related('author')
     perfil = None
     if request.user.is_authenticated:
         perfil, _ = PerfilUsuario.objects.get_or_create(usuario=request.user)
     context = {
         'relatos': relatos,
-        'negocios': negocios,
+        # Los mejores negocios según el ranking precalculado (lista cacheada). Se pasa la
+        # función: la plantilla solo la llama si el fragmento no está en caché.
+        'negocios': top_negocios,
         'perfil': perfil,
     }
     return render(request, 'locales/home.html', context)
@@ -116,8 +126,12 @@ def sugerir_negocio_view(request):
             try:
                 sugerencia = form.save(commit=False)
                 sugerencia.sugerido_por = request.user
+                parecidos = duplicados.marcar(sugerencia)
                 sugerencia.save()
                 messages.success(request, '¡Sugerencia enviada! El equipo la revisará pronto.')
+                if parecidos:
+                    messages.info(request, f'Ya tenemos un negocio parecido: {parecidos[0].nombre}. '
+                                           'Si es el mismo, el equipo actualizará sus datos en lugar de duplicarlo.')
                 return redirect('sugerir_negocio_view')
             except Exception as e:
                 print("Error inesperado al guardar la sugerencia:")
@@ -132,6 +146,24 @@ def sugerir_negocio_view(request):
     return render(request, 'locales/sugerir_negocio.html', {'form': form})
 
 
+def mapa_marcadores(request):
+    # GeoJSON con los marcadores (o grupos de marcadores) visibles en el mapa
+    try:
+        oeste, sur, este, norte = (float(v) for v in request.GET.get('bbox', '').split(','))
+        zoom = int(request.GET.get('zoom', ''))
+        # float() acepta 'nan' e 'inf', que min/max no recortan.
+        if not all(math.isfinite(v) for v in (oeste, sur, este, norte)):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos: se esperaba bbox=oeste,sur,este,norte y zoom.'},
+                            status=400)
+    oeste, este = max(oeste, -180.0), min(este, 180.0)
+    sur, norte = max(sur, -90.0), min(norte, 90.0)
+    if oeste > este or sur > norte:
+        return JsonResponse({'type': 'FeatureCollection', 'features': []})
+    return JsonResponse(obtener_indice().consultar(oeste, sur, este, norte, zoom))
+
+
 def mostrar_mapa(request):
     ubicacion = request.GET.get('ubicacion', '')
     map_url = f"https://maps.google.com/maps?q=?q={ubicacion}&output=embed"
@@ -157,15 +189,20 @@ def create_receta_view(request):
 
 def biblioteca_view(request):
     query = request.GET.get('q')
-    recetas_list = Receta.objects.filter(estado='approved')
-    saberes_list = SaberPopular.objects.filter(estado='approved')
-    if query:
-        recetas_list = recetas_list.filter(
-            Q(titulo__icontains=query) | Q(ingredientes__icontains=query) | Q(pasos__icontains=query)
-        )
-        saberes_list = saberes_list.filter(
-            Q(titulo__icontains=query) | Q(contenido__icontains=query)
-        )
+    if query and busqueda.disponible():
+        # Índice FTS5: ordenado por relevancia, sin acentos y con fragmentos resaltados.
+        recetas_list = busqueda.buscar(query, ['receta'])
+        saberes_list = busqueda.buscar(query, ['saber'])
+    else:
+        recetas_list = Receta.objects.filter(estado='approved').select_related('autor').order_by('-fecha_creacion')
+        saberes_list = SaberPopular.objects.filter(estado='approved').select_related('autor').order_by('-fecha_creacion')
+        if query:
+            recetas_list = recetas_list.filter(
+                Q(titulo__icontains=query) | Q(ingredientes__icontains=query) | Q(pasos__icontains=query)
+            )
+            saberes_list = saberes_list.filter(
+                Q(titulo__icontains=query) | Q(contenido__icontains=query)
+            )
     recetas_paginator = Paginator(recetas_list, 10)
     saberes_paginator = Paginator(saberes_list, 10)
     recetas = recetas_paginator.get_page(request.GET.get('page_recetas'))
@@ -178,6 +215,109 @@ def biblioteca_view(request):
     return render(request, 'locales/biblioteca.html', context)
 
 
+def buscar_view(request):
+    query = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo')
+    tipos = [tipo] if tipo in busqueda.TIPOS else None
+    resultados = busqueda.buscar(query, tipos) if query and busqueda.disponible() else []
+    page_obj = Paginator(resultados, 20).get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'tipo': tipo if tipos else '',
+        'tipos': [(nombre, t.etiqueta) for nombre, t in busqueda.TIPOS.items()],
+        'page_obj': page_obj,
+    }
+    return render(request, 'locales/buscar.html', context)
+
+
+def autocompletar(request):
+    # Pensado para llamarse en cada tecla: responde desde el índice en memoria, sin consultas.
+    prefijo = request.GET.get('q', '')[:100]
+    tipos = [t for t in request.GET.get('tipos', '').split(',') if t in autocompletado.TIPOS] or None
+    try:
+        limite = min(max(int(request.GET.get('k', autocompletado.MAX_SUGERENCIAS)), 1), 20)
+    except ValueError:
+        limite = autocompletado.MAX_SUGERENCIAS
+    return JsonResponse({'sugerencias': autocompletado.sugerir(prefijo, limite, tipos)})
+
+
+def avatar_iniciales(request, fondo, color, tamano, archivo):
+    nombre, _, formato = archivo.rpartition('.')
+    if not nombre or not avatares.permitido(fondo, color, tamano, formato):
+        return HttpResponse(status=404)
+    etag = f'"{avatares.huella(nombre, fondo, color, tamano, formato)}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+    contenido = avatares.obtener(nombre, fondo, color, tamano, formato)
+    if contenido is None:
+        return HttpResponse(status=404)
+    respuesta = HttpResponse(contenido, content_type=avatares.FORMATOS[formato])
+    # La URL determina el contenido: nunca cambia.
+    respuesta['ETag'] = etag
+    respuesta['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return respuesta
+
+
+def estatico(request, ruta):
+    # Archivos de STATIC_ROOT con su versión precomprimida (.br/.gz) si el navegador la acepta.
+    ruta = posixpath.normpath(ruta).lstrip('/')
+    if ruta.startswith('..') or ruta.endswith(('.gz', '.br')) or not staticfiles_storage.exists(ruta):
+        raise Http404
+    servida, codificacion = estaticos.version_servida(ruta, request.headers.get('Accept-Encoding', ''))
+    tipo, _ = mimetypes.guess_type(ruta)
+    respuesta = FileResponse(staticfiles_storage.open(servida), content_type=tipo or 'application/octet-stream')
+    if codificacion:
+        respuesta['Content-Encoding'] = codificacion
+    respuesta['Vary'] = 'Accept-Encoding'
+    respuesta['Cache-Control'] = (estaticos.CACHE_INMUTABLE if estaticos.es_inmutable(ruta)
+                                  else estaticos.CACHE_NORMAL)
+    return respuesta
+
+
+@staff_member_required
+def estadisticas_fragmentos(request):
+    # Aciertos y fallos de la caché de fragmentos de plantilla en este proceso.
+    return JsonResponse({'fragmentos': fragmentos.estadisticas()})
+
+
+@staff_member_required
+def resumen_consultas(request):
+    # Consultas SQL por nombre de URL medidas en este proceso (locales/consultas.py).
+    return render(request, 'locales/resumen_consultas.html', {
+        'filas': consultas.resumen(),
+        'activo': consultas.MEDIR,
+        'umbral': consultas.UMBRAL_REPETIDAS,
+    })
+
+
+def metricas_view(request):
+    # Texto de Prometheus; solo para las IPs de METRICAS_IPS (el recolector), sin sesión.
+    if metricas.IPS is not None and request.META.get('REMOTE_ADDR') not in metricas.IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(metricas.exponer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def lista_perfiles(request):
+    # Perfiles guardados por locales/perfilado.py; ?descargar=<nombre>&formato=prof|folded|json baja uno.
+    nombre = request.GET.get('descargar')
+    if nombre:
+        formato = request.GET.get('formato', 'folded')
+        ruta = perfilado.ruta_de(nombre, formato)
+        if ruta is None:
+            raise Http404("No existe ese perfil.")
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f'{nombre}.{formato}',
+                            content_type=perfilado.FORMATOS[formato])
+    return render(request, 'locales/lista_perfiles.html', {
+        'perfiles': perfilado.listar(),
+        'activo': perfilado.ACTIVO,
+        'parametro': perfilado.PARAMETRO,
+        'maximo': perfilado.MAXIMO,
+        'dias': perfilado.DIAS,
+    })
+
+
 def evento_cultural_list(request):
     eventos_list = EventoCultural.objects.all().order_by('fecha_inicio')
     paginator = Paginator(eventos_list, 10)
@@ -209,7 +349,7 @@ def editar_perfil(request):
     relatos = Relato.objects.filter(author=request.user)
     recetas = Receta.objects.filter(autor=request.user)
     negocios = Negocio.objects.filter(propietario=request.user)
-    comentarios = Comentario.objects.filter(usuario=request.user)
+    comentarios = Comentario.objects.filter(usuario=request.user).select_related('negocio')
 
     context = {
         'form': form,
@@ -237,6 +377,11 @@ def lista_usuarios(request):
     return render(request, 'usuarios/lista_usuarios.html', {'usuarios': usuarios})
 
 
+def _marca_perfil_publico(request, username):
+    return PerfilUsuario.objects.filter(usuario__username=username).values_list('updated_at').first()
+
+
+@pagina_condicional(_marca_perfil_publico)
 def perfil_publico(request, username):
     perfil = get_object_or_404(PerfilUsuario, usuario__username=username)
     return render(request, 'usuarios/perfil_publico.html', {'perfil': perfil})
@@ -268,16 +413,38 @@ def reclamar_negocio(request):
     })
 
 
+COMENTARIOS_POR_PAGINA = 10
+
+
+def _pagina_comentarios(negocio, cursor=None):
+    # La calificación de cada comentario llega en la misma consulta (LEFT JOIN por el
+    # OneToOne Calificacion.comentario), así que el costo no depende del número de comentarios.
+    comentarios = Comentario.objects.filter(negocio=negocio).select_related('usuario') \
+        .annotate(puntuacion_usuario=F('calificacion__puntuacion'))
+    return pagina_por_cursor(comentarios, cursor, COMENTARIOS_POR_PAGINA)
+
+
+def _marca_negocio(request, negocio_id):
+    return Negocio.objects.filter(pk=negocio_id).values_list('updated_at').first()
+
+
+def _marca_detalle_negocio(request, negocio_id):
+    # Los votos ya actualizan updated_at del negocio; los comentarios se cuentan
+    # aparte (el COUNT detecta también los borrados).
+    return Negocio.objects.filter(pk=negocio_id) \
+        .annotate(ultimo_comentario=Max('comentario__fecha'), comentarios=Count('comentario')) \
+        .values_list('updated_at', 'ultimo_comentario', 'comentarios').first()
+
+
+@pagina_condicional(_marca_detalle_negocio)
 def detalle_negocio(request, negocio_id):
-    negocio = get_object_or_404(Negocio, id=negocio_id)
+    # La plantilla muestra la categoría y el propietario: se traen en la misma consulta
+    negocio = get_object_or_404(Negocio.objects.select_related('categoria_relacionada', 'propietario'), id=negocio_id)
 
-    comentarios = Comentario.objects.filter(negocio=negocio).select_related('usuario')
-    for comentario in comentarios:
-        calificacion = Calificacion.objects.filter(comentario=comentario).first()
-        comentario.puntuacion_usuario = calificacion.puntuacion if calificacion else None
+    comentarios, siguiente_cursor = _pagina_comentarios(negocio)
 
-    # Agrega esto para calcular la calificación promedio
-    promedio = negocio.calificacion_set.aggregate(Avg('puntuacion'))['puntuacion__avg'] or 0
+    # La calificación promedio se mantiene en el propio negocio
+    promedio = negocio.calificacion_promedio
 
     # Pasa los formularios vacíos al contexto
     comentario_form = ComentarioForm()
@@ -286,7 +453,10 @@ def detalle_negocio(request, negocio_id):
     context = {
         'negocio': negocio,
         'comentarios': comentarios,
+        'siguiente_cursor': siguiente_cursor,
         'promedio': round(promedio, 1),
+        'total_calificaciones': negocio.calificacion_conteo,
+        'histograma_votos': negocio.histograma_votos(),
         'comentario_form': comentario_form,
         'calificacion_form': calificacion_form,
         'is_turismo_negocio': negocio.is_turismo,
@@ -294,6 +464,19 @@ def detalle_negocio(request, negocio_id):
     return render(request, 'locales/detalle_negocio.html', context)
 
 
+def comentarios_negocio(request, negocio_id):
+    # Fragmento para htmx: la siguiente página de comentarios y su botón "Ver más"
+    negocio = get_object_or_404(Negocio, id=negocio_id)
+    comentarios, siguiente_cursor = _pagina_comentarios(negocio, request.GET.get('cursor'))
+    return render(request, 'locales/comentarios_fragmento.html', {
+        'negocio': negocio,
+        'comentarios': comentarios,
+        'siguiente_cursor': siguiente_cursor,
+        'es_continuacion': True,
+    })
+
+
+@pagina_condicional(_marca_negocio)
 def detalle_paquetes_turismo(request, negocio_id):
     negocio = get_object_or_404(Negocio, id=negocio_id)
     if not negocio.is_turismo or not negocio.paquetes_turismo:
@@ -313,27 +496,23 @@ def plan_turismo(request):
     return render(request, 'locales/plan_turismo.html', context)
 
 
-def lista_negocios(request):
-    categoria_slug = request.GET.get('categoria', None)
+def lista_negocios(request, categoria_slug=None):
+    # La categoría llega en la ruta (negocios/<categoria_slug>/) o como ?categoria=
+    categoria_slug = categoria_slug or request.GET.get('categoria', None)
     departamento_seleccionado = request.GET.get('departamento', None)
     if categoria_slug == 'turismo':
         return redirect('plan_turismo')
-    negocios = Negocio.objects.all()
-    categorias = Categoria.objects.all()
+    negocios = Negocio.objects.select_related('categoria_relacionada')
+    categorias = Categoria.objects.order_by('-puntuacion_ranking', 'nombre')
     if categoria_slug:
         negocios = negocios.filter(categoria_relacionada__slug=categoria_slug)
     if departamento_seleccionado:
-        negocios = negocios.filter(address_text__icontains=departamento_seleccionado)
-    departamentos_unicos = set()
-    for negocio in Negocio.objects.all():
-        if negocio.address_text:
-            partes = negocio.address_text.split(',')
-            if len(partes) > 0:
-                departamentos_unicos.add(partes[0].strip())
+        negocios = negocios.filter(departamento__slug=departamento_seleccionado)
     contexto = {
         'negocios': negocios,
         'categorias': categorias,
-        'departamentos': sorted(list(departamentos_unicos)),
+        # Lista cacheada; se invalida desde signals.py cuando cambia el departamento de algún negocio
+        'departamentos': departamentos_con_negocios(),
         'departamento_actual': departamento_seleccionado,
         'categoria_actual_slug': categoria_slug,
     }
@@ -394,20 +573,20 @@ def comentar_y_calificar(request, negocio_id):
 @staff_member_required
 def aprobar_foto_referencia_view(request, sugerencia_id):
     sugerencia = get_object_or_404(SugerenciaNegocio, id=sugerencia_id)
-    sugerencia.foto_aprobada = True
-    sugerencia.save()
-    negocio = Negocio.objects.filter(name=sugerencia.nombre_negocio).first()
-    if negocio:
-        negocio.foto_principal = sugerencia.foto_referencia
-        negocio.save()
-    messages.success(request, "Foto aprobada y vinculada al negocio.")
+    (resultado,) = sugerencias.aprobar_fotos([sugerencia])
+    if resultado.estado == sugerencias.VINCULADA:
+        messages.success(request, "Foto aprobada y vinculada al negocio.")
+    elif resultado.estado == sugerencias.APROBADA:
+        messages.success(request, "Foto aprobada; todavía no hay un negocio con ese nombre.")
+    else:
+        messages.warning(request, f"No se aprobó la foto: {resultado.detalle}.")
     return redirect('/admin/')
 
 
 @login_required
 def editar_paquetes_turismo(request, negocio_id):
     negocio = get_object_or_404(Negocio, id=negocio_id)
-    if request.user != negocio.propietario:
+    if request.user.pk != negocio.propietario_id:
         messages.error(request, "No tienes permiso para editar este negocio.")
         return redirect('detalle_negocio', negocio_id=negocio.id)
     if request.method == 'POST':
@@ -428,7 +607,7 @@ def editar_paquetes_turismo(request, negocio_id):
 @login_required
 def editar_negocio(request, pk):
     negocio = get_object_or_404(Negocio, pk=pk)
-    if request.user != negocio.propietario:
+    if request.user.pk != negocio.propietario_id:
         messages.error(request, "No tienes permiso para editar este negocio.")
         return redirect('detalle_negocio', negocio_id=negocio.pk)
     if request.method == 'POST':
@@ -38,11 +38,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'locales.metricas.MetricasMiddleware',  # el primero: mide la petición completa
     'django.middleware.security.SecurityMiddleware',
+    'locales.consultas.MedirConsultasMiddleware',  # solo actúa con CONSULTAS_MEDIR = True
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'locales.perfilado.PerfilarMiddleware',  # ?perfilar=1 (solo staff) perfila esa petición
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -68,10 +71,20 @@ TEMPLATES = [
 WSGI_APPLICATION = 'mi_directorio_Nicaragua.wsgi.application'
 
 # Database
+# Perfil de producción de SQLite: WAL y demás PRAGMA en locales/basedatos.py (SQLITE_PRAGMAS).
+# WAL queda grabado en el archivo de la base: solo se activa en el servidor real.
+SQLITE_WAL = not DEBUG
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,  # segundos que se reutiliza la conexión entre peticiones
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: quien va a escribir espera el bloqueo al empezar
+            # (busy_timeout) en vez de fallar a mitad de la transacción.
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -91,6 +104,7 @@ USE_TZ = True
 
 # Static files
 STATIC_URL = 'static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Media files
 MEDIA_URL = '/media/'
@@ -106,4 +120,126 @@ LOGIN_URL = '/login/'  # ✅ Redirección personalizada para @login_required
 
 # Crispy Forms config
 CRISPY_ALLOWED_TEMPLATE_PACKS = ['bootstrap4']
-CRISPY_TEMPLATE_PACK = 'bootstrap4'
\ No newline at end of file
+CRISPY_TEMPLATE_PACK = 'bootstrap4'
+
+# Geocodificación de negocios (locales/geocodificacion.py)
+# Para usar OpenStreetMap: 'locales.geocodificacion.GeocodificadorNominatim'
+GEOCODIFICADOR_BACKEND = 'locales.geocodificacion.GeocodificadorGazetteer'
+GEOCODIFICADOR_OPCIONES = {}
+# Tras un fallo del proveedor, la dirección no se vuelve a consultar durante este tiempo (segundos)
+GEOCODIFICACION_REINTENTO_TRAS_FALLO = 6 * 3600
+# Con un proveedor remoto: False deja la consulta para `manage.py geocodificar_negocios`
+GEOCODIFICAR_AL_GUARDAR = True
+
+# Ranking de negocios (locales/ranking.py)
+RANKING_PESO_PREVIO = 5  # votos "virtuales" con la media global que recibe cada negocio
+RANKING_TOP_N = 12  # negocios que se muestran en la portada
+
+# Almacenamiento de archivos subidos: deduplicado por contenido (locales/almacenamiento.py).
+# Las versiones reducidas de las imágenes tienen nombres fijos, así que van aparte.
+STORAGES = {
+    'default': {'BACKEND': 'locales.almacenamiento.AlmacenamientoDeduplicado'},
+    'derivados': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'locales.estaticos.EstaticosComprimidos'},
+}
+
+# Subidas de archivos (locales/subidas.py): siempre a disco por trozos y con tope de tamaño.
+FILE_UPLOAD_HANDLERS = ['locales.subidas.ManejadorSubidaLimitada']
+SUBIDAS_TAMANO_MAXIMO = 10 * 1024 * 1024  # bytes por archivo; lo que pase se descarta sin guardarse
+SUBIDAS_TAMANO_MAXIMO_PDF = 5 * 1024 * 1024
+SUBIDAS_LADO_MAXIMO = 2048  # px; las fotos más grandes se reducen antes de guardarse
+SUBIDAS_PIXELES_MAXIMOS = 30_000_000  # PNG, GIF y WebP con más píxeles se rechazan sin decodificarse
+
+# Archivos estáticos (locales/estaticos.py): `collectstatic` une los paquetes, les pone
+# el hash del contenido y deja versiones .gz/.br. Con DEBUG=False Django los sirve él
+# mismo con caché de un año salvo que lo haga el servidor web (ESTATICOS_SERVIR = False).
+ESTATICOS_SERVIR = not DEBUG
+
+# Cachés. 'default' y 'fragmentos' son de cada proceso salvo que se configuren de otro
+# modo, y no hace falta más: todo lo que guardan lleva en la clave una versión de
+# locales/versiones.py (mapa, autocompletado, duplicados, ranking, búsqueda,
+# departamentos, imágenes, fragmentos). Las invalidaciones solo llegan a todos los
+# procesos si esas versiones están en 'versiones' compartida: 'memoria' solo vale con
+# un proceso (runserver); en el servidor real, 'archivos' (o memcached/redis).
+CACHE_VERSIONES = 'memoria' if DEBUG else 'archivos'
+# 'fragmentos' guarda los trozos de plantilla de locales/fragmentos.py: 'memoria' es una
+# LRU dentro de cada proceso; con 'archivos' los procesos comparten lo ya generado.
+CACHE_FRAGMENTOS = 'memoria'
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'versiones': {
+        'memoria': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'versiones',
+        },
+        'archivos': {
+            'BACKEND': 'locales.versiones.CacheArchivos',
+            'LOCATION': os.path.join(BASE_DIR, 'cache', 'versiones'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},  # unas pocas claves: que nunca se descarte ninguna
+        },
+    }[CACHE_VERSIONES],
+    'fragmentos': {
+        'memoria': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fragmentos',
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        },
+        'archivos': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache', 'fragmentos'),
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }[CACHE_FRAGMENTOS],
+}
+FRAGMENTOS_SEGUNDOS = 24 * 3600  # las claves llevan la versión de sus datos; esto solo limpia las viejas
+
+# Medición de consultas SQL por petición (locales/consultas.py): cabeceras X-Consultas,
+# registro en logs/consultas.log y resumen para administradores en /consultas/.
+CONSULTAS_MEDIR = False  # activarla en desarrollo o mientras se investiga una página
+CONSULTAS_UMBRAL_REPETIDAS = 3  # una sentencia repetida tantas veces en una petición se marca como N+1
+
+LOGS_DIR = os.path.join(BASE_DIR, 'logs')  # se crea al escribir la primera línea
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'consultas': {
+            'class': 'locales.consultas.ArchivoRotativo',
+            'filename': os.path.join(LOGS_DIR, 'consultas.log'),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'locales.consultas': {'handlers': ['consultas'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Perfilado bajo demanda (locales/perfilado.py): un administrador añade ?perfilar=1 a una
+# URL o manda la cabecera X-Perfilar: 1; los resultados se listan en /perfiles/.
+PERFILADO_ACTIVO = True
+PERFILADO_DIR = os.path.join(BASE_DIR, 'perfiles')
+PERFILADO_MAXIMO = 100  # se borran los más viejos al pasar de aquí
+PERFILADO_DIAS = 7
+PERFILADO_INTERVALO_MS = 5  # cada cuánto se muestrea la pila para la gráfica de llama
+
+# Métricas en formato Prometheus en /metrics (locales/metricas.py).
+METRICAS_ACTIVAS = True
+METRICAS_IPS = ('127.0.0.1', '::1')  # quién puede leer /metrics; None para cualquiera
+# Con varios procesos, un directorio compartido donde cada uno vuelca sus totales
+# (vaciarlo al arrancar el servidor); None suma solo los del propio proceso.
+METRICAS_DIR = None
+METRICAS_VOLCADO_SEGUNDOS = 5
+
+# Detección de sugerencias que repiten un negocio existente (locales/duplicados.py).
+# Similitud mínima (0-1) para proponer un negocio como duplicado: las erratas y acentos
+# ("Fritanga Dona Tita") quedan sobre 0.8 y dos negocios que solo comparten
+# "Fritanga Doña" rondan 0.7.
+DUPLICADOS_UMBRAL = 0.75
+DUPLICADOS_MAX_CANDIDATOS = 5